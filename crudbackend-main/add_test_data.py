@@ -1,10 +1,10 @@
 #!/usr/bin/env python3
 """Script to add test data to the database"""
-from database import SessionLocal, engine, Base
+from database import SessionLocal, init_db
 from models import Album, Song ,Artist
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# Migrate the same database the API serves (DATABASE_URL, default ./app.db)
+init_db()
 
 # Create test data
 db = SessionLocal()
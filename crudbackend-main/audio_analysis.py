@@ -0,0 +1,174 @@
+"""Audio metadata, waveform peaks and preview transcoding, run in the job worker processes.
+
+Nothing here imports the app: the functions are pickled by reference into spawned workers.
+ffprobe/ffmpeg and mutagen are used when available; without them only PCM WAV can be read.
+"""
+import json
+import math
+import os
+import shutil
+import subprocess
+import wave
+from array import array
+from typing import Iterator, Optional
+
+# ---------- CONFIG ----------
+PEAK_COUNT = int(os.getenv("AUDIO_PEAK_COUNT", "200"))
+PREVIEW_BITRATE = os.getenv("AUDIO_PREVIEW_BITRATE", "64k")
+PREVIEW_SECONDS = int(os.getenv("AUDIO_PREVIEW_SECONDS", "30"))
+PREVIEW_SUFFIX = ".preview.mp3"
+DECODE_RATE = 8000  # Hz; plenty for a waveform overview
+MIN_BLOCK_FRAMES = 256
+
+try:
+    import mutagen
+except ImportError:  # mutagen is optional; ffprobe or the WAV reader cover the rest
+    mutagen = None
+
+
+class UnsupportedAudio(Exception):
+    """The file could not be read with the decoders available on this machine."""
+
+
+def preview_path(path: str) -> str:
+    """Where the preview of a stored file lives, next to it under the same content hash."""
+    return os.path.splitext(path)[0] + PREVIEW_SUFFIX
+
+
+def _tool(name: str) -> Optional[str]:
+    return shutil.which(name)
+
+
+def _is_wav(path: str) -> bool:
+    with open(path, "rb") as f:
+        header = f.read(12)
+    return header[:4] == b"RIFF" and header[8:12] == b"WAVE"
+
+
+# ---------- METADATA ----------
+def probe(path: str) -> dict:
+    """Duration in seconds and bitrate in bits/s."""
+    if _is_wav(path):
+        with wave.open(path, "rb") as w:
+            rate = w.getframerate()
+            return {
+                "duration": w.getnframes() / rate if rate else None,
+                "bitrate": rate * w.getnchannels() * w.getsampwidth() * 8,
+            }
+    ffprobe = _tool("ffprobe")
+    if ffprobe:
+        out = subprocess.run(
+            [ffprobe, "-v", "error", "-show_entries", "format=duration,bit_rate", "-of", "json", path],
+            capture_output=True, check=True, timeout=60,
+        ).stdout
+        fmt = json.loads(out).get("format", {})
+        return {
+            "duration": float(fmt["duration"]) if fmt.get("duration") else None,
+            "bitrate": int(fmt["bit_rate"]) if fmt.get("bit_rate") else None,
+        }
+    if mutagen is not None:
+        parsed = mutagen.File(path)
+        if parsed is not None and parsed.info is not None:
+            return {"duration": getattr(parsed.info, "length", None), "bitrate": getattr(parsed.info, "bitrate", None)}
+    raise UnsupportedAudio(f"Cannot read {os.path.basename(path)}: install ffmpeg or mutagen for non-WAV audio")
+
+
+# ---------- WAVEFORM ----------
+_WAV_TYPECODES = {1: "b", 2: "h", 4: "i"}
+
+
+def _block_frames(total_frames: Optional[float], count: int) -> int:
+    # One block per peak when the length is known, so each block is read once and reduced to a number
+    if not total_frames:
+        return MIN_BLOCK_FRAMES * 16
+    return max(MIN_BLOCK_FRAMES, math.ceil(total_frames / count))
+
+
+def _wav_blocks(path: str, count: int) -> Iterator[tuple]:
+    """(samples, full scale) per block of interleaved PCM read with the stdlib."""
+    with wave.open(path, "rb") as w:
+        block_frames = _block_frames(w.getnframes(), count)
+        width = w.getsampwidth()
+        typecode = _WAV_TYPECODES.get(width)
+        if typecode is None:
+            raise UnsupportedAudio(f"{width * 8}-bit WAV is not supported without ffmpeg")
+        full_scale = float(1 << (width * 8 - 1))
+        while frames := w.readframes(block_frames):
+            if width == 1:
+                # 8-bit WAV is unsigned; recentre around zero
+                frames = bytes((b - 128) & 0xFF for b in frames)
+            samples = array(typecode)
+            samples.frombytes(frames)
+            yield samples, full_scale
+
+
+def _ffmpeg_blocks(ffmpeg: str, path: str, count: int, duration: Optional[float]) -> Iterator[tuple]:
+    """Mono 16-bit PCM at DECODE_RATE, streamed from ffmpeg's stdout."""
+    block_bytes = _block_frames(duration * DECODE_RATE if duration else None, count) * 2
+    proc = subprocess.Popen(
+        [ffmpeg, "-v", "error", "-i", path, "-vn", "-ac", "1", "-ar", str(DECODE_RATE), "-f", "s16le", "-"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    try:
+        while chunk := proc.stdout.read(block_bytes):
+            samples = array("h")
+            samples.frombytes(chunk[: len(chunk) // 2 * 2])
+            yield samples, 32768.0
+    finally:
+        proc.stdout.close()
+        if proc.wait() != 0:
+            raise UnsupportedAudio(proc.stderr.read().decode(errors="replace").strip() or "ffmpeg failed")
+        proc.stderr.close()
+
+
+def peaks(path: str, count: int = PEAK_COUNT, duration: Optional[float] = None) -> Optional[list]:
+    """At most `count` peak amplitudes in 0..1 across the file, or None if it cannot be decoded here."""
+    if _is_wav(path):
+        blocks = _wav_blocks(path, count)
+    else:
+        ffmpeg = _tool("ffmpeg")
+        if not ffmpeg:
+            return None
+        blocks = _ffmpeg_blocks(ffmpeg, path, count, duration)
+    # One maximum per block keeps memory flat; blocks are merged into `count` buckets at the end
+    # (the block count is only approximate when the length had to be estimated).
+    block_peaks = []
+    for samples, full_scale in blocks:
+        if samples:
+            block_peaks.append(max(max(samples), -min(samples)) / full_scale)
+    if not block_peaks:
+        return []
+    count = min(count, len(block_peaks))
+    per_bucket = len(block_peaks) / count
+    return [
+        round(min(1.0, max(block_peaks[int(i * per_bucket):int((i + 1) * per_bucket)] or [0.0])), 3)
+        for i in range(count)
+    ]
+
+
+# ---------- PREVIEW ----------
+def transcode_preview(path: str, target: str) -> Optional[str]:
+    """Write a mono low-bitrate MP3 of the first PREVIEW_SECONDS; None when ffmpeg is missing."""
+    ffmpeg = _tool("ffmpeg")
+    if not ffmpeg:
+        return None
+    tmp = target + ".part"
+    try:
+        subprocess.run(
+            [ffmpeg, "-v", "error", "-y", "-i", path, "-vn", "-ac", "1", "-b:a", PREVIEW_BITRATE,
+             "-t", str(PREVIEW_SECONDS), "-f", "mp3", tmp],
+            capture_output=True, check=True, timeout=300,
+        )
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return target
+
+
+def analyze(path: str) -> dict:
+    """The job body: everything the UI needs about one stored file."""
+    result = probe(path)
+    result["peaks"] = peaks(path, duration=result["duration"])
+    result["preview_path"] = transcode_preview(path, preview_path(path))
+    return result
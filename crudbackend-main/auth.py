@@ -1,51 +1,348 @@
+import asyncio
+import hashlib
+import logging
+import secrets
+import uuid
 from datetime import datetime, timedelta, timezone
-from typing import Annotated, Optional
+from typing import Iterable, Optional
 
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Form, HTTPException, status
+from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from jose import JWTError, jwt
 from pydantic import BaseModel
-from sqlalchemy import Column, Integer, String, Boolean, create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker, Session
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import TTLCache
+from database import AsyncSessionLocal, get_db
+from metrics import registry
+from models import RefreshToken, RevokedToken, User, utcnow
+from passwords import PasswordService, PoolSaturated
 
 # ---------- CONFIG ----------
 SECRET_KEY = "your_very_secure_secret_key_here"  # Replace with: openssl rand -hex 32
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 1 week
-
-# ---------- DATABASE ----------
-DATABASE_URL = "sqlite:///./users.db"
-Base = declarative_base()
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-# ---------- PASSWORD HASH ----------
-password_hash = PasswordHash.recommended()
-
-# ---------- MODELS ----------
-class UserDB(Base):
-    __tablename__ = "users"
-    id = Column(Integer, primary_key=True, index=True)
-    username = Column(String, unique=True, index=True)
-    email = Column(String, unique=True, index=True)
-    full_name = Column(String)
-    hashed_password = Column(String)
-    disabled = Column(Boolean, default=False)
-
-Base.metadata.create_all(bind=engine)
+# Access tokens are checked in memory only, so keep them short; refresh tokens carry the session.
+ACCESS_TOKEN_EXPIRE_MINUTES = 15
+REFRESH_TOKEN_EXPIRE_DAYS = 30
+REVOCATION_SYNC_SECONDS = 5  # how soon another process's revocations take effect here
+USER_CACHE_TTL_SECONDS = 60
+USER_CACHE_MAXSIZE = 10_000
 
 # ---------- SCHEMAS ----------
-class User(BaseModel):
+class UserSchema(BaseModel):
     username: str
     email: Optional[str] = None
     full_name: Optional[str] = None
     disabled: Optional[bool] = None
 
-class UserInDB(User):
+class UserInDB(UserSchema):
     hashed_password: str
 
 class Token(BaseModel):
     access_token: str
     token_type: str
+    expires_in: int  # seconds until the access token expires
+    refresh_token: str
+
+# ---------- SERVICES ----------
+router = APIRouter()
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+
+password_service = PasswordService()
+
+logger = logging.getLogger(__name__)
+
+# Decoded token -> claims, and username -> validated UserInDB, so authenticated
+# requests normally skip both the JWT decode and the SQLite lookup.
+token_cache = TTLCache(maxsize=USER_CACHE_MAXSIZE, ttl=USER_CACHE_TTL_SECONDS)
+user_cache = TTLCache(maxsize=USER_CACHE_MAXSIZE, ttl=USER_CACHE_TTL_SECONDS)
+registry.add_cache("auth_tokens", token_cache)
+registry.add_cache("auth_users", user_cache)
+
+# ---------- UTILS ----------
+async def get_user(db: AsyncSession, username: str) -> Optional[UserInDB]:
+    result = await db.execute(select(User).where(User.username == username))
+    user = result.scalars().first()
+    if user:
+        return UserInDB(**user.__dict__)
+    return None
+
+def invalidate_user(username: str) -> None:
+    """Drop a cached user; call after anything that changes the user row (signup, disable, password change)."""
+    user_cache.invalidate(username)
+
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[UserInDB]:
+    user = await get_user(db, username)
+    if not user:
+        # Same KDF work as for a real user: response times must not tell which usernames exist
+        await password_service.verify_dummy(password)
+        return None
+    verified, new_hash = await password_service.verify_and_update(password, user.hashed_password)
+    if not verified:
+        return None
+    if new_hash:
+        # Legacy sha256 or outdated KDF parameters: upgrade the stored hash now that we know the password.
+        await db.execute(update(User).where(User.username == username).values(hashed_password=new_hash))
+        await db.commit()
+        invalidate_user(username)
+        user.hashed_password = new_hash
+    return user
+
+def hash_refresh_token(token: str) -> str:
+    # The token is 256 random bits, so a fast unsalted hash is enough to make a DB leak useless
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    to_encode = data.copy()
+    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=15))
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+async def issue_tokens(db: AsyncSession, username: str, session_id: Optional[str] = None) -> dict:
+    """A new access token and refresh token; `session_id` continues an existing login."""
+    session_id = session_id or uuid.uuid4().hex
+    refresh_token = secrets.token_urlsafe(32)
+    now = utcnow()
+    db.add(RefreshToken(
+        token_hash=hash_refresh_token(refresh_token),
+        username=username,
+        session_id=session_id,
+        created_at=now,
+        expires_at=now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    await db.commit()
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    return {
+        "access_token": create_access_token({"sub": username, "sid": session_id}, expires_delta=access_token_expires),
+        "token_type": "bearer",
+        "expires_in": int(access_token_expires.total_seconds()),
+        "refresh_token": refresh_token,
+    }
+
+# ---------- REVOCATION ----------
+class RevocationList:
+    """In-memory mirror of the RevokedToken table, so checking an access token needs no query.
+
+    Keys are access-token jtis and session ids. Revocations made in this process apply at once;
+    those made by other processes arrive with the next sync, every REVOCATION_SYNC_SECONDS.
+    An entry is forgotten once every token it could match has expired anyway.
+    """
+
+    def __init__(self, interval: float = REVOCATION_SYNC_SECONDS):
+        self.interval = interval
+        self._expires: dict = {}  # key -> naive UTC expiry
+        self._last_id = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+    def is_revoked(self, *keys: Optional[str]) -> bool:
+        return any(key in self._expires for key in keys if key)
+
+    async def revoke(self, db: AsyncSession, keys: Iterable[str], expires_at: datetime) -> None:
+        """Record revocations; the caller commits."""
+        for key in keys:
+            db.add(RevokedToken(key=key, expires_at=expires_at))
+            self._add(key, expires_at)
+
+    def _add(self, key: str, expires_at: datetime) -> None:
+        if expires_at > self._expires.get(key, datetime.min):
+            self._expires[key] = expires_at
+
+    async def sync(self) -> None:
+        async with AsyncSessionLocal() as db:
+            rows = await db.execute(
+                select(RevokedToken.id, RevokedToken.key, RevokedToken.expires_at)
+                .where(RevokedToken.id > self._last_id)
+                .order_by(RevokedToken.id)
+            )
+            for row_id, key, expires_at in rows:
+                self._add(key, expires_at)
+                self._last_id = row_id
+        now = utcnow()
+        for key in [key for key, expires_at in self._expires.items() if expires_at <= now]:
+            del self._expires[key]
+
+    async def start(self) -> None:
+        if self._task is None:
+            await self.sync()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        syncs = 0
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sync()
+                syncs += 1
+                if syncs % 720 == 0:
+                    await purge_expired_tokens()
+            except Exception:
+                logger.exception("Revocation list sync failed")
+
+revocations = RevocationList()
+
+async def purge_expired_tokens() -> None:
+    """Delete refresh tokens and denylist rows that can no longer match anything."""
+    now = utcnow()
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(RefreshToken).where(RefreshToken.expires_at <= now))
+        await db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= now))
+        await db.commit()
+
+def _access_token_horizon() -> datetime:
+    # Access tokens issued until now are all expired by then
+    return utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+
+async def revoke_session(db: AsyncSession, session_id: str) -> None:
+    """End one login: its refresh tokens stop working, and so do its access tokens."""
+    await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.session_id == session_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=utcnow())
+    )
+    await revocations.revoke(db, [session_id], _access_token_horizon())
+    await db.commit()
+
+async def revoke_user_sessions(db: AsyncSession, username: str) -> None:
+    """End every login of a user; call after disabling them or changing their password."""
+    result = await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.username == username, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=utcnow())
+        .returning(RefreshToken.session_id)
+    )
+    await revocations.revoke(db, set(result.scalars()), _access_token_horizon())
+    await db.commit()
+    invalidate_user(username)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    claims = token_cache.get(token)
+    if claims is None:
+        try:
+            # Every token we issue expires; one without exp would also never leave the cache on time
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"require_exp": True})
+            # Tokens from before refresh tokens have no session and cannot be revoked; refuse them.
+            claims = (payload.get("sub"), payload.get("jti"), payload.get("sid"))
+            if None in claims:
+                raise credentials_exception
+        except JWTError:
+            raise credentials_exception
+        token_cache.set(token, claims, ttl=payload["exp"] - datetime.now(timezone.utc).timestamp())
+    username, jti, session_id = claims
+    if revocations.is_revoked(jti, session_id):
+        raise credentials_exception
+    user = user_cache.get(username)
+    if user is None:
+        user = await get_user(db, username)
+        if user is None:
+            raise credentials_exception
+        user_cache.set(username, user)
+    return user
+
+async def get_current_active_user(current_user: UserInDB = Depends(get_current_user)):
+    if current_user.disabled:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
+
+# ---------- AUTH ENDPOINTS ----------
+async def password_pool_saturated(request, exc: PoolSaturated):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Too many concurrent logins, try again shortly"},
+        headers={"Retry-After": "1"},
+    )
+
+@router.post("/signup", response_model=UserSchema)
+async def signup(
+    username: str = Form(...),
+    email: str = Form(...),
+    password: str = Form(...),
+    full_name: Optional[str] = Form(None),
+    db: AsyncSession = Depends(get_db)
+):
+    existing = await db.execute(select(User.id).where((User.username == username) | (User.email == email)))
+    if existing.first():
+        raise HTTPException(status_code=400, detail="Username or email already registered")
+    hashed_password = await password_service.hash(password)
+    new_user = User(username=username, email=email, full_name=full_name, hashed_password=hashed_password)
+    db.add(new_user)
+    await db.commit()
+    await db.refresh(new_user)
+    invalidate_user(username)
+    return new_user
+
+@router.post("/token", response_model=Token)
+async def login_for_access_token(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_db)
+):
+    user = await authenticate_user(db, form_data.username, form_data.password)
+    if not user:
+        raise HTTPException(status_code=401, detail="Incorrect username or password")
+    if user.disabled:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return await issue_tokens(db, user.username)
+
+@router.post("/token/refresh", response_model=Token)
+async def refresh_access_token(refresh_token: str = Form(...), db: AsyncSession = Depends(get_db)):
+    """Swap a refresh token for a new pair; each refresh token works once."""
+    invalid = HTTPException(status_code=401, detail="Invalid refresh token")
+    token_hash = hash_refresh_token(refresh_token)
+    now = utcnow()
+    # Claimed in one statement, so two concurrent refreshes cannot both succeed
+    result = await db.execute(
+        update(RefreshToken)
+        .where(
+            RefreshToken.token_hash == token_hash,
+            RefreshToken.used_at.is_(None),
+            RefreshToken.revoked_at.is_(None),
+            RefreshToken.expires_at > now,
+        )
+        .values(used_at=now)
+        .returning(RefreshToken.username, RefreshToken.session_id)
+    )
+    claimed = result.first()
+    if claimed is None:
+        stale = (await db.execute(
+            select(RefreshToken.session_id, RefreshToken.used_at).where(RefreshToken.token_hash == token_hash)
+        )).first()
+        if stale is not None and stale.used_at is not None:
+            # A rotated token came back: someone holds a copy, so end the whole session
+            logger.warning("Refresh token reuse detected, revoking session %s", stale.session_id)
+            await revoke_session(db, stale.session_id)
+        raise invalid
+    username, session_id = claimed
+    user = await get_user(db, username)
+    if user is None or user.disabled:
+        await revoke_session(db, session_id)
+        raise invalid
+    return await issue_tokens(db, username, session_id)
+
+@router.post("/token/revoke", status_code=204)
+async def revoke_refresh_token(refresh_token: str = Form(...), db: AsyncSession = Depends(get_db)):
+    """Log out: end the session the refresh token belongs to, including its access tokens."""
+    result = await db.execute(
+        select(RefreshToken.session_id).where(RefreshToken.token_hash == hash_refresh_token(refresh_token))
+    )
+    session_id = result.scalar()
+    if session_id is not None:
+        await revoke_session(db, session_id)
 
-class TokenData(BaseModel):
-    username: Optional[str] = None
\ No newline at end of file
+@router.get("/users/me/", response_model=UserSchema)
+async def read_users_me(current_user: UserInDB = Depends(get_current_active_user)):
+    return current_user
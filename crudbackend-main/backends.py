@@ -0,0 +1,27 @@
+"""Picking the implementation of a piece of shared state: in-process, or Redis for several workers.
+
+The response cache and the rate limiter each have a local and a Redis backend, chosen by their
+own *_BACKEND setting; both talk to the server at REDIS_URL.
+"""
+import os
+from typing import Callable, TypeVar
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+T = TypeVar("T")
+
+
+def redis_client(url: str = REDIS_URL):
+    # Imported here: redis is optional, and only deployments that select it need it installed
+    import redis.asyncio as redis
+
+    return redis.from_url(url)
+
+
+def select_backend(kind: str, what: str, local: Callable[[], T], redis: Callable[[], T]) -> T:
+    """`local()` or `redis()` for a "local" / "redis" setting."""
+    if kind == "local":
+        return local()
+    if kind == "redis":
+        return redis()
+    raise ValueError(f"Unknown {what} backend: {kind}")
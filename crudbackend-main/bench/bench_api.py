@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""Reproducible API benchmark: seed a synthetic catalog, then report p50/p95/p99 latency and RPS per scenario
+
+Drives the app in-process through httpx's ASGI transport and/or over HTTP against a local
+uvicorn server, and prints a JSON report. Save one per commit and compare with --baseline:
+
+    python bench/bench_api.py --rows 100000 --output before.json
+    python bench/bench_api.py --rows 100000 --baseline before.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from common import BACKEND, GENRES, WORDS, seed_catalog, title, use_workdir
+
+INVOKED_FROM = os.getcwd()
+WORKDIR = use_workdir("api")
+# Every request comes from one client, so per-IP throttling would turn the login/search runs into 429s.
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+
+import main  # noqa: E402
+
+USERNAME = "bench"
+PASSWORD = "bench-password"
+
+
+# ---------- SCENARIOS ----------
+class Scenarios:
+    """One request per call; each raises on an unexpected status so it is counted as an error."""
+
+    def __init__(self, catalog: dict):
+        self.catalog = catalog
+        self.created: list = []
+        self.headers: dict = {}
+
+    async def login(self, client: httpx.AsyncClient) -> None:
+        await client.post("/signup", data={"username": USERNAME, "email": "bench@example.com", "password": PASSWORD})
+        response = await client.post("/token", data={"username": USERNAME, "password": PASSWORD})
+        response.raise_for_status()
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    def _song_id(self, rng: random.Random) -> int:
+        return rng.randint(1, self.catalog["songs"])
+
+    async def list(self, client, rng):
+        after = rng.randint(0, max(self.catalog["songs"] - 100, 0))
+        (await client.get("/api/songs/all", params={"limit": 100, "after": after})).raise_for_status()
+
+    async def search(self, client, rng):
+        (await client.get("/api/songs/search", params={"query": rng.choice(WORDS)})).raise_for_status()
+
+    async def nested(self, client, rng):
+        artist = rng.randint(1, self.catalog["artists"])
+        (await client.get(f"/api/artists/{artist}/catalog")).raise_for_status()
+
+    async def create(self, client, rng):
+        response = await client.post("/api/songs/create", data={"Songs_name": title(rng), "Gener": rng.choice(GENRES)})
+        response.raise_for_status()
+        self.created.append(response.json()["Songs_id"])
+
+    async def read(self, client, rng):
+        (await client.get(f"/api/songs/{self._song_id(rng)}")).raise_for_status()
+
+    async def update(self, client, rng):
+        response = await client.put(
+            f"/api/songs/{self._song_id(rng)}", data={"Songs_name": title(rng), "Gener": rng.choice(GENRES)}
+        )
+        response.raise_for_status()
+
+    async def delete(self, client, rng):
+        # Only delete rows this run created, so repeated scenarios see the same catalog.
+        (await client.delete(f"/api/songs/{self.created.pop()}")).raise_for_status()
+
+    async def token(self, client, rng):
+        response = await client.post("/token", data={"username": USERNAME, "password": PASSWORD})
+        response.raise_for_status()
+
+    async def me(self, client, rng):
+        (await client.get("/users/me/", headers=self.headers)).raise_for_status()
+
+
+SCENARIOS = ("list", "search", "nested", "create", "read", "update", "delete", "token", "me")
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def drive(client, step, requests: int, concurrency: int, seed: int, warmup: int) -> dict:
+    rng = random.Random(seed)
+    for _ in range(warmup):
+        try:
+            await step(client, rng)
+        except httpx.HTTPError:
+            pass
+
+    latencies = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker(worker_id: int):
+        nonlocal errors
+        worker_rng = random.Random(seed * 1000 + worker_id)
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                await step(client, worker_rng)
+            except (httpx.HTTPError, IndexError):
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": round(len(latencies) / wall, 1) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+    }
+
+
+async def run_scenarios(client, catalog: dict, args) -> list:
+    scenarios = Scenarios(catalog)
+    await scenarios.login(client)
+    results = []
+    for name in args.scenarios:
+        # Password hashing is deliberately slow, so logins get their own (smaller) request count.
+        requests = args.login_requests if name == "token" else args.requests
+        if name == "delete":
+            requests = min(requests, max(len(scenarios.created) - args.warmup, 0))
+        result = await drive(client, getattr(scenarios, name), requests, args.concurrency, args.seed, args.warmup)
+        results.append({"scenario": name, **result})
+    return results
+
+
+# ---------- TARGETS ----------
+async def run_inproc(catalog: dict, args) -> list:
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        return await run_scenarios(client, catalog, args)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def run_server(catalog: dict, args) -> list:
+    port = _free_port()
+    env = {**os.environ, "PYTHONPATH": BACKEND + os.pathsep + os.environ.get("PYTHONPATH", "")}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=WORKDIR, env=env,
+    )
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None, limits=limits) as client:
+            for _ in range(300):
+                try:
+                    (await client.get("/metrics")).raise_for_status()
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("uvicorn did not start")
+            return await run_scenarios(client, catalog, args)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+# ---------- REPORT ----------
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Scenarios whose p95 grew or RPS dropped by more than `tolerance` against the baseline."""
+    before = {(r["mode"], r["scenario"]): r for r in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        old = before.get((result["mode"], result["scenario"]))
+        if not old:
+            continue
+        if old["p95_ms"] and result["p95_ms"] > old["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{result['mode']}/{result['scenario']}: p95 {old['p95_ms']}ms -> {result['p95_ms']}ms")
+        if old["rps"] and result["rps"] < old["rps"] * (1 - tolerance):
+            regressions.append(f"{result['mode']}/{result['scenario']}: rps {old['rps']} -> {result['rps']}")
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000, help="songs to seed (e.g. 10000, 100000, 1000000)")
+    parser.add_argument("--mode", choices=("inproc", "server", "both"), default="inproc")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=500, help="timed requests per scenario")
+    parser.add_argument("--login-requests", type=int, default=50, help="timed requests for the token scenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="earlier report to compare against; exits 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative p95/RPS change")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    catalog = seed_catalog(args.rows, args.seed)
+    results = []
+    for mode, run in (("inproc", run_inproc), ("server", run_server)):
+        if args.mode in (mode, "both"):
+            results.extend({"mode": mode, **r} for r in asyncio.run(run(catalog, args)))
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "rows": args.rows,
+        "concurrency": args.concurrency,
+        "seed": args.seed,
+        "catalog": catalog,
+        "results": results,
+    }
+    body = json.dumps(report, indent=2)
+    if args.output:
+        with open(os.path.join(INVOKED_FROM, args.output), "w") as f:
+            f.write(body + "\n")
+    else:
+        print(body)
+
+    if args.baseline:
+        with open(os.path.join(INVOKED_FROM, args.baseline)) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit("Regressions:\n  " + "\n  ".join(regressions))
+
+
+if __name__ == "__main__":
+    main_cli()
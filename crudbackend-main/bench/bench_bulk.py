@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""Compare catalog import throughput: one /api/songs/create per row vs. /api/songs/bulk"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from common import use_workdir
+
+use_workdir("bulk")
+
+import main  # noqa: E402
+
+
+def songs(n: int, offset: int = 0) -> list:
+    return [{"Songs_name": f"Song {offset + i}", "Gener": "Rock"} for i in range(n)]
+
+
+async def run(rows: int) -> list:
+    transport = httpx.ASGITransport(app=main.app)
+    results = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        for song in songs(rows):
+            response = await client.post("/api/songs/create", data=song)
+            response.raise_for_status()
+        results.append(("single-row", time.perf_counter() - start))
+
+        start = time.perf_counter()
+        response = await client.post("/api/songs/bulk", json=songs(rows, rows))
+        response.raise_for_status()
+        results.append(("bulk-json", time.perf_counter() - start))
+
+        body = "".join(json.dumps(song) + "\n" for song in songs(rows, 2 * rows))
+        start = time.perf_counter()
+        response = await client.post("/api/songs/bulk", content=body, headers={"content-type": "application/x-ndjson"})
+        response.raise_for_status()
+        results.append(("bulk-ndjson", time.perf_counter() - start))
+    return [{"mode": mode, "rows": rows, "seconds": round(t, 3), "rows_per_sec": round(rows / t, 1)} for mode, t in results]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2_000)
+    args = parser.parse_args()
+    for result in asyncio.run(run(args.rows)):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Measure how the change feed scales with idle subscribers
+
+Opens N subscribers in one process, then times how long a committed write takes to reach all of
+them, and reports the memory each idle subscriber costs. The dispatcher reads the log once per
+write whatever N is, so fan-out should grow with N only by a queue put per subscriber.
+"""
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+
+from common import use_workdir
+
+use_workdir("changes")
+
+import database  # noqa: E402
+import main  # noqa: E402
+from changefeed import FEED_TABLES, change_feed  # noqa: E402
+
+
+async def write_and_wait(subscribers: list) -> float:
+    start = time.perf_counter()
+    async with database.AsyncSessionLocal() as db:
+        db.add(main.Artist(Artist_name="bench", Country="UK"))
+        await db.commit()
+    await main.catalog_changed("Artist")
+    await asyncio.gather(*(s.queue.get() for s in subscribers))
+    return time.perf_counter() - start
+
+
+async def run(clients: int, writes: int) -> dict:
+    await change_feed.start()
+    try:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        subscribers = [await change_feed.subscribe(frozenset(FEED_TABLES)) for _ in range(clients)]
+        per_client = sum(s.size_diff for s in tracemalloc.take_snapshot().compare_to(before, "filename")) / clients
+        tracemalloc.stop()
+
+        timings = sorted([await write_and_wait(subscribers) for _ in range(writes)])
+        return {
+            "clients": clients,
+            "bytes_per_idle_client": round(per_client),
+            "fanout_p50_ms": round(timings[len(timings) // 2] * 1000, 2),
+            "fanout_max_ms": round(timings[-1] * 1000, 2),
+        }
+    finally:
+        await change_feed.stop()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 1000, 5000])
+    parser.add_argument("--writes", type=int, default=20)
+    args = parser.parse_args()
+    database.init_db()
+    for clients in args.clients:
+        print(json.dumps(asyncio.run(run(clients, args.writes))))
+
+
+if __name__ == "__main__":
+    main_cli()
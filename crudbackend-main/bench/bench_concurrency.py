@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Load test: show that concurrent catalog requests overlap instead of queueing on the event loop"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+from common import seed_catalog, use_workdir
+
+use_workdir("concurrency")
+
+import database  # noqa: E402
+import main  # noqa: E402
+
+
+async def monitor_loop(stop: asyncio.Event, lags: list, interval: float = 0.005) -> None:
+    # How late a short sleep wakes up is how long something else held the event loop.
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run(concurrency: int, path: str) -> dict:
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        await client.get(path)
+        single = time.perf_counter() - start
+
+        stop = asyncio.Event()
+        lags: list = []
+        monitor = asyncio.create_task(monitor_loop(stop, lags))
+
+        async def one():
+            t = time.perf_counter()
+            response = await client.get(path)
+            response.raise_for_status()
+            return time.perf_counter() - t
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one() for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+        stop.set()
+        await monitor
+
+    return {
+        "path": path,
+        "concurrency": concurrency,
+        "single_request_s": round(single, 4),
+        "wall_s": round(wall, 4),
+        "serial_estimate_s": round(single * concurrency, 4),
+        "mean_latency_s": round(statistics.mean(latencies), 4),
+        "max_loop_stall_ms": round(max(lags, default=0.0) * 1000, 2),
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--path", default="/api/songs/all?limit=1000")
+    args = parser.parse_args()
+    database.init_db()
+    seed_catalog(args.rows)
+    print(json.dumps(asyncio.run(run(args.concurrency, args.path)), indent=2))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Time DELETE /api/songs/{id} and the garbage collection that follows it
+
+Seeds --rows songs, each holding its own stored file, deletes --deletes of them through the API
+and reports per-request latency, then runs one collector pass and reports how fast it purges the
+rows and unlinks their files. A delete is a single UPDATE on the primary key, so its latency
+should not depend on --rows or on file system speed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import httpx
+
+from common import use_workdir
+
+use_workdir("deletes")
+
+from sqlalchemy import insert  # noqa: E402
+
+import database  # noqa: E402
+import main  # noqa: E402
+from garbage import collector  # noqa: E402
+from models import AudioBlob, Song  # noqa: E402
+
+
+def seed(rows: int) -> None:
+    os.makedirs(main.UPLOAD_DIR, exist_ok=True)
+    paths = [os.path.join(main.UPLOAD_DIR, f"{i:064x}.mp3") for i in range(rows)]
+    for path in paths:
+        with open(path, "wb") as f:
+            f.write(b"\0" * 4096)
+    with database.get_engine().begin() as conn:
+        conn.execute(insert(AudioBlob), [{"path": p, "sha256": os.path.basename(p)[:64], "size": 4096, "ref_count": 1} for p in paths])
+        conn.execute(insert(Song), [{"Songs_name": f"Song {i}", "Gener": "Rock", "audio_file": p} for i, p in enumerate(paths)])
+
+
+async def run(deletes: int) -> list:
+    transport = httpx.ASGITransport(app=main.app)
+    timings = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for song_id in range(1, deletes + 1):
+            start = time.perf_counter()
+            response = await client.delete(f"/api/songs/{song_id}")
+            timings.append(time.perf_counter() - start)
+            response.raise_for_status()
+    timings.sort()
+    results = [{
+        "step": "delete", "requests": deletes,
+        "p50_ms": round(timings[len(timings) // 2] * 1000, 2),
+        "p99_ms": round(timings[int(len(timings) * 0.99)] * 1000, 2),
+    }]
+
+    collector.unlink_delay = 0  # unlink in the same pass instead of one GC_UNLINK_DELAY_SECONDS later
+    start = time.perf_counter()
+    counts = await collector.collect()
+    seconds = time.perf_counter() - start
+    results.append({"step": "collect", **counts, "seconds": round(seconds, 3), "rows_per_second": round(counts["rows"] / seconds)})
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--deletes", type=int, default=2_000)
+    args = parser.parse_args()
+    database.init_db()
+    seed(args.rows)
+    for result in asyncio.run(run(min(args.deletes, args.rows))):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Measure the per-request overhead of the metrics middleware and SQL hooks"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+import httpx
+
+from common import seed_catalog, use_workdir
+
+use_workdir("metrics")
+
+import database  # noqa: E402
+import main  # noqa: E402
+import metrics  # noqa: E402
+
+PATHS = {
+    "cached_list": "/api/songs/all?limit=50",
+    "entity": "/api/songs/1",
+    "nested": "/api/catalog?limit=10",
+}
+
+
+async def run(requests: int) -> list:
+    transport = httpx.ASGITransport(app=main.app)
+    results = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for name, path in PATHS.items():
+            timings = {}
+            # Alternate a few rounds so warm-up and drift hit both modes equally.
+            for _ in range(3):
+                for enabled in (False, True):
+                    metrics.enabled = enabled
+                    start = time.perf_counter()
+                    for _ in range(requests):
+                        (await client.get(path)).raise_for_status()
+                    elapsed = (time.perf_counter() - start) / requests
+                    timings[enabled] = min(timings.get(enabled, elapsed), elapsed)
+            off, on = timings[False], timings[True]
+            results.append({
+                "endpoint": name,
+                "off_us": round(off * 1e6, 1),
+                "on_us": round(on * 1e6, 1),
+                "overhead_us": round((on - off) * 1e6, 1),
+                "overhead_pct": round((on - off) / off * 100, 1),
+            })
+    return results
+
+
+def micro(n: int) -> list:
+    """End-to-end numbers are dominated by noise; time the instrumentation paths on their own."""
+    class Context:
+        pass
+
+    stats = metrics.RequestStats(capture_sql=False)
+    token = metrics._current.set(stats)
+    context = Context()
+    start = time.perf_counter()
+    for _ in range(n):
+        metrics._before_cursor_execute(None, None, "SELECT 1", (), context, False)
+        metrics._after_cursor_execute(None, None, "SELECT 1", (), context, False)
+    per_statement = (time.perf_counter() - start) / n
+    metrics._current.reset(token)
+
+    registry = metrics.Registry()
+    start = time.perf_counter()
+    for i in range(n):
+        registry.observe("GET", f"/route/{i % 20}", 200, 0.004, stats)
+    per_request = (time.perf_counter() - start) / n
+    return [
+        {"path": "sql_hooks_per_statement", "us": round(per_statement * 1e6, 3)},
+        {"path": "registry_observe_per_request", "us": round(per_request * 1e6, 3)},
+    ]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--rows", type=int, default=1_000)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    database.init_db()
+    seed_catalog(args.rows)
+    for result in asyncio.run(run(args.requests)):
+        print(json.dumps(result))
+    for result in micro(args.requests * 100):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Benchmark login throughput (password verifications/sec) across KDF cost and pool size"""
+import argparse
+import asyncio
+import json
+import time
+
+import common  # noqa: F401  (puts the backend on sys.path)
+from passwords import PasswordService, build_password_hash
+
+PASSWORD = "correct horse battery staple"
+
+
+async def run_case(service: PasswordService, hashed: str, logins: int, concurrency: int) -> float:
+    remaining = logins
+
+    async def client():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            verified, _ = await service.verify_and_update(PASSWORD, hashed)
+            assert verified
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return logins / (time.perf_counter() - start)
+
+
+def cost_cases(scheme: str) -> list:
+    if scheme == "bcrypt":
+        return [{"bcrypt_rounds": r} for r in (10, 11, 12)]
+    return [
+        {"argon2_time_cost": t, "argon2_memory_cost": m}
+        for t, m in ((1, 19456), (2, 19456), (3, 65536))
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scheme", choices=["argon2", "bcrypt"], default="argon2")
+    parser.add_argument("--pool-sizes", default="1,2,4,8")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    results = []
+    for cost in cost_cases(args.scheme):
+        password_hash = build_password_hash(scheme=args.scheme, **cost)
+        hashed = password_hash.hash(PASSWORD)
+        for pool_size in (int(p) for p in args.pool_sizes.split(",")):
+            # Queue deep enough that the benchmark measures throughput, not rejections.
+            service = PasswordService(password_hash, pool_size=pool_size, queue_limit=args.concurrency, queue_timeout=60)
+            try:
+                rate = asyncio.run(run_case(service, hashed, args.logins, args.concurrency))
+            finally:
+                service.shutdown()
+            results.append({"scheme": args.scheme, **cost, "pool_size": pool_size, "logins_per_sec": round(rate, 1)})
+            print(json.dumps(results[-1]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Time filtered/sorted/projected /all queries and check that SQLite answers them from an index
+
+For each query the script prints the latency of the first page and of a page halfway through the
+results, plus the plan of the latter. Keyset paging should make both cost the same; a plan that
+walks the table up to the cursor, or sorts every match instead of reading an index in order,
+fails the run.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import sys
+import time
+
+import httpx
+from sqlalchemy import text
+from starlette.datastructures import QueryParams
+
+from common import use_workdir
+
+use_workdir("query")
+
+import database  # noqa: E402
+import main  # noqa: E402
+
+GENRES = ["Rock", "Jazz", "Pop", "Folk", "Blues", "Soul", "Metal", "Funk"]
+COUNTRIES = ["Ethiopia", "Kenya", "UK", "USA", "Japan", "Brazil", "Mali", "France"]
+
+# (endpoint, spec, query string)
+QUERIES = [
+    ("songs", main.song_query, "Gener=Jazz"),
+    ("songs", main.song_query, "Gener=Jazz&fields=Songs_id,Songs_name"),
+    ("songs", main.song_query, "sort=Songs_name"),
+    ("songs", main.song_query, "sort=-Songs_name&fields=Songs_name"),
+    ("albums", main.album_query, "Total_tracks[gte]=15"),
+    ("albums", main.album_query, "sort=-Total_tracks"),
+    ("artists", main.artist_query, "Country=Kenya"),
+    ("artists", main.artist_query, "sort=Artist_name"),
+]
+
+
+def seed(rows: int) -> None:
+    database.init_db()
+    rng = random.Random(42)
+    with database.SessionLocal() as db:
+        db.add_all(main.Artist(Artist_name=f"Artist {rng.randrange(rows):07d}", Country=rng.choice(COUNTRIES)) for _ in range(rows))
+        db.add_all(main.Album(Album_title=f"Album {i}", Total_tracks=rng.randrange(1, 21)) for i in range(rows))
+        db.add_all(main.Song(Songs_name=f"Song {rng.randrange(rows):07d}", Gener=rng.choice(GENRES)) for _ in range(rows))
+        db.commit()
+        db.execute(text("ANALYZE"))
+
+
+def parse(spec, query: str):
+    params = QueryParams(query)
+    return spec.parse(params, params.get("sort"), params.get("fields"))
+
+
+def middle_cursor(spec, query: str) -> str:
+    q = parse(spec, query)
+    with database.get_engine().connect() as conn:
+        total = len(conn.execute(spec.select(q)).all())
+        row = conn.execute(spec.select(q).offset(total // 2).limit(1)).first()
+    return spec.next_cursor_headers(q, [row], 1)[main.NEXT_CURSOR_HEADER]
+
+
+def plan(spec, query: str, after: str, limit: int) -> str:
+    stmt = spec.select(parse(spec, query), after, limit)
+    compiled = stmt.compile(database.get_engine(), compile_kwargs={"literal_binds": True})
+    with database.get_engine().connect() as conn:
+        return " | ".join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+
+
+async def page_ms(client, endpoint: str, query: str, limit: int, repeat: int, after=None) -> float:
+    params = f"{query}&limit={limit}" + (f"&after={after}" if after else "")
+    best = float("inf")
+    for _ in range(repeat):
+        await main.response_cache.invalidate("Album", "Song", "Artist")
+        start = time.perf_counter()
+        response = await client.get(f"/api/{endpoint}/all?{params}")
+        best = min(best, time.perf_counter() - start)
+        response.raise_for_status()
+    return round(best * 1000, 2)
+
+
+async def run(limit: int, repeat: int) -> list:
+    transport = httpx.ASGITransport(app=main.app)
+    results = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for endpoint, spec, query in QUERIES:
+            cursor = middle_cursor(spec, query)
+            results.append({
+                "endpoint": endpoint,
+                "query": query,
+                "first_ms": await page_ms(client, endpoint, query, limit, repeat),
+                "middle_ms": await page_ms(client, endpoint, query, limit, repeat, cursor),
+                "plan": plan(spec, query, cursor, limit),
+            })
+    return results
+
+
+def walks_table(plan_text: str) -> bool:
+    steps = plan_text.split(" | ")
+    # A full scan of a catalog table, or a sort of every match. Small sorts of the per-range
+    # pages that a keyset UNION ALL merges are fine.
+    return any(re.match(r"SCAN (Song|Album|Artist)\b", step) for step in steps) or (
+        "TEMP B-TREE" in plan_text and "UNION ALL" not in plan_text
+    )
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50_000, help="rows per catalog table")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    seed(args.rows)
+
+    slow = []
+    for result in asyncio.run(run(args.limit, args.repeat)):
+        print(json.dumps(result))
+        if walks_table(result["plan"]):
+            slow.append(f"{result['endpoint']}?{result['query']}")
+    if slow:
+        sys.exit(f"Not served by an index: {slow}")
+    print(f"OK: all {len(QUERIES)} queries use an index")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Report SQL statements and latency of the nested catalog endpoints as the catalog grows
+
+The statement counts should not change with the size (tests/test_relations.py asserts that).
+selectinload sends parent keys in chunks of 500, so counts only stay flat while each level of a
+page has fewer than 500 parents; the default sizes stay below that.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+from sqlalchemy import event
+
+from common import use_workdir
+
+use_workdir("relations")
+
+import database  # noqa: E402
+import main  # noqa: E402
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def seed(artists: int, albums_per_artist: int, songs_per_album: int) -> None:
+    database.init_db()
+    db = database.SessionLocal()
+    try:
+        db.query(main.Song).delete()
+        db.query(main.Album).delete()
+        db.query(main.Artist).delete()
+        for a in range(artists):
+            artist = main.Artist(Artist_name=f"Artist {a}", Country="UK")
+            db.add(artist)
+            db.flush()
+            for b in range(albums_per_artist):
+                album = main.Album(Album_title=f"Album {a}.{b}", Total_tracks=songs_per_album, artist_id=artist.Artist_id)
+                db.add(album)
+                db.flush()
+                db.add_all(
+                    main.Song(Songs_name=f"Song {a}.{b}.{s}", Gener="Rock", album_id=album.Album_id, artist_id=artist.Artist_id)
+                    for s in range(songs_per_album)
+                )
+        db.commit()
+    finally:
+        db.close()
+
+
+async def measure(counter: StatementCounter, size: int) -> dict:
+    seed(size, size, size)
+    await main.response_cache.invalidate("Artist", "Album", "Song")
+    transport = httpx.ASGITransport(app=main.app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        artist = (await client.get("/api/artists/all")).json()[-1]
+        album = (await client.get("/api/albums/all")).json()[-1]
+        paths = {
+            "album_tracks": f"/api/albums/{album['Album_id']}/tracks",
+            "artist_catalog": f"/api/artists/{artist['Artist_id']}/catalog",
+            "catalog_page": f"/api/catalog?limit={size}",
+        }
+        for name, path in paths.items():
+            before = counter.count
+            start = time.perf_counter()
+            response = await client.get(path)
+            response.raise_for_status()
+            results[name] = {"statements": counter.count - before, "ms": round((time.perf_counter() - start) * 1000, 2)}
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2, 5, 20],
+                        help="artists = albums per artist = songs per album")
+    args = parser.parse_args()
+    counter = StatementCounter(database.get_async_engine().sync_engine)
+
+    for size in args.sizes:
+        for endpoint, result in asyncio.run(measure(counter, size)).items():
+            print(json.dumps({"endpoint": endpoint, "size": size, **result}))
+
+if __name__ == "__main__":
+    main_cli()
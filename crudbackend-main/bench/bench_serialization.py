@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Benchmark list serialization: ORM objects + jsonable_encoder/json vs. column rows + RowEncoder/orjson"""
+import argparse
+import json
+import os
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from common import use_workdir
+
+use_workdir("serialization")
+
+import database  # noqa: E402
+import main  # noqa: E402
+from serialization import dumps, orjson  # noqa: E402
+
+
+def seed(rows: int) -> None:
+    database.init_db()
+    db = database.SessionLocal()
+    try:
+        db.bulk_insert_mappings(main.Song, [
+            {"Songs_name": f"Song {i}", "Gener": "Rock", "audio_file": f"static/{i:064x}.mp3"} for i in range(rows)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def legacy_path(db) -> tuple:
+    start = time.perf_counter()
+    songs = db.query(main.Song).all()
+    fetched = time.perf_counter()
+    payload = [
+        {
+            "Songs_id": s.Songs_id,
+            "Songs_name": s.Songs_name,
+            "Gener": s.Gener,
+            "audio_url": f"/static/{os.path.basename(s.audio_file)}" if s.audio_file else None
+        } for s in songs
+    ]
+    body = json.dumps(jsonable_encoder(payload)).encode()
+    return fetched - start, time.perf_counter() - fetched, len(body)
+
+
+def fast_path(db) -> tuple:
+    start = time.perf_counter()
+    rows = db.execute(main.song_encoder.select()).all()
+    fetched = time.perf_counter()
+    body = dumps(main.song_encoder.encode_all(rows))
+    return fetched - start, time.perf_counter() - fetched, len(body)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    seed(args.rows)
+
+    for name, path in (("orm+jsonable_encoder+json", legacy_path), ("rows+RowEncoder+" + ("orjson" if orjson else "json"), fast_path)):
+        fetch_times, encode_times = [], []
+        for _ in range(args.repeat):
+            db = database.SessionLocal()
+            try:
+                fetch, encode, size = path(db)
+            finally:
+                db.close()
+            fetch_times.append(fetch)
+            encode_times.append(encode)
+        print(json.dumps({
+            "path": name,
+            "rows": args.rows,
+            "bytes": size,
+            "fetch_ms_per_10k": round(min(fetch_times) * 1000 * 10_000 / args.rows, 2),
+            "serialize_ms_per_10k": round(min(encode_times) * 1000 * 10_000 / args.rows, 2),
+        }))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Measure cold start: time to import the app, and from import to the first answered request"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from common import BACKEND
+
+# Runs in a fresh interpreter per sample, so module caches and open connections never carry over.
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {here!r})
+import main
+imported = time.perf_counter()
+import database
+connected_at_import = database._engine is not None
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    client.get("/api/songs/all?limit=1").raise_for_status()
+answered = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - start) * 1000,
+    "first_request_ms": (answered - imported) * 1000,
+    "engine_at_import": connected_at_import,
+}}))
+"""
+
+
+def sample(workdir: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE.format(here=BACKEND)],
+        cwd=workdir, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    for state in ("fresh_db", "migrated_db"):
+        samples = []
+        workdir = tempfile.mkdtemp(prefix="bench-startup-")
+        if state == "migrated_db":
+            sample(workdir)
+        for _ in range(args.runs):
+            if state == "fresh_db":
+                workdir = tempfile.mkdtemp(prefix="bench-startup-")
+            samples.append(sample(workdir))
+        print(json.dumps({
+            "state": state,
+            "runs": args.runs,
+            "import_ms": round(statistics.median(s["import_ms"] for s in samples), 1),
+            "first_request_ms": round(statistics.median(s["first_request_ms"] for s in samples), 1),
+            "engine_at_import": any(s["engine_at_import"] for s in samples),
+        }))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Export and re-import the song table in every format, reporting throughput and peak memory
+
+Seeds --rows songs, exports them to each format, then restores each file into a fresh database,
+as a migration would. Peak RSS is reported after every step; with batched encoding and loading it
+should stay roughly flat as --rows grows.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import time
+
+from common import use_workdir
+
+use_workdir("transfer")
+
+from sqlalchemy import insert  # noqa: E402
+
+import database  # noqa: E402
+import transfer  # noqa: E402
+from models import Song  # noqa: E402
+
+GENRES = ["Rock", "Jazz", "Pop", "Folk", "Blues", "Soul", "Metal", "Funk"]
+
+
+def peak_rss_mb() -> float:
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def seed(rows: int) -> None:
+    with database.get_engine().begin() as conn:
+        for start in range(0, rows, 100_000):
+            conn.execute(insert(Song), [
+                {"Songs_name": f"Song {i}", "Gener": GENRES[i % len(GENRES)]}
+                for i in range(start, min(rows, start + 100_000))
+            ])
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+    database.init_db()
+    seed(args.rows)
+    print(json.dumps({"step": "seed", "rows": args.rows, "peak_rss_mb": peak_rss_mb()}))
+
+    formats = [f for f in transfer.MEDIA_TYPES if f != "parquet" or transfer.pyarrow is not None]
+    for fmt in formats:
+        path = f"songs.{fmt}"
+        start = time.perf_counter()
+        with open(path, "wb") as out:
+            rows = transfer.export_table("songs", out, fmt)
+        seconds = time.perf_counter() - start
+        print(json.dumps({
+            "step": "export", "format": fmt, "rows": rows, "seconds": round(seconds, 2),
+            "rows_per_second": round(rows / seconds), "file_mb": round(os.path.getsize(path) / 2**20, 1),
+            "peak_rss_mb": peak_rss_mb(),
+        }))
+
+    for fmt in formats:
+        asyncio.run(database.dispose_engines())
+        database.init_db(f"sqlite:///./restore-{fmt}.db")
+        with open(f"songs.{fmt}", "rb") as f:
+            result = transfer.import_table("songs", f, fmt)
+        print(json.dumps({"step": "import", "format": fmt, **result, "peak_rss_mb": peak_rss_mb()}))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Measure throughput against serve.py with 1, 2, 4, ... workers, up to the core count
+
+Each run starts the launcher on a seeded throwaway database and drives it from several client
+processes (so the load generator is not the bottleneck) with uncached page reads: random keyset
+cursors defeat the response cache. With shared-nothing workers, requests per second should grow
+almost linearly until the cores are used up.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+
+from common import BACKEND, seed_catalog, use_workdir
+
+
+async def _client(url: str, rows: int, seconds: float, connections: int) -> int:
+    done = 0
+    deadline = time.perf_counter() + seconds
+    rng = random.Random()
+    async with httpx.AsyncClient(base_url=url, timeout=30) as client:
+        async def loop():
+            nonlocal done
+            while time.perf_counter() < deadline:
+                response = await client.get(f"/api/songs/all?limit=20&after={rng.randrange(rows)}")
+                response.raise_for_status()
+                done += 1
+
+        await asyncio.gather(*(loop() for _ in range(connections)))
+    return done
+
+
+def client_process(args) -> int:
+    return asyncio.run(_client(*args))
+
+
+def wait_ready(url: str) -> None:
+    for _ in range(300):
+        try:
+            httpx.get(url + "/api/songs/all?limit=1").raise_for_status()
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def run(workers: int, args) -> dict:
+    url = f"http://127.0.0.1:{args.port}"
+    env = dict(os.environ, RATE_LIMIT_ENABLED="0", JOB_WORKERS="0")
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND, "serve.py"), "--workers", str(workers), "--host", "127.0.0.1", "--port", str(args.port)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_ready(url)
+        with multiprocessing.get_context("spawn").Pool(args.clients) as pool:
+            start = time.perf_counter()
+            counts = pool.map(client_process, [(url, args.rows, args.seconds, args.connections)] * args.clients)
+            elapsed = time.perf_counter() - start
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+    return {"workers": workers, "requests": sum(counts), "requests_per_second": round(sum(counts) / elapsed, 1)}
+
+
+def main_cli():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, *(2 ** i for i in range(1, cores.bit_length()) if 2 ** i <= cores), cores}))
+    parser.add_argument("--clients", type=int, default=max(2, cores // 2), help="load generator processes")
+    parser.add_argument("--connections", type=int, default=16, help="concurrent requests per client process")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--port", type=int, default=8077)
+    args = parser.parse_args()
+
+    # The launcher resolves app.db relative to the cwd
+    use_workdir("workers")
+    import database
+
+    database.init_db()
+    seed_catalog(args.rows)
+    asyncio.run(database.dispose_engines())
+    baseline = None
+    for workers in args.workers:
+        result = run(workers, args)
+        baseline = baseline or result["requests_per_second"] / workers
+        result["speedup_vs_linear"] = round(result["requests_per_second"] / (baseline * workers), 2)
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,72 @@
+"""Setup shared by the benchmarks in this directory
+
+Importing this module puts the backend on sys.path. Call use_workdir() before importing main or
+database: they resolve app.db and static/ relative to the cwd, so every run gets a throwaway
+database.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+SEED_CHUNK = 50_000
+WORDS = (
+    "midnight velvet echo river neon golden broken summer electric silent paper wild "
+    "crystal shadow ocean fire desert city lonely heart dream thunder silver rain "
+    "northern highway sugar glass winter honey violet storm hollow radio stone "
+    "satellite cherry faded blue morning secret"
+).split()
+GENRES = ("Rock", "Pop", "Jazz", "Hip-Hop", "Electronic", "Folk", "Classical", "Soul")
+COUNTRIES = ("UK", "USA", "Canada", "Ethiopia", "Nigeria", "Japan", "Brazil", "Germany")
+
+
+def use_workdir(name: str) -> str:
+    """Change into a new temporary directory for this run and return it."""
+    workdir = tempfile.mkdtemp(prefix=f"bench-{name}-")
+    os.chdir(workdir)
+    return workdir
+
+
+# ---------- SYNTHETIC CATALOG ----------
+def title(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3))).title()
+
+
+def _chunks(total: int, make):
+    for start in range(0, total, SEED_CHUNK):
+        yield [make(i) for i in range(start + 1, min(start + SEED_CHUNK, total) + 1)]
+
+
+def seed_catalog(rows: int, seed: int = 42) -> dict:
+    """Insert `rows` songs, rows/10 albums and rows/100 artists with executemany batches."""
+    from sqlalchemy import insert
+
+    import database
+    from models import Album, Artist, Song
+
+    rng = random.Random(seed)
+    artists = max(rows // 100, 1)
+    albums = max(rows // 10, 1)
+    plan = (
+        (Artist, artists, lambda i: {
+            "Artist_id": i, "Artist_name": title(rng), "Country": rng.choice(COUNTRIES),
+        }),
+        (Album, albums, lambda i: {
+            "Album_id": i, "Album_title": title(rng), "Total_tracks": rng.randint(5, 20),
+            "artist_id": rng.randint(1, artists),
+        }),
+        (Song, rows, lambda i: {
+            "Songs_id": i, "Songs_name": title(rng), "Gener": rng.choice(GENRES),
+            "album_id": (album := rng.randint(1, albums)), "artist_id": album % artists + 1,
+        }),
+    )
+    start = time.perf_counter()
+    for model, total, make in plan:
+        for chunk in _chunks(total, make):
+            with database.get_engine().begin() as conn:
+                conn.execute(insert(model), chunk)
+    return {"artists": artists, "albums": albums, "songs": rows, "seconds": round(time.perf_counter() - start, 2)}
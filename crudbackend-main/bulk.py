@@ -0,0 +1,217 @@
+import json
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Optional, Type
+
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+BULK_BATCH_SIZE = 1000
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+BULK_OPS = ("create", "upsert", "update", "delete")
+
+
+class _InvalidLine:
+    def __init__(self, detail: str):
+        self.detail = detail
+
+
+def _parse_line(line: bytes):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return _InvalidLine(f"Invalid JSON: {e}")
+
+
+async def iter_request_items(request: Request) -> AsyncIterator[Any]:
+    """Yield bulk items from a JSON array body, or line by line from an NDJSON stream."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type in NDJSON_MEDIA_TYPES:
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield _parse_line(line)
+        if buffer.strip():
+            yield _parse_line(buffer)
+        return
+    try:
+        items = json.loads(await request.body())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array or an NDJSON stream")
+    for item in items:
+        yield item
+
+
+@dataclass
+class _Item:
+    index: int
+    op: str
+    id: Optional[int]
+    values: Optional[dict]
+
+
+class BulkProcessor:
+    """Applies create/upsert/update/delete items to one table in batched transactions.
+
+    Each batch is grouped by operation and sent as a few executemany statements inside a
+    single transaction. If a batch fails, only that batch's items are reported as errors.
+    Deletes are soft, like the single-row handlers': the garbage collector purges the rows and
+    releases their audio later.
+    """
+
+    def __init__(self, model, key: str, schema: Type[BaseModel], batch_size: int = BULK_BATCH_SIZE):
+        self.model = model
+        self.key = key
+        self.key_column = getattr(model, key)
+        self.schema = schema
+        self.batch_size = batch_size
+        # field -> referenced key column, e.g. artist_id -> Artist.Artist_id
+        self.references = {fk.parent.name: fk.column for fk in sorted(model.__table__.foreign_keys, key=lambda fk: fk.parent.name)}
+
+    def _upsert_set(self, stmt) -> dict:
+        set_ = {field: stmt.excluded[field] for field in self.schema.model_fields}
+        if hasattr(self.model, "updated_at"):
+            set_["updated_at"] = func.now()
+        # Upserting a soft-deleted row brings it back; it still holds its audio reference
+        set_["deleted_at"] = None
+        return set_
+
+    def _error(self, index: int, detail, status: int = 422, id: Optional[int] = None) -> dict:
+        return {"index": index, "status": "error", "code": status, self.key: id, "detail": detail}
+
+    def _validate(self, index: int, raw: Any):
+        if isinstance(raw, _InvalidLine):
+            return self._error(index, raw.detail, 400)
+        if not isinstance(raw, dict):
+            return self._error(index, "Item must be a JSON object")
+        raw = dict(raw)
+        op = raw.pop("op", "create")
+        id = raw.pop(self.key, None)
+        if op not in BULK_OPS:
+            return self._error(index, f"Unknown op '{op}', expected one of {', '.join(BULK_OPS)}", id=id)
+        if op != "create" and id is None:
+            return self._error(index, f"'{op}' requires {self.key}")
+        if op == "create" and id is not None:
+            op = "upsert"
+        if op == "delete":
+            return _Item(index, op, id, None)
+        try:
+            # An update only writes the fields it names, like the single-row PUT keeps omitted references
+            values = self.schema.model_validate(raw).model_dump(exclude_unset=op == "update")
+        except ValidationError as e:
+            return self._error(index, e.errors(include_url=False), id=id)
+        return _Item(index, op, id, values)
+
+    async def _check_references(self, db: AsyncSession, batch: list, results: list) -> list:
+        """Report items pointing at rows that do not exist or are deleted, and return the others."""
+        missing = {}
+        for field, column in self.references.items():
+            ids = {item.values[field] for item in batch if item.values and item.values.get(field) is not None}
+            if ids:
+                # A soft-deleted row counts as missing, as it does for check_reference
+                found = set((await db.execute(select(column).where(column.in_(ids), column.table.c.deleted_at.is_(None)))).scalars())
+                missing[field] = ids - found
+        valid = []
+        for item in batch:
+            bad = [field for field, ids in missing.items() if item.values and item.values.get(field) in ids]
+            if bad:
+                detail = "; ".join(f"{self.references[f].table.name} {item.values[f]} not found" for f in bad)
+                results.append(self._error(item.index, detail, id=item.id))
+            else:
+                valid.append(item)
+        return valid
+
+    async def _apply(self, db: AsyncSession, batch: list) -> list:
+        results = []
+        batch = await self._check_references(db, batch, results)
+        by_op = {op: [item for item in batch if item.op == op] for op in BULK_OPS}
+        live = self.model.deleted_at.is_(None)
+
+        if by_op["delete"]:
+            ids = [item.id for item in by_op["delete"]]
+            rows = await db.execute(
+                update(self.model)
+                .where(self.key_column.in_(ids), live)
+                .values(deleted_at=func.now())
+                .returning(self.key_column)
+                .execution_options(synchronize_session=False)
+            )
+            found = set(rows.scalars())
+            for item in by_op["delete"]:
+                if item.id in found:
+                    results.append({"index": item.index, "status": "deleted", self.key: item.id})
+                else:
+                    results.append(self._error(item.index, "Not found", 404, item.id))
+
+        if by_op["update"]:
+            ids = [item.id for item in by_op["update"]]
+            existing = set((await db.execute(select(self.key_column).where(self.key_column.in_(ids), live))).scalars())
+            rows = [{self.key: item.id, **item.values} for item in by_op["update"] if item.id in existing]
+            if rows:
+                await db.execute(update(self.model), rows)
+            for item in by_op["update"]:
+                if item.id in existing:
+                    results.append({"index": item.index, "status": "updated", self.key: item.id})
+                else:
+                    results.append(self._error(item.index, "Not found", 404, item.id))
+
+        if by_op["upsert"]:
+            stmt = sqlite_insert(self.model)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[self.key_column],
+                set_=self._upsert_set(stmt),
+            )
+            await db.execute(stmt, [{self.key: item.id, **item.values} for item in by_op["upsert"]])
+            results.extend({"index": item.index, "status": "upserted", self.key: item.id} for item in by_op["upsert"])
+
+        if by_op["create"]:
+            created = await db.execute(
+                insert(self.model).returning(self.key_column, sort_by_parameter_order=True),
+                [item.values for item in by_op["create"]],
+            )
+            for item, id in zip(by_op["create"], created.scalars()):
+                results.append({"index": item.index, "status": "created", self.key: id})
+
+        return results
+
+    async def _flush(self, db: AsyncSession, batch: list, results: list) -> None:
+        if not batch:
+            return
+        try:
+            batch_results = await self._apply(db, batch)
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            detail = str(getattr(e, "orig", e))  # the driver's message, without the SQL and parameters
+            results.extend(self._error(item.index, detail, 500, item.id) for item in batch)
+            return
+        results.extend(batch_results)
+
+    async def run(self, db: AsyncSession, items: AsyncIterator[Any]) -> dict:
+        results = []
+        batch = []
+        index = 0
+        async for raw in items:
+            item = self._validate(index, raw)
+            index += 1
+            if isinstance(item, dict):
+                results.append(item)
+                continue
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                await self._flush(db, batch, results)
+                batch = []
+        await self._flush(db, batch, results)
+
+        results.sort(key=lambda r: r["index"])
+        summary = {}
+        for r in results:
+            summary[r["status"]] = summary.get(r["status"], 0) + 1
+        return {"total": index, "summary": summary, "results": results}
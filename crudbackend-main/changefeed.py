@@ -0,0 +1,348 @@
+"""Catalog change feed: an append-only ChangeLog filled by triggers, fanned out to SSE and WebSocket clients.
+
+Every insert/update/delete on a catalog table appends (id, table, row id, op) to ChangeLog in the
+writing transaction, including ON DELETE SET NULL updates and bulk batches. Write handlers call
+ChangeFeed.notify() after committing; one dispatcher task then reads the new log rows once and
+hands them to every subscriber, so an idle client is just a parked coroutine. Clients resume with
+Last-Event-ID from the log; if they fall too far behind they get a `reset` event and refetch.
+"""
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import FrozenSet, Iterable, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal, get_db
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# ---------- CONFIG ----------
+FEED_TABLES = {"Album": "Album_id", "Song": "Songs_id", "Artist": "Artist_id"}
+# Changes made by other processes are only seen by polling; the query is a PK range, so it is cheap.
+CHANGE_POLL_SECONDS = float(os.getenv("CHANGE_POLL_SECONDS", "1.0"))
+CHANGE_HEARTBEAT_SECONDS = float(os.getenv("CHANGE_HEARTBEAT_SECONDS", "15"))
+CHANGE_LOG_RETENTION = int(os.getenv("CHANGE_LOG_RETENTION", "100000"))  # rows kept for resuming
+CHANGE_BATCH_SIZE = 1000
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+RESET = object()  # tells a subscriber it missed events and must refetch
+
+
+def _log_statements(table: str, key: str, soft_delete: bool = False) -> list:
+    def log(row: str, op: str) -> str:
+        return f"INSERT INTO ChangeLog(table_name, row_id, op) VALUES ('{table}', {row}.{key}, {op});"
+
+    inserted, updated, deleted = "'insert'", "'update'", "'delete'"
+    update_when = delete_when = ""
+    if soft_delete:
+        # Setting deleted_at is the delete clients see, clearing it an insert; the purge of a
+        # soft-deleted row, and updates to one, are invisible to them and not logged.
+        updated = "CASE WHEN NEW.deleted_at IS NOT NULL THEN 'delete' WHEN OLD.deleted_at IS NOT NULL THEN 'insert' ELSE 'update' END"
+        update_when = "WHEN OLD.deleted_at IS NULL OR NEW.deleted_at IS NULL "
+        delete_when = "WHEN OLD.deleted_at IS NULL "
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_changelog_ai AFTER INSERT ON {table} BEGIN {log('NEW', inserted)} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_changelog_au AFTER UPDATE ON {table} {update_when}BEGIN {log('NEW', updated)} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_changelog_ad AFTER DELETE ON {table} {delete_when}BEGIN {log('OLD', deleted)} END",
+    ]
+
+
+def install_change_log(conn: Connection, tables: dict = FEED_TABLES, soft_delete: bool = False) -> None:
+    """Create the ChangeLog table and its triggers (run by migrations)."""
+    # AUTOINCREMENT: ids are never reused after pruning, so a client's Last-Event-ID stays meaningful.
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS ChangeLog ("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "table_name TEXT NOT NULL, "
+        "row_id INTEGER NOT NULL, "
+        "op TEXT NOT NULL, "
+        "changed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    ))
+    for table, key in tables.items():
+        for statement in _log_statements(table, key, soft_delete):
+            conn.execute(text(statement))
+
+
+def parse_types(types: Optional[str]) -> FrozenSet[str]:
+    """`album,song` -> {"Album", "Song"}; empty means every table."""
+    if not types:
+        return frozenset(FEED_TABLES)
+    names = {t.strip().lower() for t in types.split(",") if t.strip()}
+    by_name = {table.lower(): table for table in FEED_TABLES}
+    unknown = names - set(by_name)
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown types {', '.join(sorted(unknown))}; use {', '.join(by_name)}")
+    return frozenset(by_name[n] for n in names)
+
+
+def _event(row) -> dict:
+    return {"id": row.id, "type": row.table_name, "row_id": row.row_id, "op": row.op, "at": row.changed_at}
+
+
+async def read_changes(db: AsyncSession, after: int, tables: Iterable[str], limit: int) -> list:
+    tables = list(tables)
+    result = await db.execute(
+        text(
+            "SELECT id, table_name, row_id, op, changed_at FROM ChangeLog "
+            "WHERE id > :after AND table_name IN ({}) ORDER BY id LIMIT :limit".format(
+                ", ".join(f":t{i}" for i in range(len(tables)))
+            )
+        ),
+        {"after": after, "limit": limit, **{f"t{i}": t for i, t in enumerate(tables)}},
+    )
+    return [_event(row) for row in result]
+
+
+async def _oldest_id(db: AsyncSession) -> Optional[int]:
+    return (await db.execute(text("SELECT min(id) FROM ChangeLog"))).scalar()
+
+
+# ---------- BUS ----------
+@dataclass(eq=False)
+class Subscriber:
+    tables: FrozenSet[str]
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(SUBSCRIBER_QUEUE_SIZE))
+    closed: bool = False
+    last_id: int = 0  # the client has every event up to here
+
+    def put(self, item) -> None:
+        if self.closed:
+            return
+        if isinstance(item, dict):
+            if item["id"] <= self.last_id:
+                return
+            self.last_id = item["id"]
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # Too slow to keep up: drop it rather than buffer without bound; it resumes from the log.
+            self.closed = True
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def next(self, timeout: float):
+        """The next event, RESET, None once closed, or ... after `timeout` seconds of silence."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return ...
+
+
+class ChangeFeed:
+    """One reader of the ChangeLog per process, fanning new rows out to in-memory subscriber queues."""
+
+    def __init__(self, poll_interval: float = CHANGE_POLL_SECONDS, retention: int = CHANGE_LOG_RETENTION):
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.subscribers: set = set()
+        self._last_id: Optional[int] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.published = 0
+
+    def notify(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    async def start(self) -> None:
+        if self._task is None:
+            # Created here, inside the running loop, so the app can be restarted on a new loop
+            self._lock = asyncio.Lock()
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = self._wake = None
+            self._last_id = None
+        self.disconnect_all()
+
+    def disconnect_all(self) -> None:
+        """End every open stream; EventSource clients reconnect (to another worker) and resume."""
+        for subscriber in list(self.subscribers):
+            subscriber.put(None)
+        self.subscribers.clear()
+
+    async def subscribe(self, tables: FrozenSet[str], last_event_id: Optional[int] = None) -> Subscriber:
+        """Register a subscriber, first replaying what it missed since `last_event_id`."""
+        await self.start()
+        subscriber = Subscriber(tables, last_id=last_event_id or 0)
+        # The dispatcher holds the same lock while it fans out, so the replay ends exactly
+        # where live delivery starts: no gap, no duplicates, ids in order.
+        async with self._lock:
+            async with AsyncSessionLocal() as db:
+                await self._catch_up(db)
+                if last_event_id is not None and last_event_id < self._last_id:
+                    oldest = await _oldest_id(db)
+                    missed = await read_changes(db, last_event_id, tables, SUBSCRIBER_QUEUE_SIZE)
+                    if (oldest is not None and last_event_id < oldest - 1) or len(missed) == SUBSCRIBER_QUEUE_SIZE:
+                        subscriber.put(RESET)
+                    else:
+                        for event in missed:
+                            if event["id"] <= self._last_id:
+                                subscriber.put(event)
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self.subscribers.discard(subscriber)
+
+    async def _catch_up(self, db: AsyncSession) -> None:
+        # With nobody subscribed the dispatcher skips the log, so the position is stale by then
+        if self._last_id is None or not self.subscribers:
+            self._last_id = (await db.execute(text("SELECT coalesce(max(id), 0) FROM ChangeLog"))).scalar()
+
+    async def _run(self) -> None:
+        polls = 0
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                if self.subscribers:
+                    await self._dispatch()
+                polls += 1
+                if polls % 600 == 0:
+                    await self._prune()
+            except Exception:
+                logger.exception("Change feed dispatch failed")
+
+    async def _dispatch(self) -> None:
+        async with self._lock:
+            async with AsyncSessionLocal() as db:
+                await self._catch_up(db)
+                while True:
+                    events = await read_changes(db, self._last_id, FEED_TABLES, CHANGE_BATCH_SIZE)
+                    for event in events:
+                        for subscriber in self.subscribers:
+                            if event["type"] in subscriber.tables:
+                                subscriber.put(event)
+                    if events:
+                        self._last_id = events[-1]["id"]
+                        self.published += len(events)
+                    if len(events) < CHANGE_BATCH_SIZE:
+                        break
+            self.subscribers = {s for s in self.subscribers if not s.closed}
+
+    async def _prune(self) -> None:
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                text("DELETE FROM ChangeLog WHERE id <= (SELECT max(id) FROM ChangeLog) - :keep"),
+                {"keep": self.retention},
+            )
+            await db.commit()
+
+
+change_feed = ChangeFeed()
+
+
+# ---------- ENDPOINTS ----------
+router = APIRouter()
+
+
+def _resume_id(header: Optional[str], param: Optional[int]) -> Optional[int]:
+    if param is not None:
+        return param
+    if header:
+        try:
+            return int(header)
+        except ValueError:
+            raise HTTPException(status_code=422, detail="Last-Event-ID must be an integer")
+    return None
+
+
+@router.get("/api/changes")
+async def list_changes(
+    after: int = 0,
+    types: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=CHANGE_BATCH_SIZE),
+    db: AsyncSession = Depends(get_db),
+):
+    """The log itself, for clients that prefer to poll (or to debug a stream)."""
+    return await read_changes(db, after, parse_types(types), limit)
+
+
+@router.get("/api/changes/stream")
+async def stream_changes(
+    types: Optional[str] = None,
+    last_event_id: Optional[int] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+    """Server-Sent Events; EventSource reconnects with Last-Event-ID and picks up where it left off."""
+    tables = parse_types(types)
+    subscriber = await change_feed.subscribe(tables, _resume_id(last_event_id_header, last_event_id))
+
+    async def events():
+        try:
+            # Tell EventSource to wait a little before reconnecting after the server closes a stream
+            yield b"retry: 2000\n\n"
+            while True:
+                item = await subscriber.next(CHANGE_HEARTBEAT_SECONDS)
+                if item is None:
+                    return
+                if item is ...:
+                    yield b": keep-alive\n\n"
+                elif item is RESET:
+                    yield b"event: reset\ndata: {}\n\n"
+                else:
+                    yield b"id: %d\nevent: change\ndata: %s\n\n" % (item["id"], dumps(item))
+        finally:
+            change_feed.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/api/changes/ws")
+async def websocket_changes(websocket: WebSocket, types: Optional[str] = None, last_event_id: Optional[int] = None):
+    try:
+        tables = parse_types(types)
+    except HTTPException as exc:
+        await websocket.close(code=1008, reason=exc.detail)
+        return
+    await websocket.accept()
+    subscriber = await change_feed.subscribe(tables, last_event_id)
+    # Nothing is expected from the client; reading is how a disconnect is noticed
+    receiver = asyncio.create_task(websocket.receive())
+    try:
+        while True:
+            getter = asyncio.create_task(subscriber.next(CHANGE_HEARTBEAT_SECONDS))
+            done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                getter.cancel()
+                message = receiver.result()
+                if message["type"] == "websocket.disconnect":
+                    return
+                receiver = asyncio.create_task(websocket.receive())
+                continue
+            item = getter.result()
+            if item is None:
+                await websocket.close()
+                return
+            if item is ...:
+                await websocket.send_text('{"event":"ping"}')
+            elif item is RESET:
+                await websocket.send_text('{"event":"reset"}')
+            else:
+                await websocket.send_text(json.dumps({"event": "change", **item}))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        change_feed.unsubscribe(subscriber)
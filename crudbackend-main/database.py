@@ -1,36 +1,126 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.declarative import declarative_base
+import asyncio
 import logging
 import os
+import re
+import threading
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+import search as catalog_search
+from db_engine import log_pragma_report, make_engine
+from metrics import instrument_engine
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# SQLite database file path
-DB_DIR = os.path.dirname(__file__)
-DB_FILE = os.path.join(DB_DIR, "music_app.db")
-URL_DATABASE = f'sqlite:///{DB_FILE}'
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+MIGRATIONS_DIR = os.path.join(BACKEND_DIR, "migrations", "versions")
+# Relative SQLite paths resolve against the working directory, as they always have.
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./app.db")
+
+Base = declarative_base()
+
+# Unbound until init_db(); importing the app never opens a connection.
+SessionLocal = sessionmaker(autoflush=False, autocommit=False)
+AsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False)
+
+_engine = None
+_async_engine = None
+_init_lock = threading.Lock()
+
+_REVISION_RE = re.compile(r"^revision = ['\"]([^'\"]+)['\"]", re.MULTILINE)
+_DOWN_REVISION_RE = re.compile(r"^down_revision = ['\"]([^'\"]+)['\"]", re.MULTILINE)
 
-# Create engine for SQLite
-engine = create_engine(
-    URL_DATABASE,
-    connect_args={"check_same_thread": False},  # Needed for SQLite with FastAPI
-    echo=True,  # Set to True to see SQL queries (helpful for debugging)
-)
 
-# Test connection
-try:
+def async_url(url: str) -> str:
+    return url.replace("sqlite://", "sqlite+aiosqlite://", 1) if url.startswith("sqlite://") else url
+
+
+def _head_revision() -> Optional[str]:
+    """The newest revision id, read from the migration files without importing Alembic."""
+    revisions, parents = set(), set()
+    for name in os.listdir(MIGRATIONS_DIR):
+        if name.endswith(".py"):
+            with open(os.path.join(MIGRATIONS_DIR, name)) as f:
+                source = f.read()
+            revision = _REVISION_RE.search(source)
+            if revision:
+                revisions.add(revision.group(1))
+            down = _DOWN_REVISION_RE.search(source)
+            if down:
+                parents.add(down.group(1))
+    heads = revisions - parents
+    return heads.pop() if len(heads) == 1 else None
+
+
+def _current_revision(engine) -> Optional[str]:
     with engine.connect() as conn:
-        logger.info(f"✅ SQLite database connection successful! Database file: {DB_FILE}")
-except Exception as e:
-    logger.error(f"❌ Database connection failed: {e}")
-
-SessionLocal = sessionmaker(
-    autocommit=False, 
-    autoflush=False, 
-    bind=engine,
-    expire_on_commit=False
-)
-
-Base = declarative_base()
\ No newline at end of file
+        if not conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'alembic_version'")).first():
+            return None
+        return conn.execute(text("SELECT version_num FROM alembic_version")).scalar()
+
+
+def run_migrations(engine) -> None:
+    """Upgrade the schema to the latest Alembic revision."""
+    # Importing Alembic costs ~0.25s of cold start; skip it when the database is already current.
+    head = _head_revision()
+    if head is not None and _current_revision(engine) == head:
+        return
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "migrations"))
+    with engine.begin() as conn:
+        config.attributes["connection"] = conn
+        command.upgrade(config, "head")
+
+
+def init_db(url: str = None):
+    """Build the engines and migrate on first use; later calls return the existing sync engine."""
+    global _engine, _async_engine
+    if _engine is not None:
+        return _engine
+    with _init_lock:
+        if _engine is None:
+            url = url or DATABASE_URL
+            # The sync engine is only used for migrations and scripts; request handlers use the async one.
+            engine = make_engine(url, pool_size=2, max_overflow=2)
+            run_migrations(engine)
+            catalog_search.detect_search_index(engine)
+            log_pragma_report(engine)
+            async_engine = make_engine(async_url(url))
+            instrument_engine(async_engine.sync_engine)
+            SessionLocal.configure(bind=engine)
+            AsyncSessionLocal.configure(bind=async_engine)
+            _async_engine = async_engine
+            _engine = engine
+    return _engine
+
+
+def get_engine():
+    return init_db()
+
+
+def get_async_engine():
+    init_db()
+    return _async_engine
+
+
+async def dispose_engines() -> None:
+    global _engine, _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    if _engine is not None:
+        _engine.dispose()
+    _engine = _async_engine = None
+
+
+async def get_db():
+    if _engine is None:
+        # Normally done by the lifespan handler; covers clients that skip it (e.g. httpx's ASGI transport).
+        await asyncio.to_thread(init_db)
+    async with AsyncSessionLocal() as db:
+        yield db
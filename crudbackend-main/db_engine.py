@@ -0,0 +1,81 @@
+import logging
+import os
+
+from sqlalchemy import create_engine, event, text
+
+logger = logging.getLogger(__name__)
+
+# ---------- ENGINE PROFILES ----------
+DB_PROFILE = os.getenv("DB_PROFILE", "production")
+
+SQLITE_PROFILES = {
+    # echo=True logs every statement; only worth it while debugging
+    "development": {
+        "echo": True,
+        "pool_size": 5,
+        "max_overflow": 5,
+        "pragmas": {
+            "busy_timeout": 5000,
+            "foreign_keys": "ON",
+        },
+    },
+    # WAL lets readers run alongside the single writer; synchronous=NORMAL is durable in WAL
+    # mode except for the last transactions on power loss, and skips an fsync per commit.
+    "production": {
+        "echo": False,
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+            "cache_size": int(os.getenv("SQLITE_CACHE_SIZE_KB", "64000")) * -1,  # negative = KiB
+            "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+            "temp_store": "MEMORY",
+            # SQLite leaves FK enforcement (and ON DELETE actions) off unless asked per connection
+            "foreign_keys": "ON",
+        },
+    },
+}
+
+REPORTED_PRAGMAS = ("journal_mode", "synchronous", "busy_timeout", "cache_size", "mmap_size", "temp_store", "foreign_keys")
+
+
+def _pragma_listener(pragmas: dict):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    return set_pragmas
+
+
+def make_engine(url: str, profile: str = DB_PROFILE, pragmas: dict = None, **engine_kwargs):
+    """Build a sync or async (sqlite+aiosqlite) engine with the given tuning profile applied to every connection."""
+    settings = SQLITE_PROFILES[profile]
+    pragmas = {**settings["pragmas"], **(pragmas or {})}
+    kwargs = {"echo": settings["echo"]}
+    if ":memory:" not in url and url not in ("sqlite://", "sqlite+aiosqlite://"):
+        kwargs.update(pool_size=settings["pool_size"], max_overflow=settings["max_overflow"])
+    kwargs.update(engine_kwargs)
+    if url.startswith("sqlite+aiosqlite"):
+        from sqlalchemy.ext.asyncio import create_async_engine
+        engine = create_async_engine(url, **kwargs)
+        sync_engine = engine.sync_engine
+    else:
+        engine = create_engine(url, connect_args={"check_same_thread": False}, **kwargs)
+        sync_engine = engine
+    event.listen(sync_engine, "connect", _pragma_listener(pragmas))
+    return engine
+
+
+def pragma_report(engine) -> dict:
+    """Read back the effective pragmas from a live connection of a sync engine."""
+    with engine.connect() as conn:
+        return {name: conn.execute(text(f"PRAGMA {name}")).scalar() for name in REPORTED_PRAGMAS}
+
+
+def log_pragma_report(engine) -> None:
+    report = pragma_report(engine)
+    logger.info(f"SQLite profile '{DB_PROFILE}' on {engine.url.database}: " + ", ".join(f"{k}={v}" for k, v in report.items()))
+
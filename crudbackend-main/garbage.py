@@ -0,0 +1,229 @@
+"""Garbage collection: purging soft-deleted catalog rows and removing audio files nothing uses.
+
+A delete request only stamps deleted_at on its row (one UPDATE on the primary key), and
+releasing an audio reference only lowers AudioBlob.ref_count. The slow parts happen here, off
+the request path and in batches of GC_BATCH_SIZE, each its own short transaction:
+
+1. rows soft-deleted more than SOFT_DELETE_RETENTION_SECONDS ago are deleted, which runs the
+   ON DELETE SET NULL, FTS and change-log triggers, and their audio references are released;
+2. AudioBlob rows left at ref_count 0 are deleted, and GC_UNLINK_DELAY_SECONDS later their
+   files and previews are unlinked unless an upload has claimed the same content again in the
+   meantime (an upload of known content reuses the file on disk before its blob row commits);
+3. every GC_SWEEP_INTERVAL_SECONDS, files in the upload dir that no row knows about (crashed
+   uploads, files from before reference counting) are removed once they are old enough.
+
+Every app process runs a collector. Each step claims its rows with a DELETE ... RETURNING, so
+with several workers every row and file is still handled by exactly one of them. Files waiting
+for their delay are only known to the process that collected them; if it exits first, the sweep
+removes them later.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import Counter, deque
+from datetime import timedelta
+from typing import Awaitable, Callable, Iterable, Optional
+
+from sqlalchemy import bindparam, delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from audio_analysis import preview_path
+from database import AsyncSessionLocal
+from models import Album, Artist, AudioBlob, Song, utcnow
+from storage import remove_file
+
+logger = logging.getLogger(__name__)
+
+# ---------- CONFIG ----------
+GC_INTERVAL_SECONDS = float(os.getenv("GC_INTERVAL_SECONDS", "30"))
+GC_BATCH_SIZE = int(os.getenv("GC_BATCH_SIZE", "500"))
+SOFT_DELETE_RETENTION_SECONDS = float(os.getenv("SOFT_DELETE_RETENTION_SECONDS", "0"))  # how long deleted rows are kept
+GC_SWEEP_INTERVAL_SECONDS = float(os.getenv("GC_SWEEP_INTERVAL_SECONDS", "3600"))
+# Both must be longer than any upload transaction: an upload reusing a stored file only
+# refreshes its mtime, and its blob row appears when the request commits.
+GC_UNLINK_DELAY_SECONDS = float(os.getenv("GC_UNLINK_DELAY_SECONDS", "60"))
+# An untracked file younger than this may belong to an upload that has not committed yet
+GC_FILE_GRACE_SECONDS = float(os.getenv("GC_FILE_GRACE_SECONDS", "3600"))
+
+CATALOG_MODELS = (Song, Album, Artist)
+
+# ---------- AUDIO REFERENCES ----------
+_release = (
+    update(AudioBlob.__table__)
+    .where(AudioBlob.__table__.c.path == bindparam("released_path"))
+    .values(ref_count=AudioBlob.__table__.c.ref_count - bindparam("released"))
+)
+
+async def release_audio(db: AsyncSession, paths: Iterable[Optional[str]]) -> None:
+    """Drop one reference per path; blobs left at 0 are collected later. The caller commits."""
+    counts = Counter(path for path in paths if path)
+    if counts:
+        await db.execute(_release, [{"released_path": path, "released": n} for path, n in counts.items()])
+
+# ---------- COLLECTION STEPS ----------
+async def purge_deleted(db: AsyncSession, model, older_than: float = SOFT_DELETE_RETENTION_SECONDS, limit: int = GC_BATCH_SIZE) -> int:
+    """Hard-delete one batch of soft-deleted rows and release their audio; returns the row count."""
+    key = model.__mapper__.primary_key[0]
+    due = (
+        select(key)
+        .where(model.deleted_at.is_not(None), model.deleted_at <= utcnow() - timedelta(seconds=older_than))
+        .order_by(model.deleted_at)
+        .limit(limit)
+    )
+    result = await db.execute(
+        delete(model).where(key.in_(due)).returning(model.audio_file).execution_options(synchronize_session=False)
+    )
+    paths = result.scalars().all()
+    await release_audio(db, paths)
+    await db.commit()
+    return len(paths)
+
+def _touch(paths: Iterable[str]) -> None:
+    for path in paths:
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+def _untouched_since(path: str, released_at: float) -> bool:
+    try:
+        return os.stat(path).st_mtime <= released_at
+    except FileNotFoundError:
+        return False
+
+async def collect_audio(db: AsyncSession, limit: int = GC_BATCH_SIZE) -> list:
+    """Delete one batch of unreferenced blobs; returns their (path, preview, released_at) for remove_released."""
+    unreferenced = select(AudioBlob.path).where(AudioBlob.ref_count <= 0).limit(limit)
+    result = await db.execute(
+        delete(AudioBlob)
+        .where(AudioBlob.path.in_(unreferenced), AudioBlob.ref_count <= 0)
+        .returning(AudioBlob.path, AudioBlob.preview_path)
+        .execution_options(synchronize_session=False)
+    )
+    blobs = [(path, preview or preview_path(path)) for path, preview in result.all()]
+    await db.commit()
+    # A fresh mtime tells later uploads of the content apart, and keeps the sweep off the files meanwhile
+    await asyncio.to_thread(_touch, [file for blob in blobs for file in blob])
+    released_at = time.time()
+    return [(path, preview, released_at) for path, preview in blobs]
+
+async def remove_released(db: AsyncSession, released: list) -> int:
+    """Unlink the files of collected blobs nothing has claimed since; returns the audio file count."""
+    removed = 0
+    for start in range(0, len(released), GC_BATCH_SIZE):
+        batch = released[start:start + GC_BATCH_SIZE]
+        # Same content uploaded again: the new blob owns the file, or will once its upload commits
+        claimed = set((await db.execute(select(AudioBlob.path).where(AudioBlob.path.in_([path for path, _, _ in batch])))).scalars())
+        for path, preview, released_at in batch:
+            if path not in claimed and await asyncio.to_thread(_untouched_since, path, released_at):
+                await remove_file(path)
+                await remove_file(preview)
+                removed += 1
+    return removed
+
+def _untracked_candidates(upload_dir: str, grace: float) -> tuple:
+    """(stale temp files, other files older than `grace`), listed without touching the database."""
+    cutoff = time.time() - grace
+    stale, old = [], []
+    tmp_dir = os.path.join(upload_dir, ".tmp")
+    for directory, bucket in ((tmp_dir, stale), (upload_dir, old)):
+        try:
+            entries = list(os.scandir(directory))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            if entry.is_file(follow_symlinks=False) and entry.stat().st_mtime < cutoff:
+                bucket.append(entry.path)
+    return stale, old
+
+async def sweep_files(db: AsyncSession, upload_dir: str, grace: float = GC_FILE_GRACE_SECONDS, limit: int = GC_BATCH_SIZE) -> int:
+    """Remove files in `upload_dir` that no blob and no catalog row refers to; returns the file count."""
+    stale, old = await asyncio.to_thread(_untracked_candidates, upload_dir, grace)
+    for path in stale:
+        await remove_file(path)
+    removed = len(stale)
+    for start in range(0, len(old), limit):
+        batch = old[start:start + limit]
+        # Stored files and their previews are named after the content hash, which is indexed
+        hashes = {path: os.path.splitext(os.path.basename(path))[0].split(".")[0] for path in batch}
+        known = set((await db.execute(select(AudioBlob.sha256).where(AudioBlob.sha256.in_(set(hashes.values()))))).scalars())
+        untracked = [path for path in batch if hashes[path] not in known]
+        # Files saved before reference counting have no blob, only rows pointing at them
+        for model in CATALOG_MODELS:
+            if untracked:
+                used = set((await db.execute(select(model.audio_file).where(model.audio_file.in_(untracked)))).scalars())
+                untracked = [path for path in untracked if path not in used]
+        for path in untracked:
+            await remove_file(path)
+        removed += len(untracked)
+    return removed
+
+# ---------- COLLECTOR ----------
+class GarbageCollector:
+    """Runs the collection steps every `interval` seconds, each until it has nothing left to do."""
+
+    def __init__(self, interval: float = GC_INTERVAL_SECONDS, sweep_interval: float = GC_SWEEP_INTERVAL_SECONDS,
+                 unlink_delay: float = GC_UNLINK_DELAY_SECONDS):
+        self.interval = interval
+        self.sweep_interval = sweep_interval
+        self.unlink_delay = unlink_delay
+        self._released: deque = deque()  # (path, preview, released_at) in collection order
+        self.upload_dir: Optional[str] = None
+        self._on_purge: Optional[Callable[..., Awaitable[None]]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_sweep = 0.0
+
+    async def start(self, upload_dir: str, on_purge: Optional[Callable[..., Awaitable[None]]] = None) -> None:
+        """`on_purge(*tables)` is awaited after rows were purged, e.g. to drop cached responses."""
+        if self._task is None:
+            self.upload_dir = upload_dir
+            self._on_purge = on_purge
+            self._last_sweep = time.monotonic()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def collect(self, sweep: bool = False) -> dict:
+        """One full pass; returns how many rows, blobs and files were removed.
+
+        Files of the blobs collected in this pass are only removed by a pass `unlink_delay` later.
+        """
+        counts = {"rows": 0, "blobs": 0, "files": 0}
+        async with AsyncSessionLocal() as db:
+            for model in CATALOG_MODELS:
+                while (purged := await purge_deleted(db, model)):
+                    counts["rows"] += purged
+            if counts["rows"] and self._on_purge is not None:
+                # ON DELETE SET NULL changed the rows that pointed at the purged ones
+                await self._on_purge(*(model.__tablename__ for model in CATALOG_MODELS))
+            while (collected := await collect_audio(db)):
+                counts["blobs"] += len(collected)
+                self._released.extend(collected)
+            due = []
+            while self._released and self._released[0][2] <= time.time() - self.unlink_delay:
+                due.append(self._released.popleft())
+            counts["files"] = await remove_released(db, due)
+            if sweep and self.upload_dir is not None:
+                counts["files"] += await sweep_files(db, self.upload_dir)
+        return counts
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            sweep = time.monotonic() - self._last_sweep >= self.sweep_interval
+            try:
+                counts = await self.collect(sweep)
+            except Exception:
+                logger.exception("Garbage collection failed")
+                continue
+            if sweep:
+                self._last_sweep = time.monotonic()
+            if any(counts.values()):
+                logger.info("Garbage collected %d rows, %d audio blobs, %d stray files", counts["rows"], counts["blobs"], counts["files"])
+
+collector = GarbageCollector()
@@ -0,0 +1,359 @@
+"""Background jobs: a queue kept in the Job table and a process pool that works through it.
+
+The app runs a JobRunner in its lifespan (JOB_WORKERS processes); with JOB_WORKERS=0 the jobs
+are left to a standalone worker started with `python jobs.py`. Several runners may share one
+database: claiming a job is a single UPDATE, so each job goes to exactly one of them.
+"""
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from sqlalchemy import event, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import audio_analysis
+import database
+from database import AsyncSessionLocal, get_db
+from metrics import registry
+from models import AudioBlob, Job, utcnow
+from storage import remove_file
+
+logger = logging.getLogger(__name__)
+
+# ---------- CONFIG ----------
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))  # worker processes in the app; 0 = run `python jobs.py` instead
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2.0"))
+JOB_TIMEOUT_SECONDS = float(os.getenv("JOB_TIMEOUT_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_DELAY_SECONDS = float(os.getenv("JOB_RETRY_DELAY_SECONDS", "10"))
+
+# ---------- SCHEMAS ----------
+class JobOut(BaseModel):
+    id: int
+    kind: str
+    subject: Optional[str] = None
+    status: str
+    attempts: int
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+# ---------- HANDLERS ----------
+@dataclass(frozen=True)
+class Handler:
+    # work(**payload) runs in a worker process, so it must be a module-level function;
+    # apply(db, payload, result) stores its result from the runner, in the same commit that closes the job.
+    work: Callable[..., dict]
+    apply: Callable[[AsyncSession, dict, dict], Awaitable[None]]
+    fatal: tuple = ()  # exceptions that retrying cannot fix
+
+handlers: dict = {}
+
+def register_handler(kind: str, handler: Handler) -> None:
+    handlers[kind] = handler
+
+# ---------- QUEUE ----------
+def enqueue(db: AsyncSession, kind: str, payload: dict, subject: Optional[str] = None) -> Job:
+    """Add a job to the caller's transaction; workers only see it once that commits."""
+    now = utcnow()
+    job = Job(kind=kind, subject=subject, payload=json.dumps(payload), status="queued", attempts=0, run_after=now, created_at=now)
+    db.add(job)
+    # Wake the local runner right after the commit instead of at its next poll
+    event.listen(db.sync_session, "after_commit", lambda session: runner.notify(), once=True)
+    return job
+
+async def claim_job(db: AsyncSession):
+    """Atomically move the oldest due job to running; returns (id, kind, payload, attempts) or None."""
+    now = utcnow()
+    next_id = (
+        select(Job.id)
+        .where(Job.status == "queued", Job.run_after <= now)
+        .order_by(Job.run_after, Job.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        update(Job)
+        .where(Job.id == next_id, Job.status == "queued")
+        .values(status="running", attempts=Job.attempts + 1, started_at=now)
+        .returning(Job.id, Job.kind, Job.payload, Job.attempts)
+        .execution_options(synchronize_session=False)
+    )
+    row = result.first()
+    await db.commit()
+    return row
+
+async def _set_status(db: AsyncSession, job_id: int, **values) -> None:
+    await db.execute(update(Job).where(Job.id == job_id).values(**values).execution_options(synchronize_session=False))
+
+async def requeue_stale(db: AsyncSession, older_than: float = JOB_TIMEOUT_SECONDS) -> int:
+    """Jobs left running by a worker that died; they go back to the queue."""
+    now = utcnow()
+    result = await db.execute(
+        update(Job)
+        .where(Job.status == "running", Job.started_at < now - timedelta(seconds=older_than))
+        .values(status="queued", run_after=now)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount
+
+async def _requeue_interrupted(job_ids: List[int]) -> None:
+    """Put jobs the runner itself interrupted back in the queue; not their fault, so the attempt does not count."""
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(Job)
+            .where(Job.id.in_(job_ids), Job.status == "running")
+            .values(status="queued", attempts=Job.attempts - 1, run_after=utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+
+# ---------- RUNNER ----------
+def _init_worker(pids) -> None:
+    # Workers ignore Ctrl-C; the runner shuts them down and requeues whatever they were doing.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    pids.put(os.getpid())
+
+def _drain(pids) -> List[int]:
+    drained = []
+    while True:
+        try:
+            drained.append(pids.get_nowait())
+        except queue.Empty:
+            return drained
+
+class JobRunner:
+    """Claims due jobs and runs their work on a process pool, at most `workers` at a time.
+
+    Work is CPU- and subprocess-heavy (decoding, transcoding), so it gets its own processes;
+    only the short claim/apply transactions run on the event loop. Jobs are picked up when
+    enqueued in this process, and otherwise every `poll_interval` seconds.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, poll_interval: float = JOB_POLL_SECONDS):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._running: dict = {}  # task -> job id
+        self._recycled = weakref.WeakSet()  # pools torn down after a timeout
+        self._worker_pids = weakref.WeakKeyDictionary()  # pool -> queue its workers report their pid on
+
+    def notify(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    def _make_executor(self) -> ProcessPoolExecutor:
+        # spawn rather than fork: the app process has event loop and SQLite threads that must not be copied.
+        context = multiprocessing.get_context("spawn")
+        pids = context.Queue()
+        executor = ProcessPoolExecutor(self.workers, mp_context=context, initializer=_init_worker, initargs=(pids,))
+        self._worker_pids[executor] = pids
+        return executor
+
+    async def start(self) -> None:
+        if self.workers <= 0 or self._dispatcher is not None:
+            return
+        async with AsyncSessionLocal() as db:
+            stale = await requeue_stale(db)
+        if stale:
+            logger.warning("Requeued %d jobs left running by a stopped worker", stale)
+        self._executor = self._make_executor()
+        self._wake = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def stop(self) -> None:
+        if self._dispatcher is None:
+            return
+        self._dispatcher.cancel()
+        tasks, interrupted = list(self._running), list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(self._dispatcher, *tasks, return_exceptions=True)
+        if interrupted:
+            await _requeue_interrupted(interrupted)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = self._dispatcher = self._wake = None
+        self._running.clear()
+
+    async def _dispatch(self) -> None:
+        slots = asyncio.Semaphore(self.workers)
+        while True:
+            await slots.acquire()
+            # Cleared before claiming, so an enqueue that lands during the claim is not missed
+            self._wake.clear()
+            try:
+                async with AsyncSessionLocal() as db:
+                    job = await claim_job(db)
+            except Exception:
+                logger.exception("Could not claim a job")
+                job = None
+            if job is None:
+                slots.release()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            task = asyncio.create_task(self._execute(job))
+            self._running[task] = job.id
+
+            def done(task, slots=slots):
+                self._running.pop(task, None)
+                slots.release()
+
+            task.add_done_callback(done)
+
+    def _recycle(self, executor: ProcessPoolExecutor) -> None:
+        """Replace the pool and kill its workers, including the one still busy with a timed-out job."""
+        self._executor = self._make_executor()
+        self._recycled.add(executor)
+        # The pool cannot cancel work that has started, and does not say which worker runs what.
+        # A worker reports its pid before taking any work, so the busy one is always among these.
+        for pid in _drain(self._worker_pids.pop(executor)):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        # Without cancel_futures: the jobs still queued on it fail with BrokenProcessPool and are requeued
+        executor.shutdown(wait=False)
+
+    async def _execute(self, job) -> None:
+        payload = json.loads(job.payload)
+        handler = handlers.get(job.kind)
+        executor = None
+        try:
+            if handler is None:
+                raise LookupError(f"No handler for job kind {job.kind!r}")
+            loop = asyncio.get_running_loop()
+            work = functools.partial(handler.work, **payload)
+            executor = self._executor
+            result = await asyncio.wait_for(loop.run_in_executor(executor, work), JOB_TIMEOUT_SECONDS)
+            async with AsyncSessionLocal() as db:
+                await handler.apply(db, payload, result)
+                await _set_status(db, job.id, status="done", error=None, finished_at=utcnow())
+                await db.commit()
+            registry.observe_job(job.kind, "done")
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            if isinstance(exc, BrokenProcessPool) and executor in self._recycled:
+                # Killed along with a timed-out job on the same pool
+                await _requeue_interrupted([job.id])
+                return
+            if isinstance(exc, asyncio.TimeoutError) and self._executor is executor:
+                # Its worker would keep running; requeued, the job could then run twice at once
+                self._recycle(executor)
+            elif isinstance(exc, BrokenProcessPool) and self._executor is executor:
+                # A worker died mid-job (e.g. killed for memory); later jobs need a fresh pool
+                self._executor = self._make_executor()
+            await self._fail(job, handler, exc)
+
+    async def _fail(self, job, handler: Optional[Handler], exc: Exception) -> None:
+        error = f"{type(exc).__name__}: {exc}"
+        retry = handler is not None and job.attempts < JOB_MAX_ATTEMPTS and not isinstance(exc, handler.fatal)
+        async with AsyncSessionLocal() as db:
+            if retry:
+                delay = JOB_RETRY_DELAY_SECONDS * 2 ** (job.attempts - 1)
+                await _set_status(db, job.id, status="queued", error=error, run_after=utcnow() + timedelta(seconds=delay))
+            else:
+                await _set_status(db, job.id, status="failed", error=error, finished_at=utcnow())
+            await db.commit()
+        logger.warning("Job %s (%s) attempt %d failed: %s", job.id, job.kind, job.attempts, error)
+        registry.observe_job(job.kind, "retried" if retry else "failed")
+
+runner = JobRunner()
+
+# ---------- AUDIO ANALYSIS ----------
+def enqueue_audio_analysis(db: AsyncSession, path: str) -> Job:
+    return enqueue(db, "analyze_audio", {"path": path}, subject=path)
+
+async def apply_audio_analysis(db: AsyncSession, payload: dict, result: dict) -> None:
+    peaks = result.get("peaks")
+    stored = await db.execute(
+        update(AudioBlob)
+        .where(AudioBlob.path == payload["path"])
+        .values(
+            duration=result.get("duration"),
+            bitrate=result.get("bitrate"),
+            peaks=json.dumps(peaks) if peaks is not None else None,
+            preview_path=result.get("preview_path"),
+            analyzed_at=utcnow(),
+        )
+        .returning(AudioBlob.path)
+        .execution_options(synchronize_session=False)
+    )
+    if stored.first() is None and result.get("preview_path"):
+        # The blob was released while the job ran, so nothing will ever serve this preview
+        await remove_file(result["preview_path"])
+
+register_handler("analyze_audio", Handler(audio_analysis.analyze, apply_audio_analysis, fatal=(audio_analysis.UnsupportedAudio,)))
+
+# ---------- JOB ENDPOINTS ----------
+router = APIRouter()
+
+@router.get("/api/jobs", response_model=List[JobOut])
+async def list_jobs(
+    status: Optional[str] = Query(None),
+    kind: Optional[str] = Query(None),
+    subject: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_db),
+):
+    stmt = select(Job).order_by(Job.id.desc()).limit(limit)
+    if status is not None:
+        stmt = stmt.where(Job.status == status)
+    if kind is not None:
+        stmt = stmt.where(Job.kind == kind)
+    if subject is not None:
+        stmt = stmt.where(Job.subject == subject)
+    return (await db.execute(stmt)).scalars().all()
+
+@router.get("/api/jobs/{job_id}", response_model=JobOut)
+async def get_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    job = await db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+# ---------- STANDALONE WORKER ----------
+async def serve(workers: int) -> None:
+    await asyncio.to_thread(database.init_db)
+    runner.workers = workers
+    await runner.start()
+    stopped = asyncio.Event()
+    # SIGTERM (service managers, the serve.py launcher's process group) stops as gracefully as Ctrl-C
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopped.set)
+    try:
+        await stopped.wait()
+    finally:
+        await runner.stop()
+        await database.dispose_engines()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run background jobs outside the API process.")
+    parser.add_argument("--workers", type=int, default=max(JOB_WORKERS, 1))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(serve(args.workers))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,233 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional, Sequence
+
+from fastapi import Response
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# Log requests slower than this, with the SQL they ran; 0 disables the slow-request log.
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+SLOW_REQUEST_MAX_STATEMENTS = 20
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+enabled = METRICS_ENABLED
+
+
+class RequestStats:
+    __slots__ = ("statements", "sql_seconds", "rows", "body_bytes", "log")
+
+    def __init__(self, capture_sql: bool):
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.rows = 0
+        self.body_bytes = 0
+        # (seconds, statement) pairs, only kept when the slow-request log is on
+        self.log: Optional[list] = [] if capture_sql else None
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def record_rows(count: int) -> None:
+    """Count rows a handler fetched for the current request (no-op outside a request)."""
+    stats = _current.get()
+    if stats is not None:
+        stats.rows += count
+
+
+# ---------- METRIC TYPES ----------
+def _labels(names: Sequence[str], values: tuple) -> str:
+    return ",".join(f'{n}="{v}"' for n, v in zip(names, values))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str]):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values: dict = {}
+
+    def inc(self, labels: tuple, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def expose(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{{{_labels(self.labelnames, labels)}}} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self.values: dict = {}
+
+    def observe(self, labels: tuple, value: float) -> None:
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def expose(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self.values.items()):
+            base = _labels(self.labelnames, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{base}}} {series[-1]}")
+            lines.append(f"{self.name}_count{{{base}}} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Per-route request metrics, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        route = ("method", "route")
+        self.requests = Counter("http_requests_total", "Requests handled.", route + ("status",))
+        self.latency = Histogram("http_request_duration_seconds", "Request latency.", route, LATENCY_BUCKETS)
+        self.statements = Histogram("http_request_sql_statements", "SQL statements per request.", route, STATEMENT_BUCKETS)
+        self.sql_seconds = Counter("http_request_sql_seconds_total", "Time spent executing SQL.", route)
+        self.rows = Counter("http_request_rows_total", "Rows fetched for responses.", route)
+        self.body_bytes = Counter("http_request_body_bytes_total", "Request body (upload) bytes received.", route)
+        self.jobs = Counter("background_jobs_total", "Background jobs finished, by outcome.", ("kind", "status"))
+        self._metrics = (self.requests, self.latency, self.statements, self.sql_seconds, self.rows, self.body_bytes, self.jobs)
+        self._caches: dict = {}  # name -> object with stats() -> {"size", "hits", "misses", ...}
+        self._lock = threading.Lock()
+
+    def add_cache(self, name: str, cache) -> None:
+        """Expose a cache's hit, miss and size counters, read from `cache.stats()` at scrape time."""
+        self._caches[name] = cache
+
+    def observe(self, method: str, route: str, status: int, seconds: float, stats: RequestStats) -> None:
+        labels = (method, route)
+        with self._lock:
+            self.requests.inc(labels + (status,))
+            self.latency.observe(labels, seconds)
+            self.statements.observe(labels, stats.statements)
+            self.sql_seconds.inc(labels, stats.sql_seconds)
+            self.rows.inc(labels, stats.rows)
+            self.body_bytes.inc(labels, stats.body_bytes)
+
+    def observe_job(self, kind: str, status: str) -> None:
+        with self._lock:
+            self.jobs.inc((kind, status))
+
+    def _expose_caches(self) -> list:
+        stats = {name: cache.stats() for name, cache in sorted(self._caches.items())}
+        lines = []
+        for key, kind, help in (("hits", "counter", "Cache lookups answered from the cache."),
+                                ("misses", "counter", "Cache lookups that missed."),
+                                ("size", "gauge", "Entries in the cache.")):
+            name = f"cache_{key}_total" if kind == "counter" else f"cache_{key}"
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            lines += [f'{name}{{cache="{cache}"}} {values[key]}' for cache, values in stats.items()]
+        return lines
+
+    def expose(self) -> str:
+        with self._lock:
+            lines = [line for metric in self._metrics for line in metric.expose()]
+        if self._caches:
+            lines += self._expose_caches()
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def metrics_response() -> Response:
+    return Response(registry.expose(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+# ---------- SQLALCHEMY HOOKS ----------
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None:
+        return
+    elapsed = time.perf_counter() - getattr(context, "_metrics_start", time.perf_counter())
+    stats.statements += 1
+    stats.sql_seconds += elapsed
+    if stats.log is not None:
+        stats.log.append((elapsed, statement))
+
+
+def instrument_engine(engine) -> None:
+    """Attribute statement count and time to the request that ran them (pass async_engine.sync_engine)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def instrument_orm(base) -> None:
+    """Count ORM instances loaded by the nested views as fetched rows."""
+    event.listen(base, "load", lambda target, context: record_rows(1), propagate=True)
+
+
+# ---------- MIDDLEWARE ----------
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed bodies are timed until their last chunk is sent."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not enabled:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(capture_sql=SLOW_REQUEST_MS > 0)
+        token = _current.set(stats)
+        status = 500
+        start = time.perf_counter()
+
+        async def counting_receive():
+            message = await receive()
+            stats.body_bytes += len(message.get("body", b""))
+            return message
+
+        async def status_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, status_send)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - start
+            route = getattr(scope.get("route"), "path", None) or scope.get("metrics_route", "unmatched")
+            registry.observe(scope["method"], route, status, elapsed, stats)
+            if stats.log is not None and elapsed * 1000 >= SLOW_REQUEST_MS:
+                _log_slow_request(scope, status, elapsed, stats)
+
+
+def _log_slow_request(scope, status: int, elapsed: float, stats: RequestStats) -> None:
+    slowest = sorted(stats.log, key=lambda entry: entry[0], reverse=True)[:SLOW_REQUEST_MAX_STATEMENTS]
+    sql = "\n".join(f"  {seconds * 1000:.2f}ms  {' '.join(statement.split())}" for seconds, statement in slowest)
+    logger.warning(
+        f"Slow request {scope['method']} {scope['path']} -> {status} in {elapsed * 1000:.1f}ms "
+        f"({stats.statements} statements, {stats.sql_seconds * 1000:.1f}ms SQL, {stats.rows} rows)"
+        + (f":\n{sql}" if sql else "")
+    )
@@ -0,0 +1,133 @@
+"""Baseline catalog schema: users, catalog tables with relations, audio blobs, FTS index and table versions
+
+Databases created by the old import-time create_all() already have some of these tables;
+they are adopted as-is and only the columns/indexes added since are filled in.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from search import install_search_index
+from versioning import install_versioning
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _has_table(name: str) -> bool:
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def _add_missing_columns(table: str, columns: dict) -> None:
+    existing = {c["name"] for c in sa.inspect(op.get_bind()).get_columns(table)}
+    for name, ddl in columns.items():
+        if name not in existing:
+            # Plain ADD COLUMN: SQLite accepts an inline REFERENCES as long as the default is NULL,
+            # which avoids a batch table rebuild.
+            op.execute(f'ALTER TABLE "{table}" ADD COLUMN {name} {ddl}')
+
+
+def _create_missing_indexes(table: str, indexes: dict) -> None:
+    existing = {i["name"] for i in sa.inspect(op.get_bind()).get_indexes(table)}
+    for name, (columns, unique) in indexes.items():
+        if name not in existing:
+            op.create_index(name, table, columns, unique=unique)
+
+
+def upgrade() -> None:
+    if not _has_table("User"):
+        op.create_table(
+            "User",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("username", sa.String, nullable=False),
+            sa.Column("email", sa.String, nullable=True),
+            sa.Column("full_name", sa.String, nullable=True),
+            sa.Column("hashed_password", sa.String, nullable=False),
+            sa.Column("disabled", sa.Boolean, nullable=True),
+        )
+    _create_missing_indexes("User", {
+        "ix_User_id": (["id"], False),
+        "ix_User_username": (["username"], True),
+        "ix_User_email": (["email"], True),
+    })
+
+    if not _has_table("Artist"):
+        op.create_table(
+            "Artist",
+            sa.Column("Artist_id", sa.Integer, primary_key=True),
+            sa.Column("Artist_name", sa.String, nullable=False),
+            sa.Column("Country", sa.String, nullable=False),
+            sa.Column("audio_file", sa.String, nullable=True),
+            sa.Column("updated_at", sa.DateTime, nullable=True),
+        )
+    _add_missing_columns("Artist", {"updated_at": "DATETIME"})
+    _create_missing_indexes("Artist", {"ix_Artist_Artist_id": (["Artist_id"], False)})
+
+    if not _has_table("Album"):
+        op.create_table(
+            "Album",
+            sa.Column("Album_id", sa.Integer, primary_key=True),
+            sa.Column("Album_title", sa.String, nullable=True),
+            sa.Column("Total_tracks", sa.Integer, nullable=True),
+            sa.Column("audio_file", sa.String, nullable=True),
+            sa.Column("updated_at", sa.DateTime, nullable=True),
+            sa.Column("artist_id", sa.Integer, sa.ForeignKey("Artist.Artist_id", ondelete="SET NULL"), nullable=True),
+        )
+    _add_missing_columns("Album", {
+        "updated_at": "DATETIME",
+        "artist_id": "INTEGER REFERENCES Artist(Artist_id) ON DELETE SET NULL",
+    })
+    _create_missing_indexes("Album", {
+        "ix_Album_Album_id": (["Album_id"], False),
+        "ix_Album_Album_title": (["Album_title"], False),
+        "ix_Album_artist_id": (["artist_id"], False),
+    })
+
+    if not _has_table("Song"):
+        op.create_table(
+            "Song",
+            sa.Column("Songs_id", sa.Integer, primary_key=True),
+            sa.Column("Songs_name", sa.String, nullable=True),
+            sa.Column("Gener", sa.String, nullable=True),
+            sa.Column("audio_file", sa.String, nullable=True),
+            sa.Column("updated_at", sa.DateTime, nullable=True),
+            sa.Column("album_id", sa.Integer, sa.ForeignKey("Album.Album_id", ondelete="SET NULL"), nullable=True),
+            sa.Column("artist_id", sa.Integer, sa.ForeignKey("Artist.Artist_id", ondelete="SET NULL"), nullable=True),
+        )
+    _add_missing_columns("Song", {
+        "updated_at": "DATETIME",
+        "album_id": "INTEGER REFERENCES Album(Album_id) ON DELETE SET NULL",
+        "artist_id": "INTEGER REFERENCES Artist(Artist_id) ON DELETE SET NULL",
+    })
+    _create_missing_indexes("Song", {
+        "ix_Song_Songs_id": (["Songs_id"], False),
+        "ix_Song_Songs_name": (["Songs_name"], False),
+        "ix_Song_album_id": (["album_id"], False),
+        "ix_Song_artist_id": (["artist_id"], False),
+    })
+
+    if not _has_table("AudioBlob"):
+        op.create_table(
+            "AudioBlob",
+            sa.Column("path", sa.String, primary_key=True),
+            sa.Column("sha256", sa.String, nullable=False),
+            sa.Column("size", sa.Integer, nullable=False),
+            sa.Column("ref_count", sa.Integer, nullable=False),
+        )
+    _create_missing_indexes("AudioBlob", {"ix_AudioBlob_sha256": (["sha256"], False)})
+
+    install_search_index(op.get_bind())
+    install_versioning(op.get_bind())
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    for name in ("Album_fts", "Song_fts", "Artist_fts", "TableVersion"):
+        conn.execute(sa.text(f"DROP TABLE IF EXISTS {name}"))
+    for table in ("AudioBlob", "Song", "Album", "Artist", "User"):
+        op.drop_table(table)
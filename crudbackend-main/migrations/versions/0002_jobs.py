@@ -0,0 +1,51 @@
+"""Background job queue and audio analysis results
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+AUDIO_COLUMNS = {
+    "duration": sa.Float,
+    "bitrate": sa.Integer,
+    "peaks": sa.Text,
+    "preview_path": sa.String,
+    "analyzed_at": sa.DateTime,
+}
+
+
+def upgrade() -> None:
+    op.create_table(
+        "Job",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("kind", sa.String, nullable=False),
+        sa.Column("subject", sa.String, nullable=True),
+        sa.Column("payload", sa.Text, nullable=False),
+        sa.Column("status", sa.String, nullable=False),
+        sa.Column("attempts", sa.Integer, nullable=False),
+        sa.Column("error", sa.Text, nullable=True),
+        sa.Column("run_after", sa.DateTime, nullable=False),
+        sa.Column("created_at", sa.DateTime, nullable=False),
+        sa.Column("started_at", sa.DateTime, nullable=True),
+        sa.Column("finished_at", sa.DateTime, nullable=True),
+    )
+    op.create_index("ix_Job_subject", "Job", ["subject"])
+    op.create_index("ix_Job_status_run_after", "Job", ["status", "run_after"])
+
+    for name, type_ in AUDIO_COLUMNS.items():
+        # Nullable with no default: a plain ADD COLUMN, no table rebuild.
+        op.add_column("AudioBlob", sa.Column(name, type_, nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("AudioBlob") as batch:
+        for name in AUDIO_COLUMNS:
+            batch.drop_column(name)
+    op.drop_table("Job")
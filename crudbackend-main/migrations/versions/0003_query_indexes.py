@@ -0,0 +1,29 @@
+"""Indexes for filtering and sorting the catalog lists
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    "ix_Album_Total_tracks_Album_id": ("Album", ["Total_tracks", "Album_id"]),
+    "ix_Song_Gener_Songs_id": ("Song", ["Gener", "Songs_id"]),
+    "ix_Artist_Country_Artist_id": ("Artist", ["Country", "Artist_id"]),
+    "ix_Artist_Artist_name": ("Artist", ["Artist_name"]),
+}
+
+
+def upgrade() -> None:
+    for name, (table, columns) in INDEXES.items():
+        op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    for name, (table, _) in INDEXES.items():
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,25 @@
+"""Append-only change log feeding the real-time change stream
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+from changefeed import FEED_TABLES, install_change_log
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    install_change_log(op.get_bind())
+
+
+def downgrade() -> None:
+    for table in FEED_TABLES:
+        for suffix in ("ai", "au", "ad"):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_changelog_{suffix}")
+    op.execute("DROP TABLE IF EXISTS ChangeLog")
@@ -0,0 +1,44 @@
+"""Rotating refresh tokens and the access-token revocation list
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "RefreshToken",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("token_hash", sa.String, nullable=False, unique=True),
+        sa.Column("username", sa.String, nullable=False),
+        sa.Column("session_id", sa.String, nullable=False),
+        sa.Column("expires_at", sa.DateTime, nullable=False),
+        sa.Column("created_at", sa.DateTime, nullable=False),
+        sa.Column("used_at", sa.DateTime, nullable=True),
+        sa.Column("revoked_at", sa.DateTime, nullable=True),
+    )
+    op.create_index("ix_RefreshToken_username", "RefreshToken", ["username"])
+    op.create_index("ix_RefreshToken_session_id", "RefreshToken", ["session_id"])
+
+    op.create_table(
+        "RevokedToken",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("key", sa.String, nullable=False),
+        sa.Column("expires_at", sa.DateTime, nullable=False),
+        sqlite_autoincrement=True,
+    )
+    op.create_index("ix_RevokedToken_key", "RevokedToken", ["key"])
+    op.create_index("ix_RevokedToken_expires_at", "RevokedToken", ["expires_at"])
+
+
+def downgrade() -> None:
+    op.drop_table("RevokedToken")
+    op.drop_table("RefreshToken")
@@ -0,0 +1,58 @@
+"""Soft deletes on the catalog tables and an index of unreferenced audio
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from changefeed import FEED_TABLES, install_change_log
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+LIVE = sa.text("deleted_at IS NULL")
+DELETED = sa.text("deleted_at IS NOT NULL")
+
+# The filter indexes from 0003, now covering live rows only
+FILTER_INDEXES = {
+    "ix_Album_Total_tracks_Album_id": ("Album", ["Total_tracks", "Album_id"]),
+    "ix_Song_Gener_Songs_id": ("Song", ["Gener", "Songs_id"]),
+    "ix_Artist_Country_Artist_id": ("Artist", ["Country", "Artist_id"]),
+}
+
+
+def _drop_change_log_triggers() -> None:
+    for table in FEED_TABLES:
+        for suffix in ("ai", "au", "ad"):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_changelog_{suffix}")
+
+
+def upgrade() -> None:
+    for table in FEED_TABLES:
+        op.add_column(table, sa.Column("deleted_at", sa.DateTime, nullable=True))
+        op.create_index(f"ix_{table}_deleted_at", table, ["deleted_at"], sqlite_where=DELETED)
+    for name, (table, columns) in FILTER_INDEXES.items():
+        op.drop_index(name, table_name=table)
+        op.create_index(name, table, columns, sqlite_where=LIVE)
+    op.create_index("ix_AudioBlob_ref_count", "AudioBlob", ["ref_count"])
+    # Report a soft delete as a delete, not as an update of a row clients can no longer see
+    _drop_change_log_triggers()
+    install_change_log(op.get_bind(), soft_delete=True)
+
+
+def downgrade() -> None:
+    _drop_change_log_triggers()
+    install_change_log(op.get_bind())
+    op.drop_index("ix_AudioBlob_ref_count", table_name="AudioBlob")
+    for name, (table, columns) in FILTER_INDEXES.items():
+        op.drop_index(name, table_name=table)
+        op.create_index(name, table, columns)
+    for table in FEED_TABLES:
+        # Soft-deleted rows would come back to life without the column
+        op.execute(f"DELETE FROM {table} WHERE deleted_at IS NOT NULL")
+        op.drop_index(f"ix_{table}_deleted_at", table_name=table)
+        op.drop_column(table, "deleted_at")
@@ -0,0 +1,30 @@
+"""Never reuse RevokedToken ids
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+
+Processes sync the revocation list by id, so ids handed out again after a purge were never
+loaded. 0005 now creates the table with AUTOINCREMENT; this rebuilds tables created before that.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    sql = op.get_bind().execute(sa.text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'RevokedToken'")).scalar()
+    if "AUTOINCREMENT" in sql.upper():
+        return
+    # The copy keeps the ids, and AUTOINCREMENT continues above the highest of them
+    with op.batch_alter_table("RevokedToken", recreate="always", table_kwargs={"sqlite_autoincrement": True}):
+        pass
+
+
+def downgrade() -> None:
+    # Ids that never repeat are what 0005 creates as well; nothing to undo
+    pass
@@ -1,34 +1,132 @@
-from sqlalchemy import Column, ForeignKey, Integer, String
+from datetime import datetime, timezone
+
+from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, String, Text, func, text
 from sqlalchemy.orm import relationship
+
 from database import Base
-from typing import Optional
 
+def utcnow() -> datetime:
+    # Naive UTC: what the DateTime columns hold, and the form of the CURRENT_TIMESTAMP values SQLite writes
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class User(Base):
+    __tablename__ = "User"
+    id = Column(Integer, primary_key=True, index=True)
+    username = Column(String, unique=True, index=True, nullable=False)
+    email = Column(String, unique=True, index=True, nullable=True)
+    full_name = Column(String, nullable=True)
+    hashed_password = Column(String, nullable=False)
+    disabled = Column(Boolean, default=False)
+
+# Soft deletes: a DELETE only stamps deleted_at, and the collector in garbage.py purges the row later.
+# Reads filter on deleted_at IS NULL, which the partial filter indexes below are restricted to;
+# the deleted_at indexes hold only deleted rows, as the collector's purge queue.
+LIVE = text("deleted_at IS NULL")
+DELETED = text("deleted_at IS NOT NULL")
+
+# Filter column + primary key: equality/range filters on /all come back already in keyset order.
 class Album(Base):
-    __tablename__ = 'Album'
+    __tablename__ = "Album"
+    __table_args__ = (
+        Index("ix_Album_Total_tracks_Album_id", "Total_tracks", "Album_id", sqlite_where=LIVE),
+        Index("ix_Album_deleted_at", "deleted_at", sqlite_where=DELETED),
+    )
     Album_id = Column(Integer, primary_key=True, index=True)
     Album_title = Column(String, index=True)
     Total_tracks = Column(Integer)
     audio_file = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    deleted_at = Column(DateTime, nullable=True)
+    artist_id = Column(Integer, ForeignKey("Artist.Artist_id", ondelete="SET NULL"), nullable=True, index=True)
+
+    # lazy="raise": related rows must be loaded explicitly (selectinload/joinedload), never one query per row.
+    # Read-only and joined to live rows only, so the nested views never show soft-deleted ones.
+    artist = relationship("Artist", primaryjoin="and_(Album.artist_id == Artist.Artist_id, Artist.deleted_at.is_(None))", viewonly=True, lazy="raise")
+    songs = relationship("Song", primaryjoin="and_(Album.Album_id == Song.album_id, Song.deleted_at.is_(None))", viewonly=True, lazy="raise", order_by="Song.Songs_id")
 
 class Song(Base):
-    __tablename__ = 'Song'
+    __tablename__ = "Song"
+    __table_args__ = (
+        Index("ix_Song_Gener_Songs_id", "Gener", "Songs_id", sqlite_where=LIVE),
+        Index("ix_Song_deleted_at", "deleted_at", sqlite_where=DELETED),
+    )
     Songs_id = Column(Integer, primary_key=True, index=True)
     Songs_name = Column(String, index=True)
     Gener = Column(String)
     audio_file = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    deleted_at = Column(DateTime, nullable=True)
+    album_id = Column(Integer, ForeignKey("Album.Album_id", ondelete="SET NULL"), nullable=True, index=True)
+    artist_id = Column(Integer, ForeignKey("Artist.Artist_id", ondelete="SET NULL"), nullable=True, index=True)
+
+    album = relationship("Album", primaryjoin="and_(Song.album_id == Album.Album_id, Album.deleted_at.is_(None))", viewonly=True, lazy="raise")
+    artist = relationship("Artist", primaryjoin="and_(Song.artist_id == Artist.Artist_id, Artist.deleted_at.is_(None))", viewonly=True, lazy="raise")
 
 class Artist(Base):
     __tablename__ = "Artist"
+    __table_args__ = (
+        Index("ix_Artist_Country_Artist_id", "Country", "Artist_id", sqlite_where=LIVE),
+        Index("ix_Artist_deleted_at", "deleted_at", sqlite_where=DELETED),
+    )
     Artist_id = Column(Integer, primary_key=True, index=True)
-    Artist_name = Column(String, nullable=False)
+    Artist_name = Column(String, nullable=False, index=True)
     Country = Column(String, nullable=False)
     audio_file = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    deleted_at = Column(DateTime, nullable=True)
 
-class User(Base):
-    username: str
-    email: Optional[str] = None
-    full_name: Optional[str] = None
-    disabled: Optional[bool] = None
+    albums = relationship("Album", primaryjoin="and_(Artist.Artist_id == Album.artist_id, Album.deleted_at.is_(None))", viewonly=True, lazy="raise", order_by="Album.Album_id")
+    songs = relationship("Song", primaryjoin="and_(Artist.Artist_id == Song.artist_id, Song.deleted_at.is_(None))", viewonly=True, lazy="raise", order_by="Song.Songs_id")
+
+class AudioBlob(Base):
+    """One content-addressed audio file and how many catalog rows point at it."""
+    __tablename__ = "AudioBlob"
+    path = Column(String, primary_key=True)
+    sha256 = Column(String, index=True, nullable=False)
+    size = Column(Integer, nullable=False)
+    # At 0 nothing uses the file any more; the collector deletes the row and the file together
+    ref_count = Column(Integer, nullable=False, default=0, index=True)
+    # Filled in by the analyze_audio background job
+    duration = Column(Float, nullable=True)
+    bitrate = Column(Integer, nullable=True)
+    peaks = Column(Text, nullable=True)  # JSON list of 0..1 amplitudes
+    preview_path = Column(String, nullable=True)
+    analyzed_at = Column(DateTime, nullable=True)
+
+class Job(Base):
+    """One unit of background work; the table is the queue, so jobs survive restarts."""
+    __tablename__ = "Job"
+    __table_args__ = (Index("ix_Job_status_run_after", "status", "run_after"),)
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    subject = Column(String, nullable=True, index=True)  # what the job is about, e.g. an AudioBlob path
+    payload = Column(Text, nullable=False, default="{}")  # JSON arguments for the handler
+    status = Column(String, nullable=False, default="queued")  # queued, running, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    run_after = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+class RefreshToken(Base):
+    """One link of a rotating refresh-token chain; only the SHA-256 of the token is stored."""
+    __tablename__ = "RefreshToken"
+    id = Column(Integer, primary_key=True)
+    token_hash = Column(String, unique=True, nullable=False)
+    username = Column(String, nullable=False, index=True)
+    session_id = Column(String, nullable=False, index=True)  # shared by every token of one login
+    expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    used_at = Column(DateTime, nullable=True)  # set when rotated; a second use means the token leaked
+    revoked_at = Column(DateTime, nullable=True)
 
-class UserDB(User):
-    hashed_password: str
\ No newline at end of file
+class RevokedToken(Base):
+    """Denylist of access-token jtis and session ids, mirrored in memory by every process."""
+    __tablename__ = "RevokedToken"
+    # AUTOINCREMENT: ids keep increasing after a purge empties the table, so processes that
+    # sync only the rows above their last seen id never miss a new revocation.
+    __table_args__ = {"sqlite_autoincrement": True}
+    id = Column(Integer, primary_key=True)
+    key = Column(String, nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)  # no token it covers is valid past this
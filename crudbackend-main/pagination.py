@@ -0,0 +1,43 @@
+from typing import Callable, Optional
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select
+
+from metrics import record_rows
+from serialization import dumps
+
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def keyset_select(stmt: Select, key_column, limit: Optional[int], after: Optional[int]) -> Select:
+    """Restrict `stmt` to one page ordered by `key_column`, starting after the cursor."""
+    if after is not None:
+        stmt = stmt.where(key_column > after)
+    stmt = stmt.order_by(key_column)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def next_cursor_headers(rows: list, key: str, limit: Optional[int]) -> dict:
+    # A full page means there may be more rows; hand the client the last key as the next cursor.
+    if limit is not None and len(rows) == limit:
+        return {NEXT_CURSOR_HEADER: str(getattr(rows[-1], key))}
+    return {}
+
+
+def ndjson_response(session_factory, stmt: Select, encode: Callable) -> StreamingResponse:
+    """Stream every row of `stmt` (already filtered and ordered) as newline-delimited JSON with flat memory use."""
+    async def generate():
+        # The request-scoped session may be closed before the body is sent, so use our own.
+        async with session_factory() as db:
+            rows = await db.stream(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+            count = 0
+            async for row in rows:
+                count += 1
+                yield dumps(encode(row)) + b"\n"
+            record_rows(count)
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import re
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from pwdlib import PasswordHash
+from pwdlib.exceptions import UnknownHashError
+from pwdlib.hashers.argon2 import Argon2Hasher
+from pwdlib.hashers.bcrypt import BcryptHasher
+
+# ---------- CONFIG ----------
+PASSWORD_SCHEME = os.getenv("PASSWORD_SCHEME", "argon2")  # "argon2" or "bcrypt"
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "2"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "19456"))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "1"))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_POOL_SIZE = int(os.getenv("HASH_POOL_SIZE", str(os.cpu_count() or 2)))
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", str(HASH_POOL_SIZE * 4)))
+HASH_QUEUE_TIMEOUT = float(os.getenv("HASH_QUEUE_TIMEOUT", "2.0"))
+
+# Hashes written by the old main.py: unsalted sha256 hex digests.
+_LEGACY_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class PoolSaturated(Exception):
+    """Raised when no hashing slot frees up within the queue timeout."""
+
+
+def build_password_hash(
+    scheme: str = PASSWORD_SCHEME,
+    argon2_time_cost: int = ARGON2_TIME_COST,
+    argon2_memory_cost: int = ARGON2_MEMORY_COST,
+    argon2_parallelism: int = ARGON2_PARALLELISM,
+    bcrypt_rounds: int = BCRYPT_ROUNDS,
+) -> PasswordHash:
+    # The first hasher is used for new hashes; the others can still verify (and get upgraded).
+    argon2 = Argon2Hasher(
+        time_cost=argon2_time_cost,
+        memory_cost=argon2_memory_cost,
+        parallelism=argon2_parallelism,
+    )
+    bcrypt = BcryptHasher(rounds=bcrypt_rounds)
+    if scheme == "argon2":
+        return PasswordHash((argon2, bcrypt))
+    if scheme == "bcrypt":
+        return PasswordHash((bcrypt, argon2))
+    raise ValueError(f"Unknown password scheme: {scheme}")
+
+
+def is_legacy_hash(hashed_password: str) -> bool:
+    return bool(_LEGACY_SHA256_RE.match(hashed_password))
+
+
+class PasswordService:
+    """Runs the KDF on a bounded thread pool so slow hashes never block the event loop.
+
+    argon2-cffi and bcrypt release the GIL while hashing, so threads scale across cores.
+    At most `queue_limit` hashes may be running or queued; callers beyond that wait up to
+    `queue_timeout` seconds and then get PoolSaturated instead of piling up unbounded work.
+    """
+
+    def __init__(
+        self,
+        password_hash: Optional[PasswordHash] = None,
+        pool_size: int = HASH_POOL_SIZE,
+        queue_limit: int = HASH_QUEUE_LIMIT,
+        queue_timeout: float = HASH_QUEUE_TIMEOUT,
+    ):
+        self.password_hash = password_hash or build_password_hash()
+        self.pool_size = pool_size
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="password-hash")
+        self._slots = asyncio.Semaphore(max(queue_limit, pool_size))
+        self._dummy_hash: Optional[str] = None
+
+    async def _run(self, fn, *args):
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise PoolSaturated()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.password_hash.hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Check a password; the second value is a new hash to store when the old one is outdated."""
+        if is_legacy_hash(hashed_password):
+            legacy = hashlib.sha256(password.encode()).hexdigest()
+            if not hmac.compare_digest(legacy, hashed_password):
+                return False, None
+            return True, await self.hash(password)
+        try:
+            return await self._run(self.password_hash.verify_and_update, password, hashed_password)
+        except UnknownHashError:
+            return False, None
+
+    async def verify_dummy(self, password: str) -> None:
+        """Verify against a throwaway hash, so a login for an unknown user takes as long as a real one."""
+        if self._dummy_hash is None:
+            self._dummy_hash = await self.hash(secrets.token_urlsafe(16))
+        await self._run(self.password_hash.verify, password, self._dummy_hash)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
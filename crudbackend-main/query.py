@@ -0,0 +1,250 @@
+"""Typed filter / sort / sparse-fieldset parameters for the catalog list endpoints.
+
+    /api/songs/all?Gener=Rock&album_id[in]=1,2&sort=-Songs_name&fields=Songs_id,Songs_name&limit=50
+
+Filters are `field=value` (equality) or `field[op]=value`, and values are parsed to the column's
+type. The sort always ends on the primary key, so the order is total and the X-Next-Cursor of a
+page resumes exactly after its last row. With the default sort the cursor is the plain key, as
+before; otherwise it is an opaque token that also records the sort it belongs to.
+"""
+import base64
+import binascii
+import json
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import Select, and_, false, literal, or_, select, tuple_, union_all
+
+from pagination import NEXT_CURSOR_HEADER
+from serialization import RowEncoder
+
+OPERATORS = ("eq", "ne", "lt", "lte", "gt", "gte", "in", "null")
+RESERVED_PARAMS = frozenset({"limit", "after", "stream", "sort", "fields"})
+MAX_IN_VALUES = 100
+_FILTER_RE = re.compile(r"^(\w+)(?:\[(\w+)\])?$")
+
+
+def _invalid(detail: str) -> HTTPException:
+    return HTTPException(status_code=422, detail=detail)
+
+
+@lru_cache(maxsize=256)
+def _projection(model, fields: Tuple[str, ...], audio: bool, hidden: Tuple[str, ...]) -> RowEncoder:
+    return RowEncoder(model, fields, audio=audio, hidden=hidden)
+
+
+@dataclass(frozen=True)
+class CatalogQuery:
+    filters: Tuple[tuple, ...]  # (field, op, value)
+    sort: Tuple[Tuple[str, bool], ...]  # (field, descending), ending with the primary key
+    encoder: RowEncoder
+    filter_key: Optional[str]
+    sort_key: str
+    fields_key: Optional[str]
+    default_sort: bool
+
+    def cache_params(self) -> dict:
+        # All None for a plain request, so it shares its cache entry with the old endpoint
+        return {
+            "filter": self.filter_key,
+            "sort": None if self.default_sort else self.sort_key,
+            "fields": self.fields_key,
+        }
+
+
+class QuerySpec:
+    """The columns of one model that clients may filter, sort and select, with their value types."""
+
+    def __init__(self, encoder: RowEncoder, key: str, types: dict):
+        self.encoder = encoder
+        self.model = encoder.model
+        self.key = key
+        self.types = types
+        self.nullable = {name: self.model.__table__.c[name].nullable for name in types}
+
+    # ---------- PARSING ----------
+    def parse(self, params, sort: Optional[str] = None, fields: Optional[str] = None) -> CatalogQuery:
+        filters, raw = [], []
+        for name, value in params.multi_items():
+            if name in RESERVED_PARAMS or name.startswith("_"):
+                continue
+            match = _FILTER_RE.match(name)
+            field, op = (match.group(1), match.group(2) or "eq") if match else (name, "eq")
+            if field not in self.types:
+                raise _invalid(f"Unknown filter field {field!r}; filterable: {', '.join(self.types)}")
+            if op not in OPERATORS:
+                raise _invalid(f"Unknown operator {op!r} for {field}; use one of {', '.join(OPERATORS)}")
+            filters.append((field, op, self._parse_value(field, op, value)))
+            raw.append(f"{name}={value}")
+        order = self._parse_sort(sort)
+        encoder, fields_key = self._parse_fields(fields, order)
+        return CatalogQuery(
+            filters=tuple(filters),
+            sort=order,
+            encoder=encoder,
+            filter_key="&".join(sorted(raw)) or None,
+            sort_key=",".join(("-" if desc else "") + name for name, desc in order),
+            fields_key=fields_key,
+            default_sort=order == ((self.key, False),),
+        )
+
+    def _cast(self, field: str, raw: str):
+        try:
+            return self.types[field](raw)
+        except ValueError:
+            raise _invalid(f"{field} expects {self.types[field].__name__}, got {raw!r}")
+
+    def _parse_value(self, field: str, op: str, raw: str):
+        if op == "null":
+            if raw not in ("true", "false"):
+                raise _invalid(f"{field}[null] must be true or false")
+            return raw == "true"
+        if op == "in":
+            values = raw.split(",")
+            if len(values) > MAX_IN_VALUES:
+                raise _invalid(f"{field}[in] takes at most {MAX_IN_VALUES} values")
+            return tuple(self._cast(field, v) for v in values)
+        return self._cast(field, raw)
+
+    def _parse_sort(self, sort: Optional[str]) -> Tuple[Tuple[str, bool], ...]:
+        order = []
+        for part in (sort or "").split(","):
+            # "+name" arrives as " name", since + decodes to a space
+            part = part.strip()
+            if not part:
+                continue
+            descending = part.startswith("-")
+            name = part.lstrip("-+")
+            if name not in self.types:
+                raise _invalid(f"Unknown sort field {name!r}; sortable: {', '.join(self.types)}")
+            if any(name == n for n, _ in order):
+                raise _invalid(f"{name} appears twice in sort")
+            order.append((name, descending))
+            if name == self.key:
+                break  # the key is unique, later columns could never apply
+        if not order or order[-1][0] != self.key:
+            # Ties break on the key, in the direction of the last column so one index scan covers both
+            order.append((self.key, order[-1][1] if order else False))
+        return tuple(order)
+
+    def _parse_fields(self, fields: Optional[str], order) -> Tuple[RowEncoder, Optional[str]]:
+        if fields is None:
+            return self.encoder, None
+        requested = {f.strip() for f in fields.split(",") if f.strip()}
+        unknown = requested - set(self.encoder.keys)
+        if unknown or not requested:
+            raise _invalid(f"Unknown fields {', '.join(sorted(unknown))}; available: {', '.join(self.encoder.keys)}")
+        # Declared order, so equivalent requests share one projection and cache entry
+        selected = tuple(f for f in self.encoder.fields if f in requested)
+        hidden = tuple(name for name, _ in order if name not in requested)
+        audio = "audio_url" in requested
+        fields_key = ",".join(selected + (("audio_url",) if audio else ()))
+        return _projection(self.model, selected, audio, hidden), fields_key
+
+    # ---------- SQL ----------
+    def select(self, q: CatalogQuery, after: Optional[str] = None, limit: Optional[int] = None) -> Select:
+        # Soft-deleted rows are never listed; the filter indexes only cover live rows
+        stmt = q.encoder.select().where(self.model.deleted_at.is_(None))
+        for field, op, value in q.filters:
+            stmt = stmt.where(_condition(getattr(self.model, field), op, value))
+        if after is None:
+            return self._ordered(stmt, q, limit)
+
+        values = self._decode_cursor(q, after)
+        columns = [getattr(self.model, name) for name, _ in q.sort]
+        # NULLs sort first ascending and last descending; a row-value comparison skips them,
+        # which is only right when they are all behind the cursor.
+        nulls_ahead = any(value is None or (desc and self.nullable[name]) for (name, desc), value in zip(q.sort, values))
+        if len({desc for _, desc in q.sort}) == 1 and not nulls_ahead:
+            # (a, b, key) > (x, y, k): one range on a matching index
+            left, right = tuple_(*columns), tuple_(*values)
+            return self._ordered(stmt.where(left < right if q.sort[0][1] else left > right), q, limit)
+
+        parts = self._after_parts(q, columns, values)
+        if limit is None:
+            # A stream reads everything after the cursor anyway
+            return self._ordered(stmt.where(or_(*parts)), q, None)
+        # OR-ed, these conditions make SQLite walk the index from its start up to the cursor.
+        # Each one alone is an index range, so take a page from each and concatenate them in order.
+        pages = [
+            select(self._ordered(stmt.where(part), q, limit).add_columns(literal(i).label("keyset_part")).subquery())
+            for i, part in enumerate(parts)
+        ]
+        merged = union_all(*pages).subquery()
+        return select(merged).order_by(merged.c.keyset_part, *self._order(q, merged.c)).limit(limit)
+
+    def _order(self, q: CatalogQuery, columns) -> list:
+        return [columns[name].desc() if desc else columns[name] for name, desc in q.sort]
+
+    def _ordered(self, stmt: Select, q: CatalogQuery, limit: Optional[int]) -> Select:
+        stmt = stmt.order_by(*self._order(q, self.model.__table__.c))
+        return stmt.limit(limit) if limit is not None else stmt
+
+    def _after_parts(self, q: CatalogQuery, columns: list, values: list) -> list:
+        """Disjoint conditions that together select the rows after the cursor, in sort order."""
+        parts = []
+        # Rows sharing the longest prefix with the cursor come first: (a = x AND b = y AND key > k), ...
+        for i in reversed(range(len(q.sort))):
+            (name, desc), column, value = q.sort[i], columns[i], values[i]
+            same = [c.is_(None) if v is None else c == v for c, v in zip(columns[:i], values[:i])]
+            if value is None:
+                if not desc:
+                    parts.append(and_(*same, column.is_not(None)))
+                # descending, nothing comes after NULL
+            elif desc:
+                parts.append(and_(*same, column < value))
+                if self.nullable[name]:
+                    parts.append(and_(*same, column.is_(None)))
+            else:
+                parts.append(and_(*same, column > value))
+        return parts or [false()]
+
+    # ---------- CURSORS ----------
+    def next_cursor_headers(self, q: CatalogQuery, rows: Sequence, limit: Optional[int]) -> dict:
+        if limit is None or len(rows) < limit:
+            return {}
+        last = rows[-1]
+        if q.default_sort:
+            return {NEXT_CURSOR_HEADER: str(getattr(last, self.key))}
+        token = json.dumps({"s": q.sort_key, "v": [getattr(last, name) for name, _ in q.sort]}, separators=(",", ":"))
+        return {NEXT_CURSOR_HEADER: base64.urlsafe_b64encode(token.encode()).decode().rstrip("=")}
+
+    def _decode_cursor(self, q: CatalogQuery, after: str) -> list:
+        if q.default_sort:
+            try:
+                return [self.types[self.key](after)]
+            except ValueError:
+                raise _invalid("Invalid cursor")
+        try:
+            data = json.loads(base64.urlsafe_b64decode(after + "=" * (-len(after) % 4)))
+            sort_key, values = data["s"], data["v"]
+        except (ValueError, KeyError, TypeError, binascii.Error):
+            raise _invalid("Invalid cursor")
+        if sort_key != q.sort_key or not isinstance(values, list) or len(values) != len(q.sort):
+            raise _invalid("Cursor belongs to a different sort")
+        for (name, _), value in zip(q.sort, values):
+            if value is not None and not isinstance(value, self.types[name]):
+                raise _invalid("Invalid cursor")
+        return values
+
+
+def _condition(column, op: str, value):
+    if op == "eq":
+        return column == value
+    if op == "ne":
+        return column != value
+    if op == "lt":
+        return column < value
+    if op == "lte":
+        return column <= value
+    if op == "gt":
+        return column > value
+    if op == "gte":
+        return column >= value
+    if op == "in":
+        return column.in_(value)
+    return column.is_(None) if value else column.is_not(None)
+
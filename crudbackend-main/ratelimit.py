@@ -0,0 +1,236 @@
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple
+from urllib.parse import parse_qs
+
+from backends import REDIS_URL, redis_client, select_backend
+from serialization import dumps
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "local")  # "local" or "redis"
+# Only honour X-Forwarded-For behind a proxy that sets it; otherwise clients could pick their own key.
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "0") == "1"
+SWEEP_INTERVAL_SECONDS = 30
+MAX_FORM_BYTES = 64 * 1024
+
+
+@dataclass(frozen=True)
+class Rule:
+    """A token bucket of `burst` requests refilled at `per_minute`, one per client key."""
+    name: str
+    methods: Tuple[str, ...]
+    match: Callable[[str], bool]
+    per_minute: float
+    burst: int
+    key: str = "ip"  # "ip", or "username" for the form field of login requests
+
+    @property
+    def rate(self) -> float:
+        return self.per_minute / 60.0
+
+    @property
+    def ttl(self) -> float:
+        # After this long idle the bucket is full again, so forgetting it changes nothing.
+        return self.burst / self.rate
+
+
+def _is_search(path: str) -> bool:
+    return path.startswith("/api/") and path.endswith("/search")
+
+
+def default_rules() -> list:
+    def per_minute(name: str, default: int) -> float:
+        return float(os.getenv(f"RATE_LIMIT_{name}_PER_MINUTE", str(default)))
+
+    return [
+        Rule("login-ip", ("POST",), lambda p: p == "/token", per_minute("LOGIN", 20), burst=10),
+        Rule("login-user", ("POST",), lambda p: p == "/token", per_minute("LOGIN_USER", 5), burst=5, key="username"),
+        Rule("refresh-ip", ("POST",), lambda p: p == "/token/refresh", per_minute("REFRESH", 60), burst=20),
+        Rule("signup-ip", ("POST",), lambda p: p == "/signup", per_minute("SIGNUP", 5), burst=5),
+        Rule("search-ip", ("GET",), _is_search, per_minute("SEARCH", 120), burst=30),
+    ]
+
+
+# ---------- BACKENDS ----------
+class RateLimitBackend(ABC):
+    @abstractmethod
+    async def hit(self, rule: Rule, key: str) -> float:
+        """Take one token; returns 0 if allowed, else the seconds until a token is available."""
+
+
+class LocalBackend(RateLimitBackend):
+    """Per-process buckets; O(1) per request, with idle buckets swept in insertion order."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        # rule name -> OrderedDict(key -> [tokens, last refill]); one dict per rule keeps a
+        # single TTL per dict, so a sweep can stop at the first bucket that is still live.
+        self._buckets: dict = {}
+        self._ttls: dict = {}
+        self._next_sweep = clock() + SWEEP_INTERVAL_SECONDS
+        self._lock = threading.Lock()
+
+    async def hit(self, rule: Rule, key: str) -> float:
+        now = self.clock()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            buckets = self._buckets.get(rule.name)
+            if buckets is None:
+                buckets = self._buckets[rule.name] = OrderedDict()
+                self._ttls[rule.name] = rule.ttl
+            bucket = buckets.pop(key, None)
+            if bucket is None:
+                bucket = [float(rule.burst), now]
+            else:
+                bucket[0] = min(rule.burst, bucket[0] + (now - bucket[1]) * rule.rate)
+                bucket[1] = now
+            buckets[key] = bucket
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            return (1 - bucket[0]) / rule.rate
+
+    def _sweep(self, now: float) -> None:
+        for name, buckets in self._buckets.items():
+            ttl = self._ttls[name]
+            # Buckets are re-inserted on every hit, so the oldest idle ones are at the front.
+            while buckets:
+                _, (_, last) = next(iter(buckets.items()))
+                if now - last < ttl:
+                    break
+                buckets.popitem(last=False)
+        self._next_sweep = now + SWEEP_INTERVAL_SECONDS
+
+    def size(self) -> int:
+        return sum(len(b) for b in self._buckets.values())
+
+
+class RedisBackend(RateLimitBackend):
+    """Shares buckets between workers; the refill-and-take runs atomically in a Lua script."""
+
+    SCRIPT = """
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'last')
+    local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local tokens = tonumber(bucket[1]) or burst
+    local last = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - last) * rate)
+    local wait = 0
+    if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'last', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate))
+    return tostring(wait)
+    """
+
+    def __init__(self, url: str = REDIS_URL, prefix: str = "ratelimit:"):
+        self.client = redis_client(url)
+        self.prefix = prefix
+        self._script = self.client.register_script(self.SCRIPT)
+
+    async def hit(self, rule: Rule, key: str) -> float:
+        wait = await self._script(keys=[f"{self.prefix}{rule.name}:{key}"], args=[rule.rate, rule.burst, time.time()])
+        return float(wait)
+
+
+def make_backend(kind: str = RATE_LIMIT_BACKEND) -> RateLimitBackend:
+    return select_backend(kind, "rate limit", LocalBackend, RedisBackend)
+
+
+# ---------- MIDDLEWARE ----------
+def client_ip(scope) -> str:
+    if RATE_LIMIT_TRUST_PROXY:
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+async def _read_body(receive) -> Tuple[bytes, list]:
+    messages, body = [], b""
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        body += message.get("body", b"")
+        if not message.get("more_body") or len(body) > MAX_FORM_BYTES:
+            break
+    return body, messages
+
+
+def _form_field(body: bytes, field: str) -> Optional[str]:
+    try:
+        values = parse_qs(body.decode("latin-1"), max_num_fields=20).get(field)
+    except ValueError:
+        return None
+    return values[0].strip().lower() if values else None
+
+
+class RateLimitMiddleware:
+    """Answers 429 + Retry-After before the request reaches a handler (and so before any DB work).
+
+    Login requests are also limited per submitted username, which needs the form body: it is
+    buffered here (up to MAX_FORM_BYTES) and replayed to the app unchanged.
+    """
+
+    def __init__(self, app, rules: Optional[list] = None, backend: Optional[RateLimitBackend] = None):
+        self.app = app
+        self.rules = default_rules() if rules is None else rules
+        self.backend = backend or make_backend()
+        self.limited = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not RATE_LIMIT_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        method, path = scope["method"], scope["path"]
+        rules = [r for r in self.rules if method in r.methods and r.match(path)]
+        if not rules:
+            await self.app(scope, receive, send)
+            return
+
+        ip = client_ip(scope)
+        username = None
+        if any(r.key == "username" for r in rules):
+            body, messages = await _read_body(receive)
+            username = _form_field(body, "username")
+
+            async def replay():
+                return messages.pop(0) if messages else await receive()
+
+            receive = replay
+
+        wait, limited_by = 0.0, None
+        for rule in rules:
+            key = username if rule.key == "username" else ip
+            if key is not None:
+                rule_wait = await self.backend.hit(rule, key)
+                if rule_wait > wait:
+                    wait, limited_by = rule_wait, rule.name
+        if wait > 0:
+            self.limited += 1
+            # Requests rejected here never reach the router; label them by rule in /metrics instead.
+            scope["metrics_route"] = f"ratelimit:{limited_by}"
+            await _too_many_requests(send, wait)
+            return
+        await self.app(scope, receive, send)
+
+
+async def _too_many_requests(send, wait: float) -> None:
+    body = dumps({"detail": "Too many requests, try again later"})
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(wait))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable, Optional, Tuple
+
+from fastapi import Response
+
+from backends import REDIS_URL, redis_client, select_backend
+from serialization import dumps
+
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "local")  # "local" or "redis"
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+CACHE_STATUS_HEADER = "X-Cache"
+
+
+class CacheBackend(ABC):
+    """Storage for pre-serialized responses plus per-table generation counters."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes) -> None:
+        ...
+
+    @abstractmethod
+    async def generation(self, name: str) -> int:
+        ...
+
+    @abstractmethod
+    async def bump(self, name: str) -> int:
+        ...
+
+
+class LocalBackend(CacheBackend):
+    """In-process LRU bounded by the total size of the cached bodies."""
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._generations: dict = {}
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    async def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    async def generation(self, name: str) -> int:
+        return self._generations.get(name, 0)
+
+    async def bump(self, name: str) -> int:
+        with self._lock:
+            self._generations[name] = self._generations.get(name, 0) + 1
+            return self._generations[name]
+
+
+class RedisBackend(CacheBackend):
+    """Shares the cache between workers through any Redis-protocol server.
+
+    Stale generations are never read again, so entries just carry a TTL and the server's
+    maxmemory policy (allkeys-lru) takes care of eviction.
+    """
+
+    def __init__(self, url: str = REDIS_URL, ttl: int = RESPONSE_CACHE_TTL_SECONDS, prefix: str = "catalog:"):
+        self.client = redis_client(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key: str, value: bytes) -> None:
+        await self.client.set(self.prefix + key, value, ex=self.ttl)
+
+    async def generation(self, name: str) -> int:
+        return int(await self.client.get(f"{self.prefix}gen:{name}") or 0)
+
+    async def bump(self, name: str) -> int:
+        return await self.client.incr(f"{self.prefix}gen:{name}")
+
+
+def make_backend(kind: str = RESPONSE_CACHE_BACKEND) -> CacheBackend:
+    return select_backend(kind, "response cache", LocalBackend, RedisBackend)
+
+
+class ResponseCache:
+    """Caches JSON endpoint bodies keyed by endpoint, parameters and table generations.
+
+    Writers call `invalidate(table)` after committing; that bumps the table's generation so
+    every cached key built from the old generation simply stops being looked up. Callers that
+    already read the TableVersion counters pass them as `versions`; those are bumped by triggers
+    in the database, so writes made by other worker processes invalidate local entries too.
+    """
+
+    def __init__(self, backend: Optional[CacheBackend] = None):
+        self.backend = backend or make_backend()
+        self.hits = 0
+        self.misses = 0
+
+    async def _key(self, endpoint: str, params: dict, tables: Iterable[str], versions: Optional[dict]) -> str:
+        generations = ",".join([f"{t}={await self.backend.generation(t)}.{(versions or {}).get(t, '')}" for t in tables])
+        query = "&".join(f"{k}={v}" for k, v in sorted(params.items()) if v is not None)
+        return f"{endpoint}?{query}#{generations}"
+
+    async def cached(
+        self,
+        endpoint: str,
+        params: dict,
+        tables: Iterable[str],
+        build: Callable[[], Awaitable[Tuple[object, dict]]],
+        versions: Optional[dict] = None,
+    ) -> Response:
+        """Serve from cache, or await `build()` -> (payload, headers) and store the encoded result."""
+        # Read the generations before querying, so a write that lands mid-build invalidates this entry.
+        key = await self._key(endpoint, params, tables, versions)
+        entry = await self.backend.get(key)
+        if entry is not None:
+            self.hits += 1
+            raw_headers, body = entry.split(b"\n", 1)
+            headers = json.loads(raw_headers)
+            status = "HIT"
+        else:
+            self.misses += 1
+            payload, headers = await build()
+            body = dumps(payload)
+            await self.backend.set(key, json.dumps(headers).encode() + b"\n" + body)
+            status = "MISS"
+        return Response(body, media_type="application/json", headers={**headers, CACHE_STATUS_HEADER: status})
+
+    async def invalidate(self, *tables: str) -> None:
+        for table in tables:
+            await self.backend.bump(table)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, ConfigDict, EmailStr
 
 class UserCreate(BaseModel):
     email: EmailStr
@@ -10,9 +10,8 @@ class UserLogin(BaseModel):
     password: str
 
 class ShowUser(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     email: EmailStr
     username: str
-
-    class Config:
-        orm_mode = True
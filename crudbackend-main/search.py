@@ -0,0 +1,110 @@
+import logging
+import re
+from typing import Optional, Sequence
+
+from sqlalchemy import select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+# table -> (primary key, indexed text column)
+FTS_TABLES = {
+    "Album": ("Album_id", "Album_title"),
+    "Song": ("Songs_id", "Songs_name"),
+    "Artist": ("Artist_id", "Artist_name"),
+}
+
+DEFAULT_SEARCH_LIMIT = 50
+MAX_SEARCH_LIMIT = 500
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+fts_enabled = False
+
+
+def _fts_statements(table: str, key: str, column: str) -> list:
+    fts = f"{table}_fts"
+    # External-content FTS5 table kept in sync by triggers, so every insert/update/delete
+    # done by the handlers updates the index inside the same transaction.
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{column}, content='{table}', content_rowid='{key}', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {column}) VALUES (new.{key}, new.{column}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.{key}, old.{column}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {column} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.{key}, old.{column}); "
+        f"INSERT INTO {fts}(rowid, {column}) VALUES (new.{key}, new.{column}); END",
+    ]
+
+
+def _fts_exists(conn: Connection, fts: str) -> bool:
+    return conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": fts},
+    ).first() is not None
+
+
+def install_search_index(conn: Connection) -> bool:
+    """Create the FTS5 tables and triggers, backfilling rows that predate the index (run by migrations)."""
+    try:
+        for table, (key, column) in FTS_TABLES.items():
+            fts = f"{table}_fts"
+            exists = _fts_exists(conn, fts)
+            for statement in _fts_statements(table, key, column):
+                conn.execute(text(statement))
+            if not exists:
+                conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+    except Exception as e:
+        logger.warning(f"FTS5 unavailable, search will fall back to LIKE: {e}")
+        return False
+    return True
+
+
+def detect_search_index(engine: Engine) -> bool:
+    """Use FTS5 only if the migrations managed to create every index table."""
+    global fts_enabled
+    with engine.connect() as conn:
+        fts_enabled = all(_fts_exists(conn, f"{table}_fts") for table in FTS_TABLES)
+    if not fts_enabled:
+        logger.warning("FTS5 index missing, falling back to LIKE search")
+    return fts_enabled
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """Turn free text into an FTS5 expression where every term is a quoted prefix match."""
+    terms = _TOKEN_RE.findall(query)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def escape_like(query: str) -> str:
+    """Make `query` match itself literally inside a LIKE pattern with ESCAPE '\\'."""
+    return query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+async def search(db: AsyncSession, model, columns: Sequence, query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list:
+    """Return `columns` of the `model` rows matching `query`, best bm25 rank first."""
+    table = model.__tablename__
+    key, column = FTS_TABLES[table]
+    if not fts_enabled:
+        pattern = f"%{escape_like(query)}%"
+        result = await db.execute(
+            select(*columns).where(getattr(model, column).like(pattern, escape="\\"), model.deleted_at.is_(None)).limit(limit)
+        )
+        return result.all()
+    match = build_match_query(query)
+    if match is None:
+        return []
+    fts = f"{table}_fts"
+    names = ", ".join(f"{table}.{c.key}" for c in columns)
+    statement = text(
+        f"SELECT {names} FROM {fts} JOIN {table} ON {table}.{key} = {fts}.rowid "
+        f"WHERE {fts} MATCH :match AND {table}.deleted_at IS NULL ORDER BY {fts}.rank LIMIT :limit"
+    )
+    result = await db.execute(statement, {"match": match, "limit": limit})
+    return result.all()
@@ -0,0 +1,70 @@
+import json
+import os
+from typing import Any, Iterable, Optional, Sequence
+
+from fastapi.responses import JSONResponse
+from sqlalchemy import Select, select
+
+from metrics import record_rows
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse that renders with orjson when it is installed."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def audio_url(audio_file: Optional[str]) -> Optional[str]:
+    return "/static/" + os.path.basename(audio_file) if audio_file else None
+
+
+class RowEncoder:
+    """Selects only the columns an endpoint returns and turns the result tuples into response dicts.
+
+    Skipping ORM objects avoids identity-map bookkeeping and attribute instrumentation per row;
+    the key tuple is built once so encoding a row is a single dict(zip(...)).
+    """
+
+    def __init__(self, model, fields: Sequence[str], audio: bool = True, hidden: Sequence[str] = ()):
+        self.model = model
+        self.fields = tuple(fields)
+        self.audio = audio
+        # Hidden columns (e.g. sort keys for a cursor) are selected last, so zip() with the keys drops them.
+        self.columns = (
+            [getattr(model, f) for f in self.fields]
+            + ([model.audio_file] if audio else [])
+            + [getattr(model, h) for h in hidden]
+        )
+        self.keys = self.fields + (("audio_url",) if audio else ())
+        self._audio_index = len(self.fields) if audio else None
+
+    def select(self) -> Select:
+        return select(*self.columns)
+
+    def encode(self, row: Sequence) -> dict:
+        values = list(row)
+        if self._audio_index is not None:
+            values[self._audio_index] = audio_url(values[self._audio_index])
+        return dict(zip(self.keys, values))
+
+    def encode_all(self, rows: Iterable[Sequence]) -> list:
+        encode = self.encode
+        encoded = [encode(row) for row in rows]
+        record_rows(len(encoded))
+        return encoded
+
+    def encode_obj(self, obj) -> dict:
+        return self.encode([getattr(obj, f) for f in self.fields] + ([obj.audio_file] if self.audio else []))
+
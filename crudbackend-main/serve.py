@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Production launcher: shared-nothing uvicorn workers, one per core by default.
+
+    python serve.py
+    python serve.py --workers 8 --port 8000 --backlog 4096 --keep-alive 15
+
+Migrations run once here, before any worker starts. Each worker then opens its own engines and
+caches in the app lifespan, warms them, and disposes of them on the way out. Workers share nothing
+but the SQLite file, which already carries the state they must agree on: table versions (response
+cache keys), the change log, the revocation list and the job queue. With more than one worker,
+background jobs run in a single `jobs.py` process instead of a pool in every worker.
+
+On SIGTERM a worker stops accepting connections, ends change-feed streams, and gives in-flight
+requests, uploads included, up to --graceful-timeout seconds to finish before its lifespan shutdown.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import subprocess
+import sys
+from typing import Callable
+
+import uvicorn
+
+import database
+import jobs
+import ratelimit
+
+logger = logging.getLogger(__name__)
+
+# ---------- CONFIG ----------
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+BACKLOG = int(os.getenv("BACKLOG", "2048"))  # pending connections per listening socket
+KEEP_ALIVE_SECONDS = int(os.getenv("KEEP_ALIVE_SECONDS", "5"))  # keep above a fronting proxy's idle timeout
+GRACEFUL_TIMEOUT_SECONDS = int(os.getenv("GRACEFUL_TIMEOUT_SECONDS", "30"))
+JOB_STOP_TIMEOUT_SECONDS = 30
+
+
+def on_shutdown_signal(callback: Callable[[], None]) -> None:
+    """Also run `callback` on the event loop when the server is told to stop (SIGTERM/SIGINT).
+
+    The server only runs the lifespan shutdown once open requests are done, which a stream that
+    never ends would delay until the graceful timeout. Chaining onto the server's own handler
+    lets such streams be closed first. A no-op outside the main thread (e.g. in TestClient).
+    """
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            previous = signal.getsignal(sig)
+        except ValueError:
+            return
+        if not callable(previous):
+            continue
+
+        def handler(signum, frame, previous=previous):
+            loop.call_soon_threadsafe(callback)
+            previous(signum, frame)
+
+        try:
+            signal.signal(sig, handler)
+        except ValueError:  # not the main thread
+            return
+
+
+def start_job_worker(workers: int) -> subprocess.Popen:
+    # Spawned web workers inherit the environment, so this turns their own job pools off
+    os.environ["JOB_WORKERS"] = "0"
+    return subprocess.Popen([sys.executable, os.path.join(database.BACKEND_DIR, "jobs.py"), "--workers", str(workers)])
+
+
+def stop_job_worker(process: subprocess.Popen) -> None:
+    # SIGINT is the job worker's graceful stop: running jobs are put back in the queue
+    if process.poll() is None:
+        process.send_signal(signal.SIGINT)
+    try:
+        process.wait(JOB_STOP_TIMEOUT_SECONDS)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Run the API with several worker processes.")
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY, help="default: WEB_CONCURRENCY or the core count")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--backlog", type=int, default=BACKLOG)
+    parser.add_argument("--keep-alive", type=int, default=KEEP_ALIVE_SECONDS, help="idle keep-alive timeout in seconds")
+    parser.add_argument("--graceful-timeout", type=int, default=GRACEFUL_TIMEOUT_SECONDS,
+                        help="seconds in-flight requests get to finish after SIGTERM")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    # Migrate once, not in every worker at the same moment
+    database.init_db()
+    asyncio.run(database.dispose_engines())
+
+    job_worker = None
+    if args.workers > 1:
+        if jobs.JOB_WORKERS > 0:
+            job_worker = start_job_worker(jobs.JOB_WORKERS)
+        if ratelimit.RATE_LIMIT_ENABLED and ratelimit.RATE_LIMIT_BACKEND == "local":
+            logger.warning("Rate limits are counted per worker; set RATE_LIMIT_BACKEND=redis to share them across %d workers", args.workers)
+    try:
+        uvicorn.run(
+            "main:app",
+            app_dir=database.BACKEND_DIR,
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            backlog=args.backlog,
+            timeout_keep_alive=args.keep_alive,
+            timeout_graceful_shutdown=args.graceful_timeout,
+        )
+    finally:
+        if job_worker is not None:
+            stop_job_worker(job_worker)
+
+
+if __name__ == "__main__":
+    main_cli()
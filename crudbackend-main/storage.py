@@ -0,0 +1,115 @@
+import hashlib
+import os
+import re
+import stat
+import tempfile
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import HTTPException, Response, UploadFile, status
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+
+from versioning import etag_matches
+
+CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+
+# Content-addressed files never change, so clients may cache them forever; files saved
+# under their original name (before hashing) could be overwritten and must revalidate.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+_CONTENT_ADDRESSED_RE = re.compile(r"^([0-9a-f]{64})(\.\w+)?$")
+
+
+@dataclass
+class StoredFile:
+    path: str
+    sha256: str
+    size: int
+
+
+def _write_chunk(out, hasher, chunk: bytes) -> None:
+    hasher.update(chunk)
+    out.write(chunk)
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _open_temp(upload_dir: str) -> tuple:
+    tmp_dir = os.path.join(upload_dir, ".tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    return tempfile.mkstemp(dir=tmp_dir)
+
+
+def _store(tmp_path: str, path: str) -> None:
+    """Move a finished upload into place, or drop it if the same content is stored already."""
+    if os.path.exists(path):
+        _unlink(tmp_path)
+        # Fresh mtime: the collector's sweep leaves young files alone while the blob row is written
+        os.utime(path)
+    else:
+        # Same filesystem as the temp dir, so this rename is atomic.
+        os.replace(tmp_path, path)
+
+
+async def save_upload(file: UploadFile, upload_dir: str, max_bytes: int = MAX_UPLOAD_BYTES) -> StoredFile:
+    """Stream an upload to disk in chunks and store it under its sha256, keeping one copy per content."""
+    fd, tmp_path = await run_in_threadpool(_open_temp, upload_dir)
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := await file.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"Upload exceeds {max_bytes} bytes",
+                    )
+                await run_in_threadpool(_write_chunk, out, hasher, chunk)
+        digest = hasher.hexdigest()
+        extension = os.path.splitext(file.filename or "")[1].lower()
+        path = os.path.join(upload_dir, f"{digest}{extension}")
+        await run_in_threadpool(_store, tmp_path, path)
+    except BaseException:
+        # Should this be cancelled as well, the collector's sweep removes the temp file later
+        await run_in_threadpool(_unlink, tmp_path)
+        raise
+    return StoredFile(path=path, sha256=digest, size=size)
+
+
+async def remove_file(path: str) -> None:
+    await run_in_threadpool(_unlink, path)
+
+
+async def audio_response(upload_dir: str, filename: str, if_none_match: Optional[str] = None) -> Response:
+    """Serve a stored file with ETag/304, Range/206 and sendfile (pathsend) when the server offers it."""
+    if os.path.basename(filename) != filename or filename.startswith("."):
+        raise HTTPException(status_code=404, detail="File not found")
+    path = os.path.join(upload_dir, filename)
+    try:
+        stat_result = await run_in_threadpool(os.stat, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise HTTPException(status_code=404, detail="File not found")
+
+    content_addressed = _CONTENT_ADDRESSED_RE.match(filename)
+    if content_addressed:
+        etag = f'"{content_addressed.group(1)}"'
+        cache_control = IMMUTABLE_CACHE_CONTROL
+    else:
+        etag = f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+        cache_control = REVALIDATE_CACHE_CONTROL
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    # FileResponse handles Range/If-Range itself and keeps our ETag.
+    return FileResponse(path, headers=headers, stat_result=stat_result)
@@ -0,0 +1,70 @@
+"""Shared fixtures: each test runs the app against a fresh SQLite database in its own temp dir.
+
+The app is driven in-process through httpx's ASGI transport. The lifespan is not run; the
+fixtures set up what the tests need (engines, migrations, the upload dir) and reset the
+module-level caches, so no state leaks from one test into the next.
+"""
+import os
+import sys
+
+# Before the app modules are imported: their config is read at import time.
+os.environ.setdefault("JOB_WORKERS", "0")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+import auth  # noqa: E402
+import database  # noqa: E402
+import main  # noqa: E402
+from response_cache import ResponseCache  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def app_db(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    database.init_db(f"sqlite:///{tmp_path}/app.db")
+    os.makedirs(main.UPLOAD_DIR)
+    # Table versions restart at 0 in every database, so cached bodies must not outlive one
+    monkeypatch.setattr(main, "response_cache", ResponseCache())
+    monkeypatch.setattr(auth, "revocations", auth.RevocationList())
+    auth.token_cache.clear()
+    auth.user_cache.clear()
+    yield
+    await database.dispose_engines()
+
+
+@pytest.fixture
+async def client(app_db):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        yield c
+
+
+class StatementCounter:
+    """Counts the SQL statements the request handlers send."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+    def close(self):
+        event.remove(self.engine, "before_cursor_execute", self._count)
+
+
+@pytest.fixture
+def statements(app_db):
+    counter = StatementCounter(database.get_async_engine().sync_engine)
+    yield counter
+    counter.close()
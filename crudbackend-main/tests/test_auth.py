@@ -0,0 +1,103 @@
+import re
+from datetime import timedelta
+
+import pytest
+from jose import jwt
+
+import auth
+from database import AsyncSessionLocal
+from models import utcnow
+
+pytestmark = pytest.mark.anyio
+
+
+async def login(client, username="ada", password="s3cret!"):
+    response = await client.post("/signup", data={"username": username, "email": f"{username}@example.com", "password": password})
+    assert response.status_code == 200, response.text
+    response = await client.post("/token", data={"username": username, "password": password})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def bearer(tokens: dict) -> dict:
+    return {"Authorization": f"Bearer {tokens['access_token']}"}
+
+
+async def test_login_rejects_wrong_password_and_unknown_user(client):
+    await login(client)
+    assert (await client.post("/token", data={"username": "ada", "password": "nope"})).status_code == 401
+    assert (await client.post("/token", data={"username": "bob", "password": "s3cret!"})).status_code == 401
+
+
+async def test_unknown_user_costs_a_password_verification(client, monkeypatch):
+    await login(client)
+    verified = []
+    verify = auth.password_service.password_hash.verify
+    monkeypatch.setattr(auth.password_service.password_hash, "verify", lambda *args: verified.append(args) or verify(*args))
+
+    assert (await client.post("/token", data={"username": "nobody", "password": "guess"})).status_code == 401
+    assert len(verified) == 1 and verified[0][0] == "guess"
+
+
+async def test_token_without_expiry_is_rejected(client):
+    await login(client)
+    token = jwt.encode({"sub": "ada", "jti": "j", "sid": "s"}, auth.SECRET_KEY, algorithm=auth.ALGORITHM)
+    assert (await client.get("/users/me/", headers={"Authorization": f"Bearer {token}"})).status_code == 401
+
+
+async def test_auth_cache_counters_are_exported(client):
+    async def hits() -> float:
+        body = (await client.get("/metrics")).text
+        return float(re.search(r'^cache_hits_total\{cache="auth_tokens"\} (\S+)$', body, re.M).group(1))
+
+    tokens = await login(client)
+    before = await hits()
+    for _ in range(2):
+        assert (await client.get("/users/me/", headers=bearer(tokens))).status_code == 200
+    assert await hits() == before + 1  # the first request decodes the token, the second finds it cached
+
+
+async def test_refresh_rotates_tokens(client):
+    tokens = await login(client)
+    assert (await client.get("/users/me/", headers=bearer(tokens))).json()["username"] == "ada"
+
+    response = await client.post("/token/refresh", data={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200, response.text
+    rotated = response.json()
+    assert rotated["refresh_token"] != tokens["refresh_token"]
+    assert (await client.get("/users/me/", headers=bearer(rotated))).status_code == 200
+
+
+async def test_refresh_token_reuse_revokes_the_session(client):
+    tokens = await login(client)
+    rotated = (await client.post("/token/refresh", data={"refresh_token": tokens["refresh_token"]})).json()
+
+    assert (await client.post("/token/refresh", data={"refresh_token": tokens["refresh_token"]})).status_code == 401
+    # The thief's replay ended the session for everyone holding its tokens
+    assert (await client.post("/token/refresh", data={"refresh_token": rotated["refresh_token"]})).status_code == 401
+    assert (await client.get("/users/me/", headers=bearer(rotated))).status_code == 401
+
+
+async def test_revoke_logs_out_the_session_only(client):
+    tokens = await login(client)
+    other = (await client.post("/token", data={"username": "ada", "password": "s3cret!"})).json()
+
+    assert (await client.post("/token/revoke", data={"refresh_token": tokens["refresh_token"]})).status_code == 204
+    assert (await client.get("/users/me/", headers=bearer(tokens))).status_code == 401
+    assert (await client.post("/token/refresh", data={"refresh_token": tokens["refresh_token"]})).status_code == 401
+    assert (await client.get("/users/me/", headers=bearer(other))).status_code == 200
+
+
+async def test_revocations_reach_other_processes_after_a_purge(app_db):
+    # Two revocation lists stand in for two worker processes sharing the database
+    here, there = auth.revocations, auth.RevocationList()
+    async with AsyncSessionLocal() as db:
+        await here.revoke(db, ["old-1", "old-2", "old-3"], utcnow() - timedelta(minutes=1))
+        await db.commit()
+    await there.sync()
+    await auth.purge_expired_tokens()
+
+    async with AsyncSessionLocal() as db:
+        await auth.revoke_session(db, "stolen-session")
+    await there.sync()
+    assert there.is_revoked("stolen-session")
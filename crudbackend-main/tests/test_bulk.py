@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def create_artist(client, name="Zed") -> int:
+    response = await client.post("/api/artists/create", data={"Artist_name": name, "Country": "ET"})
+    assert response.status_code == 200, response.text
+    return response.json()["Artist_id"]
+
+
+async def bulk(client, path: str, items: list) -> dict:
+    response = await client.post(path, json=items)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+async def test_bulk_applies_every_op(client):
+    result = await bulk(client, "/api/songs/bulk", [
+        {"Songs_name": "a", "Gener": "Rock"},
+        {"Songs_name": "b", "Gener": "Jazz"},
+        {"op": "upsert", "Songs_id": 10, "Songs_name": "c", "Gener": "Pop"},
+    ])
+    assert result["summary"] == {"created": 2, "upserted": 1}
+    first = result["results"][0]["Songs_id"]
+
+    result = await bulk(client, "/api/songs/bulk", [
+        {"op": "update", "Songs_id": first, "Songs_name": "a2", "Gener": "Rock"},
+        {"op": "delete", "Songs_id": 10},
+        {"op": "delete", "Songs_id": 999},
+    ])
+    assert result["summary"] == {"updated": 1, "deleted": 1, "error": 1}
+    assert result["results"][2]["code"] == 404
+    names = [s["Songs_name"] for s in (await client.get("/api/songs/all")).json()]
+    assert names == ["a2", "b"]
+
+
+async def test_bulk_accepts_ndjson(client):
+    body = "".join(json.dumps({"Songs_name": f"s{i}", "Gener": "Rock"}) + "\n" for i in range(3)) + "{not json\n"
+    response = await client.post("/api/songs/bulk", content=body, headers={"content-type": "application/x-ndjson"})
+    result = response.json()
+    assert result["summary"] == {"created": 3, "error": 1}
+    assert result["results"][3]["code"] == 400
+
+
+async def test_bulk_update_keeps_references_it_does_not_name(client):
+    artist_id = await create_artist(client)
+    album = (await bulk(client, "/api/albums/bulk", [{"Album_title": "Blue", "Total_tracks": 3, "artist_id": artist_id}]))["results"][0]
+
+    result = await bulk(client, "/api/albums/bulk", [{"op": "update", "Album_id": album["Album_id"], "Album_title": "Green", "Total_tracks": 4}])
+    assert result["summary"] == {"updated": 1}
+    stored = (await client.get(f"/api/albums/{album['Album_id']}")).json()
+    assert stored["Album_title"] == "Green" and stored["artist_id"] == artist_id
+
+
+async def test_bulk_rejects_missing_references_per_item(client):
+    artist_id = await create_artist(client)
+    result = await bulk(client, "/api/songs/bulk", [
+        {"Songs_name": "ok", "Gener": "Rock", "artist_id": artist_id},
+        {"Songs_name": "bad", "Gener": "Rock", "artist_id": 999},
+        {"Songs_name": "worse", "Gener": "Rock", "album_id": 998, "artist_id": 999},
+    ])
+    assert result["summary"] == {"created": 1, "error": 2}
+    assert result["results"][1] == {"index": 1, "status": "error", "code": 422, "Songs_id": None, "detail": "Artist 999 not found"}
+    assert result["results"][2]["detail"] == "Album 998 not found; Artist 999 not found"
+    assert [s["Songs_name"] for s in (await client.get("/api/songs/all")).json()] == ["ok"]
+
+
+async def test_bulk_rejects_references_to_deleted_rows(client):
+    artist_id = await create_artist(client)
+    song = (await bulk(client, "/api/songs/bulk", [{"Songs_name": "a", "Gener": "Rock"}]))["results"][0]
+    assert (await client.delete(f"/api/artists/{artist_id}")).status_code == 200
+
+    result = await bulk(client, "/api/songs/bulk", [
+        {"Songs_name": "b", "Gener": "Rock", "artist_id": artist_id},
+        {"op": "upsert", "Songs_id": 50, "Songs_name": "c", "Gener": "Rock", "artist_id": artist_id},
+        {"op": "update", "Songs_id": song["Songs_id"], "Songs_name": "a", "Gener": "Rock", "artist_id": artist_id},
+    ])
+    assert result["summary"] == {"error": 3}
+    assert {(r["code"], r["detail"]) for r in result["results"]} == {(422, f"Artist {artist_id} not found")}
@@ -0,0 +1,56 @@
+import pytest
+
+from changefeed import FEED_TABLES, ChangeFeed
+
+pytestmark = pytest.mark.anyio
+
+ALL = frozenset(FEED_TABLES)
+
+
+async def create_artists(client, count: int) -> None:
+    for i in range(count):
+        response = await client.post("/api/artists/create", data={"Artist_name": f"Artist {i}", "Country": "UK"})
+        assert response.status_code == 200, response.text
+
+
+async def received(feed: ChangeFeed, subscriber) -> list:
+    """Ids of everything delivered once the feed has read the log."""
+    feed.notify()
+    ids = []
+    while (item := await subscriber.next(0.3)) is not ...:
+        ids.append(item["id"])
+    return ids
+
+
+@pytest.fixture
+async def feed(app_db):
+    feed = ChangeFeed(poll_interval=0.05)
+    # A subscriber that came and went, so the feed has a position in the log
+    feed.unsubscribe(await feed.subscribe(ALL))
+    yield feed
+    await feed.stop()
+
+
+async def test_fresh_subscriber_after_idle_writes_gets_only_new_events(client, feed):
+    await create_artists(client, 6)
+    subscriber = await feed.subscribe(ALL)
+    assert await received(feed, subscriber) == []
+    await create_artists(client, 1)
+    assert await received(feed, subscriber) == [7]
+
+
+async def test_resumed_subscriber_after_idle_writes_gets_each_event_once(client, feed):
+    await create_artists(client, 6)
+    subscriber = await feed.subscribe(ALL, last_event_id=5)
+    assert await received(feed, subscriber) == [6]
+    await create_artists(client, 1)
+    assert await received(feed, subscriber) == [7]
+
+
+async def test_subscriber_resuming_ahead_of_the_feed_gets_no_duplicates(client, feed):
+    fresh = await feed.subscribe(ALL)
+    await create_artists(client, 3)
+    # e.g. reconnected from a worker that had already read further
+    ahead = await feed.subscribe(ALL, last_event_id=2)
+    assert await received(feed, fresh) == [1, 2, 3]
+    assert await received(feed, ahead) == [3]
@@ -0,0 +1,61 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+LONG_AGO = "Sat, 01 Jan 2000 00:00:00 GMT"
+
+
+async def create_song(client, name: str) -> dict:
+    response = await client.post("/api/songs/create", data={"Songs_name": name, "Gener": "Rock"})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+async def test_list_answers_304_until_a_write(client):
+    await create_song(client, "one")
+    first = await client.get("/api/songs/all")
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and first.headers["Last-Modified"]
+
+    response = await client.get("/api/songs/all", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag and response.content == b""
+    # Weak and listed validators match too
+    assert (await client.get("/api/songs/all", headers={"If-None-Match": f'"other", W/{etag}'})).status_code == 304
+
+    await create_song(client, "two")
+    response = await client.get("/api/songs/all", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert [s["Songs_name"] for s in response.json()] == ["one", "two"]
+
+
+async def test_detail_etag_follows_the_row(client):
+    song = await create_song(client, "one")
+    path = f"/api/songs/{song['Songs_id']}"
+    etag = (await client.get(path)).headers["ETag"]
+    assert (await client.get(path, headers={"If-None-Match": etag})).status_code == 304
+
+    # A write to another row leaves this one's validator alone
+    await create_song(client, "two")
+    assert (await client.get(path, headers={"If-None-Match": etag})).status_code == 304
+
+    response = await client.put(path, data={"Songs_name": "renamed", "Gener": "Rock"})
+    assert response.status_code == 200, response.text
+    response = await client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag and response.json()["Songs_name"] == "renamed"
+
+
+@pytest.mark.parametrize("path", ["/api/songs/all", "/api/songs/1"])
+async def test_if_modified_since(client, path):
+    await create_song(client, "one")
+    last_modified = (await client.get(path)).headers["Last-Modified"]
+
+    response = await client.get(path, headers={"If-Modified-Since": last_modified})
+    assert response.status_code == 304 and response.headers["Last-Modified"] == last_modified
+    assert (await client.get(path, headers={"If-Modified-Since": LONG_AGO})).status_code == 200
+    assert (await client.get(path, headers={"If-Modified-Since": "not a date"})).status_code == 200
+    # If-None-Match wins when both are sent
+    response = await client.get(path, headers={"If-Modified-Since": last_modified, "If-None-Match": '"stale"'})
+    assert response.status_code == 200
@@ -0,0 +1,103 @@
+import os
+import time
+
+import pytest
+from sqlalchemy import select
+
+import database
+from garbage import GarbageCollector, collect_audio, remove_released
+from models import AudioBlob
+
+pytestmark = pytest.mark.anyio
+
+AUDIO = b"AAAA" * 1000
+
+
+async def create_song(client, name: str, audio: bytes = AUDIO) -> dict:
+    response = await client.post("/api/songs/create", data={"Songs_name": name, "Gener": "Rock"}, files={"audio": ("x.mp3", audio, "audio/mpeg")})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+async def delete_song(client, song: dict) -> None:
+    assert (await client.delete(f"/api/songs/{song['Songs_id']}")).status_code == 200
+
+
+async def test_shared_audio_lives_until_its_last_song_is_purged(client):
+    collector = GarbageCollector(unlink_delay=0)
+    one, two = await create_song(client, "one"), await create_song(client, "two")
+    path = one["audio_url"].lstrip("/")
+    assert two["audio_url"] == one["audio_url"]
+
+    await delete_song(client, one)
+    assert await collector.collect() == {"rows": 1, "blobs": 0, "files": 0}
+    assert (await client.get(f"/api/songs/{two['Songs_id']}")).status_code == 200
+    assert os.path.exists(path)
+
+    await delete_song(client, two)
+    assert await collector.collect() == {"rows": 1, "blobs": 1, "files": 1}
+    assert not os.path.exists(path)
+
+
+async def test_files_wait_for_the_unlink_delay(client):
+    collector = GarbageCollector(unlink_delay=3600)
+    song = await create_song(client, "one")
+    await delete_song(client, song)
+    assert await collector.collect() == {"rows": 1, "blobs": 1, "files": 0}
+    assert os.path.exists(song["audio_url"].lstrip("/"))
+
+    collector.unlink_delay = 0
+    assert (await collector.collect())["files"] == 1
+    assert not os.path.exists(song["audio_url"].lstrip("/"))
+
+
+async def test_content_uploaded_again_keeps_its_file(client):
+    song = await create_song(client, "one")
+    path = song["audio_url"].lstrip("/")
+    await delete_song(client, song)
+    await GarbageCollector(unlink_delay=3600).collect()
+
+    async with database.AsyncSessionLocal() as db:
+        assert await collect_audio(db) == []
+        # The blob row is gone; the same content arrives before the file is unlinked
+        again = await create_song(client, "again")
+        assert (await db.execute(select(AudioBlob.path))).scalars().all() == [path]
+        released = [(path, path + ".preview", time.time() - 60)]
+        assert await remove_released(db, released) == 0
+    assert os.path.exists(path)
+    assert (await client.get(again["audio_url"].replace("/static/", "/api/audio/"))).status_code == 200
+
+
+async def test_upload_in_flight_keeps_its_file(client):
+    song = await create_song(client, "one")
+    path = song["audio_url"].lstrip("/")
+    await delete_song(client, song)
+    collector = GarbageCollector(unlink_delay=3600)
+    await collector.collect()
+    released = list(collector._released)
+    assert [p for p, _, _ in released] == [path]
+
+    # An upload of the same content touched the file but has not committed its blob yet
+    os.utime(path, (time.time() + 1, time.time() + 1))
+    async with database.AsyncSessionLocal() as db:
+        assert await remove_released(db, released) == 0
+    assert os.path.exists(path)
+
+
+async def test_sweep_removes_old_untracked_files_only(client):
+    song = await create_song(client, "one")
+    tracked = song["audio_url"].lstrip("/")
+    os.makedirs("static/.tmp", exist_ok=True)
+    stray, tmp, young = "static/stray.mp3", "static/.tmp/tmpabc", "static/young.mp3"
+    for path in (stray, tmp, young):
+        with open(path, "wb") as f:
+            f.write(b"x")
+    an_hour_ago = time.time() - 3600
+    for path in (stray, tmp, tracked):
+        os.utime(path, (an_hour_ago, an_hour_ago))
+
+    collector = GarbageCollector()
+    collector.upload_dir = "static"
+    assert (await collector.collect(sweep=True))["files"] == 2
+    assert not os.path.exists(stray) and not os.path.exists(tmp)
+    assert os.path.exists(young) and os.path.exists(tracked)
@@ -0,0 +1,84 @@
+import asyncio
+import os
+import time
+
+import pytest
+from sqlalchemy import select
+
+import jobs
+from database import AsyncSessionLocal
+from models import Job
+
+pytestmark = pytest.mark.anyio
+
+
+# Job work runs in spawned worker processes, which import it from this module
+def hang(pid_file: str, seconds: float) -> dict:
+    with open(pid_file, "w") as f:
+        f.write(str(os.getpid()))
+    time.sleep(seconds)
+    return {}
+
+
+def report_pid() -> dict:
+    return {"pid": os.getpid()}
+
+
+async def ignore(db, payload, result) -> None:
+    pass
+
+
+async def enqueue(kind: str, payload: dict) -> int:
+    async with AsyncSessionLocal() as db:
+        job = jobs.enqueue(db, kind, payload)
+        await db.commit()
+        return job.id
+
+
+async def wait_for_status(job_id: int, *statuses: str) -> Job:
+    for _ in range(300):
+        async with AsyncSessionLocal() as db:
+            job = (await db.execute(select(Job).where(Job.id == job_id))).scalar_one()
+        if job.status in statuses:
+            return job
+        await asyncio.sleep(0.1)
+    raise AssertionError(f"job {job_id} is still {job.status}")
+
+
+def is_gone(pid: int) -> bool:
+    # Killed children linger as zombies until the pool reaps them
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] == "Z"
+    except FileNotFoundError:
+        return True
+
+
+async def test_a_timed_out_job_does_not_keep_its_worker(app_db, monkeypatch, tmp_path):
+    monkeypatch.setattr(jobs, "JOB_TIMEOUT_SECONDS", 5)
+    monkeypatch.setattr(jobs, "JOB_MAX_ATTEMPTS", 1)
+    monkeypatch.setitem(jobs.handlers, "hang", jobs.Handler(hang, ignore))
+    monkeypatch.setitem(jobs.handlers, "pid", jobs.Handler(report_pid, ignore))
+    runner = jobs.JobRunner(workers=1, poll_interval=0.05)
+    await runner.start()
+    try:
+        pid_file = str(tmp_path / "hang.pid")
+        job_id = await enqueue("hang", {"pid_file": pid_file, "seconds": 60})
+        while not os.path.exists(pid_file):
+            await asyncio.sleep(0.05)
+        with open(pid_file) as f:
+            worker = int(f.read())
+
+        job = await wait_for_status(job_id, "failed")
+        assert job.error.startswith("TimeoutError")
+        for _ in range(50):
+            if is_gone(worker):
+                break
+            await asyncio.sleep(0.1)
+        assert is_gone(worker)
+
+        # The next job runs on a fresh pool instead of waiting behind the stuck one
+        job = await wait_for_status(await enqueue("pid", {}), "done", "failed")
+        assert job.status == "done", job.error
+    finally:
+        await runner.stop()
@@ -0,0 +1,85 @@
+import pytest
+
+import database
+from models import Album, Song
+
+pytestmark = pytest.mark.anyio
+
+GENRES = ["Rock", "Jazz", "Pop"]
+
+
+def seed(count: int) -> None:
+    """`count` songs over three genres and three albums, every third one without an album."""
+    with database.SessionLocal() as db:
+        db.add_all(Album(Album_title=f"Album {i}", Total_tracks=1) for i in range(3))
+        db.flush()
+        db.add_all(
+            Song(Songs_name=f"Song {i % 7}", Gener=GENRES[i % 3], album_id=None if i % 3 == 0 else i % 4 or 3)
+            for i in range(count)
+        )
+        db.commit()
+
+
+async def walk(client, params: dict, limit: int) -> list:
+    """Every row of a listing, fetched page by page through X-Next-Cursor."""
+    rows, after = [], None
+    while True:
+        response = await client.get("/api/songs/all", params={**params, "limit": limit, **({"after": after} if after else {})})
+        assert response.status_code == 200, response.text
+        rows += response.json()
+        after = response.headers.get("X-Next-Cursor")
+        if after is None:
+            return rows
+
+
+@pytest.mark.parametrize("sort", [None, "Songs_name", "-Gener", "-album_id,Songs_name", "album_id,-Songs_name"])
+async def test_pages_cover_the_listing_exactly_once(client, sort):
+    seed(40)
+    params = {"sort": sort} if sort else {}
+    everything = (await client.get("/api/songs/all", params=params)).json()
+    assert len(everything) == 40
+    for limit in (1, 7, 40):
+        assert await walk(client, params, limit) == everything
+
+
+async def test_sort_orders_by_every_key_then_the_primary_key(client):
+    seed(12)
+    songs = (await client.get("/api/songs/all", params={"sort": "-Gener,Songs_name"})).json()
+    keys = [(s["Gener"], s["Songs_name"], s["Songs_id"]) for s in songs]
+    assert keys == sorted(keys, key=lambda k: (tuple(-ord(c) for c in k[0]), k[1], k[2]))
+
+
+async def test_filters_and_fields(client):
+    seed(12)
+    songs = await walk(client, {"Gener": "Jazz", "album_id[null]": "false", "fields": "Songs_id,Gener"}, 2)
+    assert songs and all(s.keys() == {"Songs_id", "Gener"} and s["Gener"] == "Jazz" for s in songs)
+    songs = (await client.get("/api/songs/all", params={"album_id[in]": "1,2"})).json()
+    assert {s["album_id"] for s in songs} == {1, 2}
+
+
+async def test_deleted_rows_are_not_listed(client):
+    seed(6)
+    assert (await client.delete("/api/songs/2")).status_code == 200
+    assert [s["Songs_id"] for s in await walk(client, {}, 2)] == [1, 3, 4, 5, 6]
+
+
+@pytest.mark.parametrize("params", [
+    {"after": "abc"},
+    {"sort": "Songs_name", "after": "abc"},
+    {"sort": "Songs_name", "after": "eyJzIjoiR2VuZXIiLCJ2IjpbMSwyXX0"},
+    {"Songs_id[gt]": "x"},
+    {"nope": "1"},
+    {"sort": "nope"},
+])
+async def test_invalid_parameters_are_422(client, params):
+    seed(3)
+    assert (await client.get("/api/songs/all", params=params)).status_code == 422
+
+
+async def test_cursor_of_another_sort_is_rejected(client):
+    seed(6)
+    response = await client.get("/api/songs/all", params={"sort": "Songs_name", "limit": 2})
+    cursor = response.headers["X-Next-Cursor"]
+    response = await client.get("/api/songs/all", params={"sort": "-Songs_name", "limit": 2, "after": cursor})
+    assert response.status_code == 422
+    assert response.json()["detail"] == "Cursor belongs to a different sort"
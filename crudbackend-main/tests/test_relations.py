@@ -0,0 +1,61 @@
+import pytest
+
+import database
+from models import Album, Artist, Song
+
+pytestmark = pytest.mark.anyio
+
+
+def seed(size: int) -> None:
+    """`size` artists, each with `size` albums of `size` songs."""
+    with database.SessionLocal() as db:
+        for a in range(size):
+            artist = Artist(Artist_name=f"Artist {a}", Country="UK")
+            db.add(artist)
+            db.flush()
+            for b in range(size):
+                album = Album(Album_title=f"Album {a}.{b}", Total_tracks=size, artist_id=artist.Artist_id)
+                db.add(album)
+                db.flush()
+                db.add_all(
+                    Song(Songs_name=f"Song {a}.{b}.{s}", Gener="Rock", album_id=album.Album_id, artist_id=artist.Artist_id)
+                    for s in range(size)
+                )
+        db.commit()
+
+
+async def count(client, statements, path: str) -> int:
+    before = statements.count
+    response = await client.get(path)
+    assert response.status_code == 200, response.text
+    return statements.count - before
+
+
+@pytest.mark.parametrize("size", [2, 6])
+async def test_nested_views_run_a_constant_number_of_statements(client, statements, size):
+    seed(size)
+    artist = (await client.get("/api/artists/all")).json()[-1]
+    album = (await client.get("/api/albums/all")).json()[-1]
+
+    # versions + album + artist (joined) + songs
+    assert await count(client, statements, f"/api/albums/{album['Album_id']}/tracks") == 3
+    # versions + artist + albums + their songs + the artist's songs
+    assert await count(client, statements, f"/api/artists/{artist['Artist_id']}/catalog") == 5
+    assert await count(client, statements, f"/api/catalog?limit={size}") == 5
+
+
+async def test_nested_views_embed_related_rows(client):
+    seed(2)
+    artist = (await client.get("/api/artists/all")).json()[0]
+    catalog = (await client.get(f"/api/artists/{artist['Artist_id']}/catalog")).json()
+    assert [len(album["songs"]) for album in catalog["albums"]] == [2, 2]
+    assert len(catalog["songs"]) == 4
+
+    tracks = (await client.get(f"/api/albums/{catalog['albums'][0]['Album_id']}/tracks")).json()
+    assert tracks["artist"]["Artist_id"] == artist["Artist_id"]
+    assert [s["Songs_name"] for s in tracks["songs"]] == ["Song 0.0.0", "Song 0.0.1"]
+
+
+async def test_nested_views_404_for_missing_rows(client):
+    assert (await client.get("/api/albums/999/tracks")).status_code == 404
+    assert (await client.get("/api/artists/999/catalog")).status_code == 404
@@ -0,0 +1,41 @@
+import pytest
+
+import database
+import search
+from models import Song
+
+pytestmark = pytest.mark.anyio
+
+NAMES = ["100% Pure", "1000 Pure", "snake_case", "snakeXcase", "back\\slash", "backslash"]
+
+
+def seed() -> None:
+    with database.SessionLocal() as db:
+        db.add_all(Song(Songs_name=name, Gener="Rock") for name in NAMES)
+        db.commit()
+
+
+async def found(client, query: str) -> list:
+    response = await client.get("/api/songs/search", params={"query": query})
+    assert response.status_code == 200, response.text
+    return sorted(song["Songs_name"] for song in response.json())
+
+
+@pytest.mark.parametrize("fts", [True, False])
+async def test_search_finds_words(client, monkeypatch, fts):
+    if not fts:
+        monkeypatch.setattr(search, "fts_enabled", False)
+    assert search.fts_enabled == fts
+    seed()
+    assert await found(client, "Pure") == ["100% Pure", "1000 Pure"]
+
+
+async def test_like_fallback_matches_wildcards_literally(client, monkeypatch):
+    monkeypatch.setattr(search, "fts_enabled", False)
+    seed()
+    assert await found(client, "%") == ["100% Pure"]
+    assert await found(client, "0%") == ["100% Pure"]
+    assert await found(client, "_") == ["snake_case"]
+    assert await found(client, "e_c") == ["snake_case"]
+    assert await found(client, "\\") == ["back\\slash"]
+    assert await found(client, "k\\s") == ["back\\slash"]
@@ -0,0 +1,63 @@
+import hashlib
+import io
+import os
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import select
+
+import database
+import main
+from models import AudioBlob
+from storage import save_upload
+
+pytestmark = pytest.mark.anyio
+
+AUDIO = bytes(range(256)) * 40
+
+
+async def upload(client, name: str, filename: str = "x.mp3", audio: bytes = AUDIO) -> dict:
+    response = await client.post("/api/songs/create", data={"Songs_name": name, "Gener": "Rock"}, files={"audio": (filename, audio, "audio/mpeg")})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+async def test_identical_uploads_share_one_file(client):
+    one = await upload(client, "one", "a.mp3")
+    two = await upload(client, "two", "B.MP3")
+    digest = hashlib.sha256(AUDIO).hexdigest()
+    assert one["audio_url"] == two["audio_url"] == f"/static/{digest}.mp3"
+
+    async with database.AsyncSessionLocal() as db:
+        blobs = (await db.execute(select(AudioBlob))).scalars().all()
+    assert [(b.sha256, b.size, b.ref_count) for b in blobs] == [(digest, len(AUDIO), 2)]
+    assert sorted(os.listdir(main.UPLOAD_DIR)) == [".tmp", f"{digest}.mp3"]
+    assert os.listdir(os.path.join(main.UPLOAD_DIR, ".tmp")) == []
+
+
+async def test_oversized_upload_leaves_nothing_behind(app_db):
+    file = UploadFile(io.BytesIO(AUDIO), filename="x.mp3")
+    with pytest.raises(HTTPException) as error:
+        await save_upload(file, main.UPLOAD_DIR, max_bytes=100)
+    assert error.value.status_code == 413
+    assert os.listdir(main.UPLOAD_DIR) == [".tmp"]
+    assert os.listdir(os.path.join(main.UPLOAD_DIR, ".tmp")) == []
+
+
+async def test_range_requests(client):
+    url = (await upload(client, "one"))["audio_url"]
+
+    response = await client.get(url, headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == f"bytes 100-199/{len(AUDIO)}"
+    assert response.content == AUDIO[100:200]
+
+    response = await client.get(url, headers={"Range": "bytes=-10"})
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == f"bytes {len(AUDIO) - 10}-{len(AUDIO) - 1}/{len(AUDIO)}"
+    assert response.content == AUDIO[-10:]
+
+    response = await client.get(url)
+    assert response.status_code == 200 and response.headers["Accept-Ranges"] == "bytes"
+    assert response.content == AUDIO
+    assert (await client.get(url, headers={"If-None-Match": response.headers["ETag"]})).status_code == 304
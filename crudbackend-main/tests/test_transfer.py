@@ -0,0 +1,79 @@
+import pytest
+from sqlalchemy import insert, select
+
+import database
+import transfer
+from models import AudioBlob
+
+pytestmark = pytest.mark.anyio
+
+AUDIO = b"AAAA" * 1000
+FORMATS = ["csv", "ndjson"] + (["parquet"] if transfer.pyarrow is not None else [])
+
+
+async def seed(client) -> str:
+    """An artist, an album and three songs, two of them sharing one stored file; returns its path."""
+    artist = (await client.post("/api/artists/create", data={"Artist_name": "Zed, \"the\" band", "Country": "ET"})).json()
+    album = (await client.post("/api/albums/create", data={"Album_title": "Blue", "Total_tracks": 3, "artist_id": artist["Artist_id"]})).json()
+    songs = []
+    for name, audio in (("one", AUDIO), ("two", AUDIO), ("three\nlines", None)):
+        files = {"audio": ("x.mp3", audio, "audio/mpeg")} if audio else None
+        data = {"Songs_name": name, "Gener": "Rock", "album_id": album["Album_id"], "artist_id": artist["Artist_id"]}
+        response = await client.post("/api/songs/create", data=data, files=files)
+        assert response.status_code == 200, response.text
+        songs.append(response.json())
+    return songs[0]["audio_url"].lstrip("/")
+
+
+async def export(client, table: str, fmt: str) -> bytes:
+    response = await client.get(f"/api/export/{table}", params={"format": fmt})
+    assert response.status_code == 200, response.text
+    return response.content
+
+
+async def ref_count(path: str) -> int:
+    async with database.AsyncSessionLocal() as db:
+        return (await db.execute(select(AudioBlob.ref_count).where(AudioBlob.path == path))).scalar_one()
+
+
+@pytest.mark.parametrize("fmt", FORMATS)
+async def test_export_then_import_into_an_empty_database(client, tmp_path, fmt):
+    path = await seed(client)
+    assert await ref_count(path) == 2
+    exported = {table: await export(client, table, fmt) for table in transfer.TABLES}
+
+    await database.dispose_engines()
+    database.init_db(f"sqlite:///{tmp_path}/restored.db")
+    # The stored files come along with the database, their counts do not
+    with database.get_engine().begin() as conn:
+        conn.execute(insert(AudioBlob).values(path=path, sha256="0" * 64, size=len(AUDIO), ref_count=0))
+
+    for table, body in exported.items():  # in restore order
+        response = await client.post(f"/api/import/{table}", files={"file": (f"{table}.{fmt}", body)})
+        assert response.status_code == 200, response.text
+        assert response.json()["rows"] == {"artists": 1, "albums": 1, "songs": 3}[table]
+
+    assert {table: await export(client, table, fmt) for table in transfer.TABLES} == exported
+    assert await ref_count(path) == 2
+
+
+async def test_reimporting_recounts_audio_references(client):
+    path = await seed(client)
+    body = await export(client, "songs", "ndjson")
+    async with database.AsyncSessionLocal() as db:
+        await db.execute(AudioBlob.__table__.update().values(ref_count=7))
+        await db.commit()
+
+    response = await client.post("/api/import/songs", params={"on_conflict": "update"}, files={"file": ("songs.ndjson", body)})
+    assert response.status_code == 200, response.text
+    assert await ref_count(path) == 2
+
+
+async def test_import_reports_the_failing_rows(client):
+    await seed(client)
+    body = await export(client, "songs", "csv")
+    response = await client.post("/api/import/songs", files={"file": ("songs.csv", body)})
+    assert response.status_code == 422
+    assert response.json()["detail"].startswith("Rows 1-3 not imported")
+    response = await client.post("/api/import/songs", params={"on_conflict": "skip"}, files={"file": ("songs.csv", body)})
+    assert response.status_code == 200 and response.json()["rows"] == 3
@@ -0,0 +1,397 @@
+"""Export and import whole catalog tables as CSV, NDJSON or Parquet.
+
+    python transfer.py export songs songs.parquet
+    python transfer.py import songs songs.parquet --on-conflict update
+
+The API serves the same through GET /api/export/{table} and POST /api/import/{table}.
+
+Exports read the table in primary-key order in batches of EXPORT_BATCH_SIZE rows and encode each
+batch on its own (a Parquet row group per batch), so memory stays flat whatever the table size.
+Imports insert IMPORT_BATCH_SIZE rows per transaction with one executemany each. Primary and
+foreign keys are kept, so restore artists, then albums, then songs. Parquet needs pyarrow.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import IO, AsyncIterator, Iterable, Iterator, Optional
+
+from sqlalchemy import DateTime, Float, Integer, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import database
+from metrics import record_rows
+from models import Album, Artist, Song
+from serialization import dumps
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pyarrow is optional; CSV and NDJSON need only the stdlib
+    pyarrow = None
+
+# ---------- CONFIG ----------
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "50000"))  # rows per transaction
+TABLES = {"artists": Artist, "albums": Album, "songs": Song}  # in restore order
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson", "parquet": "application/vnd.apache.parquet"}
+CONFLICT_MODES = ("error", "skip", "update")
+
+
+class TransferError(ValueError):
+    """The request or file cannot be exported/imported as asked."""
+
+
+def check_table(table: str):
+    try:
+        return TABLES[table]
+    except KeyError:
+        raise TransferError(f"Unknown table {table!r}; use one of {', '.join(TABLES)}")
+
+
+def _check_format(fmt: str) -> str:
+    if fmt not in MEDIA_TYPES:
+        raise TransferError(f"Unknown format {fmt!r}; use one of {', '.join(MEDIA_TYPES)}")
+    if fmt == "parquet" and pyarrow is None:
+        raise TransferError("Parquet needs pyarrow, which is not installed")
+    return fmt
+
+
+def format_for(path: str, fmt: Optional[str] = None) -> str:
+    """An explicit format, else the one the file extension names (.jsonl counts as NDJSON)."""
+    if fmt is None:
+        ext = os.path.splitext(path)[1].lstrip(".").lower()
+        fmt = "ndjson" if ext in ("jsonl", "json") else ext
+    return _check_format(fmt)
+
+
+def _columns(model) -> list:
+    # Soft-deleted rows are not exported, so whether a row is deleted is not either
+    return [c for c in model.__table__.columns if c.name != "deleted_at"]
+
+
+# ---------- WRITERS ----------
+# Each writer turns a batch of row tuples into bytes; header() and finish() frame the stream.
+class CsvWriter:
+    def __init__(self, columns: list):
+        self.names = [c.name for c in columns]
+
+    def _render(self, rows: Iterable) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(rows)
+        return buffer.getvalue().encode()
+
+    def header(self) -> bytes:
+        return self._render([self.names])
+
+    def encode(self, rows: list) -> bytes:
+        return self._render(rows)
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class NdjsonWriter:
+    def __init__(self, columns: list):
+        self.names = tuple(c.name for c in columns)
+        self.dates = [i for i, c in enumerate(columns) if isinstance(c.type, DateTime)]
+
+    def header(self) -> bytes:
+        return b""
+
+    def encode(self, rows: list) -> bytes:
+        names, dates = self.names, self.dates
+        lines = []
+        for row in rows:
+            if dates:
+                row = list(row)
+                for i in dates:
+                    row[i] = row[i].isoformat() if row[i] is not None else None
+            lines.append(dumps(dict(zip(names, row))))
+        lines.append(b"")
+        return b"\n".join(lines)
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class _ChunkSink(io.RawIOBase):
+    """A write-only file that hands back what was written since the last drain."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _arrow_type(column):
+    if isinstance(column.type, Integer):
+        return pyarrow.int64()
+    if isinstance(column.type, Float):
+        return pyarrow.float64()
+    if isinstance(column.type, DateTime):
+        return pyarrow.timestamp("us")
+    return pyarrow.string()
+
+
+class ParquetWriter:
+    def __init__(self, columns: list):
+        self.schema = pyarrow.schema([pyarrow.field(c.name, _arrow_type(c), nullable=c.nullable) for c in columns])
+        self.sink = _ChunkSink()
+        self.writer = pyarrow.parquet.ParquetWriter(self.sink, self.schema, compression="zstd")
+
+    def header(self) -> bytes:
+        return self.sink.drain()
+
+    def encode(self, rows: list) -> bytes:
+        # One row group per batch; the footer that indexes them is written by finish()
+        arrays = [pyarrow.array(values, type=field.type) for values, field in zip(zip(*rows), self.schema)]
+        self.writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self.schema))
+        return self.sink.drain()
+
+    def finish(self) -> bytes:
+        self.writer.close()
+        return self.sink.drain()
+
+
+WRITERS = {"csv": CsvWriter, "ndjson": NdjsonWriter, "parquet": ParquetWriter}
+
+
+def _export_select(model):
+    return select(*_columns(model)).where(model.deleted_at.is_(None)).order_by(*model.__table__.primary_key.columns)
+
+
+async def iter_export(table: str, fmt: str) -> AsyncIterator[bytes]:
+    """The encoded table, batch by batch, read on a session of its own."""
+    model = check_table(table)
+    writer = WRITERS[_check_format(fmt)](_columns(model))
+    yield writer.header()
+    count = 0
+    async with database.AsyncSessionLocal() as db:
+        result = await db.stream(_export_select(model).execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in result.partitions(EXPORT_BATCH_SIZE):
+            count += len(rows)
+            yield writer.encode(rows)
+    yield writer.finish()
+    record_rows(count)
+
+
+def export_table(table: str, out: IO[bytes], fmt: str) -> int:
+    """Write a table to a binary file; returns the row count."""
+    model = check_table(table)
+    writer = WRITERS[_check_format(fmt)](_columns(model))
+    out.write(writer.header())
+    count = 0
+    with database.get_engine().connect() as conn:
+        result = conn.execution_options(yield_per=EXPORT_BATCH_SIZE).execute(_export_select(model))
+        for rows in result.partitions(EXPORT_BATCH_SIZE):
+            count += len(rows)
+            out.write(writer.encode(rows))
+    out.write(writer.finish())
+    return count
+
+
+# ---------- READERS ----------
+# Each reader yields lists of dicts keyed by column name, converted to the column's Python type.
+def _converters(model, names: list) -> list:
+    columns = model.__table__.columns
+    unknown = [n for n in names if n not in columns]
+    if unknown:
+        raise TransferError(f"Unknown columns {', '.join(unknown)}; {model.__tablename__} has {', '.join(columns.keys())}")
+    converters = []
+    for name in names:
+        column = columns[name]
+        if isinstance(column.type, DateTime):
+            converters.append(datetime.fromisoformat)
+        elif isinstance(column.type, (Integer, Float)):
+            converters.append(column.type.python_type)
+        else:
+            converters.append(None)
+    return converters
+
+
+def _batches(rows: Iterator[dict], size: int) -> Iterator[list]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _convert(converters: list, names: list, values: Iterable, line: int) -> dict:
+    row = {}
+    for name, convert, value in zip(names, converters, values):
+        if convert is not None and isinstance(value, str):
+            try:
+                value = convert(value)
+            except ValueError:
+                raise TransferError(f"Row {line}: invalid {name} {value!r}")
+        row[name] = value
+    return row
+
+
+def read_csv(model, f: IO[bytes], size: int) -> Iterator[list]:
+    reader = csv.reader(io.TextIOWrapper(f, encoding="utf-8", newline=""))
+    names = next(reader, None)
+    if not names:
+        return
+    converters = _converters(model, names)
+    # CSV has no NULL; an empty field is read as one
+    rows = (
+        _convert(converters, names, [v if v != "" else None for v in values], line)
+        for line, values in enumerate(reader, start=2)
+    )
+    yield from _batches(rows, size)
+
+
+def read_ndjson(model, f: IO[bytes], size: int) -> Iterator[list]:
+    names = converters = None
+
+    def rows():
+        nonlocal names, converters
+        for line, raw in enumerate(f, start=1):
+            if not raw.strip():
+                continue
+            try:
+                item = json.loads(raw)
+            except ValueError as e:
+                raise TransferError(f"Line {line}: invalid JSON: {e}")
+            if not isinstance(item, dict):
+                raise TransferError(f"Line {line}: expected a JSON object")
+            if names is None:
+                # executemany needs the same keys in every row: the first line sets them
+                names = list(item)
+                converters = _converters(model, names)
+            elif item.keys() - set(names):
+                raise TransferError(f"Line {line}: columns {', '.join(item.keys() - set(names))} not in the first line")
+            yield _convert(converters, names, (item.get(n) for n in names), line)
+
+    yield from _batches(rows(), size)
+
+
+def read_parquet(model, f: IO[bytes], size: int) -> Iterator[list]:
+    parquet = pyarrow.parquet.ParquetFile(f)
+    names = parquet.schema_arrow.names
+    converters = _converters(model, names)
+    line = 1
+    for batch in parquet.iter_batches(batch_size=size):
+        rows = [_convert(converters, names, row.values(), line + i) for i, row in enumerate(batch.to_pylist())]
+        line += len(rows)
+        yield rows
+
+
+READERS = {"csv": read_csv, "ndjson": read_ndjson, "parquet": read_parquet}
+
+
+def _insert(model, names: list, on_conflict: str):
+    stmt = sqlite_insert(model)
+    if on_conflict == "skip":
+        return stmt.on_conflict_do_nothing()
+    if on_conflict == "update":
+        key = [c.name for c in model.__table__.primary_key.columns]
+        return stmt.on_conflict_do_update(
+            index_elements=key,
+            # The file lists the row, so a soft-deleted one comes back
+            set_={**{n: stmt.excluded[n] for n in names if n not in key}, "deleted_at": None},
+        )
+    return stmt
+
+
+def _recount_audio_refs(conn) -> None:
+    # Imported rows may point at stored files; the reference counts must match or a later delete
+    # could remove a file that is still in use. One grouped pass over the catalog tables.
+    conn.execute(text("UPDATE AudioBlob SET ref_count = 0"))
+    conn.execute(text(
+        "UPDATE AudioBlob SET ref_count = refs.n FROM ("
+        "SELECT audio_file, count(*) AS n FROM ("
+        "SELECT audio_file FROM Album UNION ALL SELECT audio_file FROM Song UNION ALL SELECT audio_file FROM Artist"
+        ") WHERE audio_file IS NOT NULL GROUP BY audio_file"
+        ") AS refs WHERE refs.audio_file = AudioBlob.path"
+    ))
+
+
+def import_table(table: str, f: IO[bytes], fmt: str, on_conflict: str = "error", batch_size: int = IMPORT_BATCH_SIZE) -> dict:
+    """Load a file into a table, one transaction per batch; stops at the first failing batch.
+
+    Batches committed before a failure stay; with on_conflict=skip or update, rerunning the
+    same file finishes the job.
+    """
+    model = check_table(table)
+    if on_conflict not in CONFLICT_MODES:
+        raise TransferError(f"Unknown on_conflict {on_conflict!r}; use one of {', '.join(CONFLICT_MODES)}")
+    rows = 0
+    audio = False
+    start = time.perf_counter()
+    with database.get_engine().connect() as conn:
+        for batch in READERS[_check_format(fmt)](model, f, batch_size):
+            names = list(batch[0])
+            with conn.begin():
+                try:
+                    conn.execute(_insert(model, names, on_conflict), batch)
+                except Exception as e:
+                    raise TransferError(f"Rows {rows + 1}-{rows + len(batch)} not imported: {getattr(e, 'orig', e)}") from e
+                if "audio_file" in names:
+                    audio = True
+            rows += len(batch)
+        if audio:
+            with conn.begin():
+                _recount_audio_refs(conn)
+    seconds = time.perf_counter() - start
+    return {"table": table, "rows": rows, "seconds": round(seconds, 3), "rows_per_second": round(rows / seconds) if seconds else None}
+
+
+# ---------- CLI ----------
+def main_cli():
+    parser = argparse.ArgumentParser(description="Export or import catalog tables.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write a table to a file (- for stdout)")
+    export.add_argument("table", choices=list(TABLES))
+    export.add_argument("path")
+    export.add_argument("--format", choices=list(MEDIA_TYPES))
+    load = commands.add_parser("import", help="load a file into a table")
+    load.add_argument("table", choices=list(TABLES))
+    load.add_argument("path")
+    load.add_argument("--format", choices=list(MEDIA_TYPES))
+    load.add_argument("--on-conflict", choices=CONFLICT_MODES, default="error")
+    load.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    database.init_db()
+    try:
+        if args.command == "export":
+            fmt = format_for(args.path, args.format or ("ndjson" if args.path == "-" else None))
+            start = time.perf_counter()
+            if args.path == "-":
+                rows = export_table(args.table, sys.stdout.buffer, fmt)
+            else:
+                with open(args.path, "wb") as out:
+                    rows = export_table(args.table, out, fmt)
+            seconds = time.perf_counter() - start
+            print(json.dumps({"table": args.table, "rows": rows, "seconds": round(seconds, 3)}), file=sys.stderr)
+        else:
+            with open(args.path, "rb") as f:
+                result = import_table(args.table, f, format_for(args.path, args.format), args.on_conflict, args.batch_size)
+            print(json.dumps(result))
+    except TransferError as e:
+        sys.exit(str(e))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,124 @@
+import hashlib
+from email.utils import format_datetime, parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Iterable, Optional
+
+from fastapi import Request, Response, status
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from serialization import dumps
+
+VERSIONED_TABLES = ("Album", "Song", "Artist")
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+def _version_statements(table: str) -> list:
+    # Triggers bump the table's version inside the writing transaction, so single-row handlers,
+    # bulk batches and any other writer all invalidate validators the same way.
+    bump = (
+        f"UPDATE TableVersion SET version = version + 1, updated_at = CURRENT_TIMESTAMP "
+        f"WHERE name = '{table}';"
+    )
+    return [
+        f"INSERT OR IGNORE INTO TableVersion(name) VALUES ('{table}')",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_version_ai AFTER INSERT ON {table} BEGIN {bump} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_version_au AFTER UPDATE ON {table} BEGIN {bump} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_version_ad AFTER DELETE ON {table} BEGIN {bump} END",
+    ]
+
+
+def install_versioning(conn: Connection, tables: Iterable[str] = VERSIONED_TABLES) -> None:
+    """Create the TableVersion counters and their triggers (run by migrations)."""
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS TableVersion ("
+        "name TEXT PRIMARY KEY, "
+        "version INTEGER NOT NULL DEFAULT 0, "
+        "updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    ))
+    for table in tables:
+        for statement in _version_statements(table):
+            conn.execute(text(statement))
+
+
+async def load_versions(db: AsyncSession, tables: Iterable[str]) -> dict:
+    tables = list(tables)
+    result = await db.execute(
+        text("SELECT name, version, updated_at FROM TableVersion WHERE name IN ({})".format(
+            ", ".join(f":t{i}" for i in range(len(tables)))
+        )),
+        {f"t{i}": t for i, t in enumerate(tables)},
+    )
+    return {name: (version, updated_at) for name, version, updated_at in result}
+
+
+def _http_date(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value, usegmt=True)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def _not_modified(request: Request, etag: str, last_modified: Optional[str]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _validators(etag: str, last_modified: Optional[str]) -> dict:
+    headers = {"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL}
+    if last_modified:
+        headers["Last-Modified"] = last_modified
+    return headers
+
+
+async def conditional_response(
+    request: Request,
+    db: AsyncSession,
+    tables: Iterable[str],
+    respond: Callable[[dict], Awaitable[Response]],
+) -> Response:
+    """Answer 304 from the table versions alone, or build the response and attach ETag/Last-Modified.
+
+    The ETag only encodes table versions; it is per URL, so query parameters need not be part of it.
+    `respond` gets the versions ({table: version}) to key its response cache entry with.
+    """
+    versions = await load_versions(db, tables)
+    etag = '"' + "-".join(f"{t}.{versions.get(t, (0, None))[0]}" for t in tables) + '"'
+    stamps = [updated_at for _, updated_at in versions.values() if updated_at]
+    last_modified = _http_date(max(stamps)) if stamps else None
+    headers = _validators(etag, last_modified)
+    if _not_modified(request, etag, last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response = await respond({t: version for t, (version, _) in versions.items()})
+    response.headers.update(headers)
+    return response
+
+
+def entity_response(request: Request, payload: dict, updated_at=None) -> Response:
+    """JSON response for a single row, validated by a hash of its content."""
+    body = dumps(payload)
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    headers = _validators(etag, _http_date(updated_at))
+    if _not_modified(request, etag, headers.get("Last-Modified")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)